@@ -0,0 +1,278 @@
+"""
+The asyncio front-end of the bus.
+
+The callbacks of a bus run on its own thread (the Ivy thread, or the sender thread of a LoopbackBus). An AsyncBus
+hands the messages over to an event loop so that the subsystems can run as coroutines on a single thread:
+
+    bus = AsyncBus(aviBus)
+    async for record in bus.subscribe('StateVector'):
+        ...
+    await bus.send('APNzControl nz=1.0')
+
+Each subscription has its own bounded queue filled by the bus thread, the event loop is only woken up when the
+consumer waits for a message, so a burst of messages costs a single call_soon_threadsafe. The queues of the
+edge-triggered families are not bounded, each of their messages is an event.
+
+The control frame of the state machine is an AsyncBatch, flushed with AsyncBus.send.
+"""
+
+import asyncio, threading
+from collections import deque, namedtuple
+from messages import schemas, edgeTriggeredFamilies
+from bus import MessageBatch
+
+# The schema of the families without MessageSchema: the records are the words following the family
+FamilyWords = namedtuple('FamilyWords', ['family', 'parse'])
+
+class Subscription:
+    """
+    The messages of a family received by an AsyncBus, iterated with async for.
+
+    When the queue is full the oldest message is dropped, the subsystems only need the latest state.
+
+    Attributes:
+        family (str): The family of the messages.
+        loop (asyncio.AbstractEventLoop): The event loop of the consumer.
+        maxsize (int): The maximum number of messages waiting in the queue, None for no limit.
+        items (deque): The (agent, record) tuples waiting in the queue.
+        lock (threading.Lock): Protects the queue, filled by the bus thread.
+        waiter (asyncio.Future): The future the consumer awaits when the queue is empty, None otherwise.
+        wakeScheduled (bool): Indicates whether a wake up of the consumer is already scheduled on the loop.
+        dropped (int): The number of messages dropped because the queue was full.
+        received (int): The number of messages received.
+        lastAgent (str): The agent that sent the last message returned.
+        closed (bool): Indicates whether the subscription is closed.
+
+    Methods:
+        push(agent, record): Queues a message, called by the bus thread.
+        get(): Waits for the next message.
+        close(): Stops the subscription, the iteration ends once the queue is empty.
+    """
+
+    def __init__(self, family, loop, maxsize=64):
+        """
+        Initializes a new instance of the Subscription class.
+
+        Args:
+            family (str): The family of the messages.
+            loop (asyncio.AbstractEventLoop): The event loop of the consumer.
+            maxsize (int): The maximum number of messages waiting in the queue, None for no limit.
+        """
+        self.family = family
+        self.loop = loop
+        self.maxsize = maxsize
+        self.items = deque()
+        self.lock = threading.Lock()
+        self.waiter = None
+        self.wakeScheduled = False
+        self.dropped = 0
+        self.received = 0
+        self.lastAgent = None
+        self.closed = False
+
+    def push(self, agent, record):
+        """
+        Queues a message and wakes the consumer up if it is waiting, called by the bus thread.
+
+        Args:
+            agent (str): The agent that sent the message.
+            record (namedtuple): The parsed message.
+        """
+        if self.closed:
+            return
+        with self.lock:
+            if self.maxsize is not None and len(self.items) >= self.maxsize:
+                self.items.popleft()
+                self.dropped += 1
+            self.items.append((agent, record))
+            self.received += 1
+            if self.waiter is None or self.wakeScheduled:
+                return
+            self.wakeScheduled = True
+        self.loop.call_soon_threadsafe(self.wake)
+
+    def wake(self):
+        with self.lock:
+            self.wakeScheduled = False
+            waiter, self.waiter = self.waiter, None
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    async def get(self):
+        """
+        Waits for the next message.
+
+        Returns:
+            namedtuple: The next record, the sender is kept in lastAgent.
+
+        Raises:
+            StopAsyncIteration: If the subscription is closed and its queue is empty.
+        """
+        while True:
+            with self.lock:
+                if self.items:
+                    self.lastAgent, record = self.items.popleft()
+                    return record
+                if self.closed:
+                    raise StopAsyncIteration
+                self.waiter = self.loop.create_future()
+                waiter = self.waiter
+            try:
+                await waiter
+            finally:
+                with self.lock:
+                    if self.waiter is waiter:
+                        self.waiter = None
+
+    def close(self):
+        """
+        Stops the subscription, the iteration ends once the queue is empty.
+        """
+        self.closed = True
+        with self.lock:
+            if self.waiter is None or self.wakeScheduled:
+                return
+            self.wakeScheduled = True
+        self.loop.call_soon_threadsafe(self.wake)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.get()
+
+class AsyncBus:
+    """
+    The asyncio front-end of a bus: subscriptions iterated with async for and awaitable sends.
+
+    Attributes:
+        bus (AviBus): The bus, an AviBus, a LoopbackBus or a PrefixedBus.
+        loop (asyncio.AbstractEventLoop): The event loop of the subscribers.
+        subscriptions (list): The open subscriptions.
+
+    Methods:
+        subscribe(family, schema, maxsize): Returns a subscription to the messages of a family.
+        send(*msgs): Sends messages, without blocking the event loop when a MessageBatch is being sent.
+        close(): Closes every subscription.
+    """
+
+    def __init__(self, bus, loop=None):
+        """
+        Initializes a new instance of the AsyncBus class, from a coroutine or with the loop it will run on.
+
+        Args:
+            bus (AviBus): The bus, an AviBus, a LoopbackBus or a PrefixedBus.
+            loop (asyncio.AbstractEventLoop): The event loop of the subscribers, the running loop by default.
+        """
+        self.bus = bus
+        self.loop = loop if loop is not None else asyncio.get_running_loop()
+        self.subscriptions = []
+
+    def subscribe(self, family, schema=None, maxsize=64):
+        """
+        Returns a subscription to the messages of a family.
+
+        Args:
+            family (str): The family of the messages, e.g. 'StateVector'.
+            schema (MessageSchema): The schema of the messages, the schema of the family in messages.schemas by
+                default, the messages of the families without schema are returned as the tuple of their words.
+            maxsize (int): The maximum number of messages waiting in the queue, the oldest is dropped beyond, not
+                limited for the edge-triggered families.
+
+        Returns:
+            Subscription: The subscription, iterated with async for.
+        """
+        schema = schema or schemas.get(family) or FamilyWords(family, tuple)
+        if family.rsplit('.', 1)[-1] in edgeTriggeredFamilies:
+            maxsize = None # every message is an event, none can be dropped
+        subscription = Subscription(family, self.loop, maxsize)
+        self.bus.bindRecord(subscription.push, schema)
+        self.subscriptions.append(subscription)
+        return subscription
+
+    async def send(self, *msgs):
+        """
+        Sends messages together. They are sent from the event loop thread when the send lock is free, and from
+        the default executor when a MessageBatch holds it, so the event loop is never blocked by the lock.
+
+        Args:
+            *msgs: The messages.
+        """
+        lock = self.bus.sendLock
+        if lock.acquire(blocking=False):
+            try:
+                for msg in msgs:
+                    self.bus.rawSend(msg)
+            finally:
+                lock.release()
+        else:
+            await self.loop.run_in_executor(None, self.sendBlocking, msgs)
+
+    def sendBlocking(self, msgs):
+        with self.bus.sendLock:
+            for msg in msgs:
+                self.bus.rawSend(msg)
+
+    def close(self):
+        """
+        Closes every subscription, the bindings are kept on the bus but their messages are ignored.
+        """
+        for subscription in self.subscriptions:
+            subscription.close()
+        self.subscriptions = []
+
+class AsyncBatch(MessageBatch):
+    """
+    The MessageBatch of the asyncio mode: the messages of a batch are sent together by a task running
+    AsyncBus.send, so the event loop never waits for the send lock.
+
+    Attributes:
+        asyncBus (AsyncBus): The asyncio front-end of the bus the messages are sent on.
+        tasks (set): The send tasks not done yet.
+    """
+
+    def __init__(self, asyncBus, size):
+        """
+        Initializes a new instance of the AsyncBatch class, from a coroutine or with the loop of the AsyncBus running.
+
+        Args:
+            asyncBus (AsyncBus): The asyncio front-end of the bus the messages are sent on.
+            size (int): The expected number of messages per batch, the buffer grows if it is exceeded.
+        """
+        super().__init__(asyncBus.bus, size)
+        self.asyncBus = asyncBus
+        self.tasks = set()
+
+    def flush(self):
+        """
+        Schedules the send of the messages of the batch and empties it, the counters count them when scheduled.
+        """
+        msgs = tuple(self.messages[:self.count])
+        task = self.asyncBus.loop.create_task(self.asyncBus.send(*msgs))
+        self.tasks.add(task) # the loop only keeps a weak reference to the tasks
+        task.add_done_callback(self.tasks.discard)
+
+        self.sends = self.count
+        self.bytes = sum(len(msg.encode()) for msg in msgs)
+        self.totalSends += self.sends
+        self.totalBytes += self.bytes
+        self.discard()
+
+class AsyncNotifier:
+    """
+    The DataNotifier of the asyncio mode, notified and awaited on the event loop thread.
+
+    Methods:
+        notify(): Signals that new data is available.
+        wait(): Waits for new data.
+    """
+
+    def __init__(self):
+        self.event = asyncio.Event()
+
+    def notify(self):
+        self.event.set()
+
+    async def wait(self):
+        await self.event.wait()
+        self.event.clear()
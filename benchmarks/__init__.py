@@ -0,0 +1,6 @@
+"""
+Benchmarks of the miniYoke module, run from the repository root:
+
+    python -m benchmarks.pipeline --output results.json
+    python -m benchmarks.pipeline --compare results.json
+"""
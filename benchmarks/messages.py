@@ -0,0 +1,88 @@
+import time, argparse
+from bus import MessagePattern
+from messages import stateVectorSchema, performancesSchema, paLongSchema, apLatSchema, nxControlSchema, nzControlSchema, latControlSchema
+from benchmarks.pipeline import streams
+
+incoming = {
+    'StateVector': stateVectorSchema,
+    'Performances': performancesSchema,
+    'PaLong': paLongSchema,
+    'AP_LAT': apLatSchema,
+}
+
+# The str.format calls the state machine used before the templates
+outgoing = {
+    'APNxControl': (nxControlSchema, 'APNxControl nx={}'),
+    'APNzControl': (nzControlSchema, 'APNzControl nz={}'),
+    'APLatControl': (latControlSchema, 'APLatControl rollRate={}'),
+}
+
+def perMessage(function, inputs):
+    """
+    Returns the mean cost of a function over its inputs in nanoseconds.
+
+    Args:
+        function (function): The function to time, called with each input.
+        inputs (list): The inputs.
+
+    Returns:
+        float: The mean time per call in nanoseconds.
+    """
+    start = time.perf_counter_ns()
+    for value in inputs:
+        function(value)
+    return (time.perf_counter_ns() - start) / len(inputs)
+
+def benchParse(family, count):
+    """
+    Measures the parse cost of the messages of a family, from the words following the family to the typed values.
+
+    The regex path is the former one: the captures of the MessagePattern of the regex then a float() call on each
+    value kept by the parser. The schema path builds the typed record directly.
+
+    Args:
+        family (str): The message family, a key of incoming.
+        count (int): The number of messages parsed.
+
+    Returns:
+        dict: The cost per message of each path in nanoseconds.
+    """
+    schema = incoming[family]
+    pattern = MessagePattern(schema.regex)
+    kept = [i for i, name in enumerate(schema.fields) if name is not None]
+    inputs = [streams[family].format(i * 1e-4).split()[1:] for i in range(count)]
+
+    def regexPath(tokens):
+        values = pattern.parse(tokens)
+        return [float(values[i]) for i in kept]
+
+    return {'regexNs': perMessage(regexPath, inputs), 'schemaNs': perMessage(schema.parse, inputs)}
+
+def benchFormat(family, count):
+    """
+    Measures the cost of rendering an outgoing message with str.format and with the compiled template.
+
+    Args:
+        family (str): The message family, a key of outgoing.
+        count (int): The number of messages rendered.
+
+    Returns:
+        dict: The cost per message of each path in nanoseconds.
+    """
+    schema, text = outgoing[family]
+    inputs = [i * 1e-4 for i in range(count)]
+    return {'formatNs': perMessage(lambda value: text.format(float(value)), inputs), 'templateNs': perMessage(schema.format, inputs)}
+
+if __name__ == '__main__':
+    argParser = argparse.ArgumentParser(description="Parse and format cost per message of the message schemas")
+    argParser.add_argument('--count', type=int, default=200000, help="messages per benchmark")
+    args = argParser.parse_args()
+
+    for family in incoming:
+        result = benchParse(family, args.count)
+        print('parse  {:<13} regex {:>7.0f} ns/msg  schema {:>7.0f} ns/msg  x{:.2f}'.format(
+            family, result['regexNs'], result['schemaNs'], result['regexNs'] / result['schemaNs']))
+    for family in outgoing:
+        result = benchFormat(family, args.count)
+        print('format {:<13} str.format {:>5.0f} ns/msg  template {:>5.0f} ns/msg  x{:.2f}'.format(
+            family, result['formatNs'], result['templateNs'], result['formatNs'] / result['templateNs']))
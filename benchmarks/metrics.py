@@ -0,0 +1,67 @@
+import io, time, argparse, contextlib
+from bus import MessageDispatcher
+from messages import schemas
+from metrics import BusMetrics
+from benchmarks.pipeline import streams, benchParser
+
+def benchDispatch(family, count, repeat=9):
+    """
+    Measures the cost of dispatching the messages of a family to a handler doing nothing, on the bus thread
+    as they arrive like on the Ivy AviBus, with and without metrics. The runs of the two dispatchers alternate
+    and the fastest run of each is kept, for the noise of the machine to hit both alike.
+
+    Args:
+        family (str): The message family, a key of streams.
+        count (int): The number of messages of each run.
+        repeat (int): The number of runs of each dispatcher.
+
+    Returns:
+        tuple: The dispatch times per message in nanoseconds without and with metrics.
+    """
+    bodies = [streams[family].format(i * 1e-4).split(' ', 1)[1] for i in range(count)]
+    best = []
+    for metrics in (None, BusMetrics()):
+        dispatcher = MessageDispatcher(lambda callback, regex: None)
+        dispatcher.metrics = metrics
+        dispatcher.bindSchema(lambda agent, record: None, schemas[family])
+        best.append([dispatcher.handle, None])
+
+    for _ in range(repeat):
+        for run in best:
+            handle = run[0]
+            start = time.perf_counter_ns()
+            for body in bodies:
+                handle(family, 'bench', body)
+            elapsed = time.perf_counter_ns() - start
+            run[1] = elapsed if run[1] is None else min(run[1], elapsed)
+    return best[0][1] / count, best[1][1] / count
+
+def benchOverhead(family, count):
+    """
+    Measures the cost of the handler instrumentation: the dispatch time of the messages of a family with and
+    without metrics, and the median delivery time of the whole pipeline with and without metrics.
+
+    Args:
+        family (str): The message family, a key of streams.
+        count (int): The number of messages of each run.
+
+    Returns:
+        dict: The dispatch and delivery times of each run and the overhead per message in nanoseconds.
+    """
+    plainDispatch, instrumentedDispatch = benchDispatch(family, count)
+    with contextlib.redirect_stdout(io.StringIO()):
+        plain = benchParser(family, count)
+        instrumented = benchParser(family, count, BusMetrics())
+    return {'plainNs': plain['p50Us'] * 1e3, 'instrumentedNs': instrumented['p50Us'] * 1e3,
+            'plainDispatchNs': plainDispatch, 'instrumentedDispatchNs': instrumentedDispatch,
+            'overheadNs': instrumentedDispatch - plainDispatch}
+
+if __name__ == '__main__':
+    argParser = argparse.ArgumentParser(description="Overhead of the bus handlers instrumentation per message")
+    argParser.add_argument('--count', type=int, default=50000, help="messages per run")
+    args = argParser.parse_args()
+
+    for family in streams:
+        result = benchOverhead(family, args.count)
+        print('{:<13} dispatch {:>6.0f} ns  instrumented {:>6.0f} ns  overhead {:>5.0f} ns/msg  (delivery p50 {:>6.0f} ns, instrumented {:>6.0f} ns)'.format(
+            family, result['plainDispatchNs'], result['instrumentedDispatchNs'], result['overheadNs'], result['plainNs'], result['instrumentedNs']))
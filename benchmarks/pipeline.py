@@ -0,0 +1,247 @@
+import os, io, json, time, platform, subprocess, contextlib, argparse
+from bus import LoopbackHub, LoopbackBus, MessageBatch
+from systems import FCC, MiniYoke, ApLAT, ApLONG, FMGS, FCU, FlightModel, FccStateMachine
+from scheduler import PeriodicTimer
+from replay import RecordedJoystick
+
+# Synthetic messages of each family, formatted with a varying value
+streams = {
+    'StateVector': 'StateVector x={0} y=0 z=10668 Vp=230 fpa=0.01 psi=0 phi=0.1',
+    'PaLong': 'PaLong Nx={0} Nz=1.0',
+    'AP_LAT': 'AP_LAT p={0}',
+    'Performances': 'Performances NxMax=0.5 NxMin=-1 NzMax=2.5 NzMin=-1.5 PMax={0} PMin=-0.7 AlphaMax=0.5 AlphaMin=-0.5 PhiMaxManuel=1.152 PhiMaxAutomatique=1.52 GammaMax=0.175 GammaMin=-0.2',
+}
+
+class BenchPipeline:
+    """
+    The miniYoke module wired on a LoopbackHub with a harness agent sending the inputs and timing the outputs.
+
+    Attributes:
+        harness (LoopbackBus): The agent sending the synthetic messages.
+        aviBus (LoopbackBus): The bus of the module under test.
+        fcc (FCC): The Flight Control Computer under test.
+        miniYoke (MiniYoke): The mini yoke, reading a RecordedJoystick.
+        joystick (RecordedJoystick): The joystick the synthetic samples are set on.
+        stateMachine (FccStateMachine): The state machine of main.py.
+        nzReceivedAt (int): The perf_counter_ns time the harness received the last APNzControl message.
+    """
+
+    def __init__(self, metrics=None):
+        hub = LoopbackHub()
+        self.harness = LoopbackBus('Benchmark', hub)
+        self.aviBus = LoopbackBus('MiniYokeModule', hub)
+        if metrics is not None:
+            self.aviBus.setMetrics(metrics)
+
+        self.apLat = ApLAT()
+        self.apLong = ApLONG()
+        self.fmgs = FMGS()
+        self.fcu = FCU()
+        self.flightModel = FlightModel()
+
+        self.fcc = FCC(self.fcu, self.fmgs, self.flightModel, self.aviBus)
+        self.miniYoke = MiniYoke(self.fcc, alphaFilter=0.1)
+        self.joystick = RecordedJoystick(self.miniYoke)
+        self.miniYoke.joystick = self.joystick
+        self.stateMachine = FccStateMachine(self.fcc, self.miniYoke, self.apLat, self.apLong, MessageBatch(self.aviBus, size=3))
+
+        self.aviBus.bindRecord(self.apLat.receive, self.apLat.schema)
+        self.aviBus.bindRecord(self.apLong.receive, self.apLong.schema)
+        self.aviBus.bindRecord(self.fmgs.receive, self.fmgs.schema)
+        self.aviBus.bindMsg(self.fcu.parser, self.fcu.regex)
+        self.aviBus.bindRecord(self.flightModel.receive, self.flightModel.schema)
+
+        self.nzReceivedAt = None
+        self.harness.bindMsg(self.onNz, '^APNzControl nz=(\\S+)')
+
+    def onNz(self, agent, nz):
+        self.nzReceivedAt = time.perf_counter_ns()
+
+    def stop(self):
+        self.aviBus.stop()
+        self.harness.stop()
+
+def percentile(sortedValues, fraction):
+    """
+    Returns the nearest rank percentile of sorted values.
+
+    Args:
+        sortedValues (list): The values sorted in ascending order.
+        fraction (float): The percentile between 0 and 1.
+
+    Returns:
+        float: The percentile, None if there are no values.
+    """
+    if not sortedValues:
+        return None
+    return sortedValues[min(len(sortedValues) - 1, int(fraction * len(sortedValues)))]
+
+def summarize(latencies, wallTime, cpuTime):
+    """
+    Summarizes the latencies of a run.
+
+    Args:
+        latencies (list): The latencies of the messages in nanoseconds.
+        wallTime (float): The duration of the run in seconds.
+        cpuTime (float): The CPU time of the run in seconds.
+
+    Returns:
+        dict: The message count, messages per second, CPU per message and latency percentiles in microseconds.
+    """
+    latencies = sorted(latencies)
+    count = len(latencies)
+    return {
+        'messages': count,
+        'messagesPerSec': count / wallTime if wallTime else None,
+        'cpuPerMessageUs': cpuTime / count * 1e6 if count else None,
+        'p50Us': percentile(latencies, 0.50) / 1e3 if count else None,
+        'p99Us': percentile(latencies, 0.99) / 1e3 if count else None,
+        'p999Us': percentile(latencies, 0.999) / 1e3 if count else None,
+    }
+
+def benchParser(family, count, metrics=None):
+    """
+    Measures the cost of delivering and parsing the messages of a family, from the harness send to the parser return.
+
+    Args:
+        family (str): The message family, a key of streams.
+        count (int): The number of messages to send.
+        metrics (BusMetrics): The metrics instrumenting the handlers of the module, None to not instrument them.
+
+    Returns:
+        dict: The summary of the run.
+    """
+    pipeline = BenchPipeline(metrics)
+    messages = [streams[family].format(i * 1e-4) for i in range(count)]
+    latencies = [0] * count
+
+    cpuStart, wallStart = time.process_time(), time.perf_counter()
+    for i, msg in enumerate(messages):
+        sendTime = time.perf_counter_ns()
+        pipeline.harness.sendMsg(msg)
+        latencies[i] = time.perf_counter_ns() - sendTime
+    wallTime, cpuTime = time.perf_counter() - wallStart, time.process_time() - cpuStart
+
+    pipeline.stop()
+    return summarize(latencies, wallTime, cpuTime)
+
+def benchEndToEnd(rate, duration):
+    """
+    Measures the latency from a StateVector and joystick sample to the APNzControl output at a given rate.
+
+    Each cycle the harness sends a StateVector, the joystick sample is read by the mini yoke, the state
+    machine is stepped and the time the harness receives the APNzControl message is taken.
+
+    Args:
+        rate (float): The cycle rate in Hz, None to run as fast as possible.
+        duration (float): The duration of the run in seconds.
+
+    Returns:
+        dict: The summary of the run, with the overruns of the cycle timer.
+    """
+    pipeline = BenchPipeline()
+    timer = PeriodicTimer(rate) if rate else None
+    latencies = []
+
+    cpuStart, wallStart = time.process_time(), time.perf_counter()
+    if timer is not None:
+        timer.start()
+    i = 0
+    while time.perf_counter() - wallStart < duration:
+        msg = streams['StateVector'].format(i * 1e-4)
+        sample = {'axes': [0.0, ((i % 200) - 100) / 100, ((i % 150) - 75) / 75], 'buttons': [False] * 4}
+
+        sendTime = time.perf_counter_ns()
+        pipeline.harness.sendMsg(msg)
+        pipeline.joystick.setSample(sample)
+        pipeline.miniYoke.sample()
+        pipeline.stateMachine.step()
+        if pipeline.nzReceivedAt is not None:
+            latencies.append(pipeline.nzReceivedAt - sendTime)
+            pipeline.nzReceivedAt = None
+
+        i += 1
+        if timer is not None:
+            timer.wait()
+    wallTime, cpuTime = time.perf_counter() - wallStart, time.process_time() - cpuStart
+
+    pipeline.stop()
+    summary = summarize(latencies, wallTime, cpuTime)
+    summary['overruns'] = timer.overruns if timer is not None else None
+    return summary
+
+def gitVersion():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def runAll(count, rates, duration):
+    """
+    Runs every benchmark.
+
+    Args:
+        count (int): The number of messages of each parser benchmark.
+        rates (list): The end to end cycle rates in Hz, 0 to run as fast as possible.
+        duration (float): The duration of each end to end run in seconds.
+
+    Returns:
+        dict: The results with the version and the platform they have been measured on.
+    """
+    results = {
+        'version': gitVersion(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'parsers': {},
+        'endToEnd': {},
+    }
+
+    with contextlib.redirect_stdout(io.StringIO()):  # the parsers print each message
+        for family in streams:
+            results['parsers'][family] = benchParser(family, count)
+        for rate in rates:
+            results['endToEnd']['{:g}'.format(rate) if rate else 'max'] = benchEndToEnd(rate, duration)
+
+    return results
+
+def printResults(results, previous=None):
+    """
+    Prints the results, compared to previous results if given.
+
+    Args:
+        results (dict): The results of runAll.
+        previous (dict): The results of a previous version, None to print the results alone.
+    """
+    print('version {} (python {})'.format(results['version'], results['python']))
+    for section in ('parsers', 'endToEnd'):
+        for name, summary in results[section].items():
+            line = '{:>9} {:<13} {:>10.0f} msg/s  cpu {:>7.2f} us/msg  p50 {:>7.2f} us  p99 {:>7.2f} us  p999 {:>8.2f} us'.format(
+                section, name, summary['messagesPerSec'] or 0, summary['cpuPerMessageUs'] or 0,
+                summary['p50Us'] or 0, summary['p99Us'] or 0, summary['p999Us'] or 0)
+            old = previous.get(section, {}).get(name) if previous else None
+            if old and old['p50Us'] and summary['p50Us']:
+                line += '  p50 x{:.2f} vs {}'.format(summary['p50Us'] / old['p50Us'], previous.get('version'))
+            print(line)
+
+if __name__ == '__main__':
+    argParser = argparse.ArgumentParser(description="Throughput and latency of the bus -> FCC -> bus pipeline")
+    argParser.add_argument('--count', type=int, default=20000, help="messages per parser benchmark")
+    argParser.add_argument('--rates', type=float, nargs='+', default=[100, 1000, 10000, 0], help="end to end rates in Hz, 0 for max")
+    argParser.add_argument('--duration', type=float, default=2.0, help="seconds per end to end rate")
+    argParser.add_argument('--output', metavar='FILE', help="save the results to a JSON file")
+    argParser.add_argument('--compare', metavar='FILE', help="compare to the results of a previous version")
+    args = argParser.parse_args()
+
+    results = runAll(args.count, args.rates, args.duration)
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as file:
+            previous = json.load(file)
+    printResults(results, previous)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
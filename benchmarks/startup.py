@@ -0,0 +1,107 @@
+import os, sys, json, time, platform, statistics, subprocess, argparse
+from benchmarks.pipeline import gitVersion
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The imports measured, each in a new interpreter, and the heavy packages they should not load
+imports = ['messages', 'bus', 'systems', 'cockpits', 'unitTests.systemsTest']
+heavyPackages = ['pygame', 'matplotlib', 'numpy']
+
+# Joystick start up, the import of pygame excluded: what begin() initializes against the whole of pygame.init()
+inits = {
+    'initPygame': 'import pygame, systems; t = time.perf_counter(); systems.initPygame()',
+    'pygame.init': 'import pygame; t = time.perf_counter(); pygame.init()',
+}
+
+def runChild(code):
+    """
+    Runs code in a new interpreter from the repository root.
+
+    Args:
+        code (str): The code, it sets t to the perf_counter time the measure starts.
+
+    Returns:
+        dict: The measured time in seconds, the time of the whole process and the heavy packages loaded by the code.
+    """
+    script = ('import sys, time, json\nt = time.perf_counter()\n{}\n'
+              'print(json.dumps({{"seconds": time.perf_counter() - t, "loaded": [name for name in {!r} if name in sys.modules]}}))').format(code, heavyPackages)
+    env = dict(os.environ, PYGAME_HIDE_SUPPORT_PROMPT='1')
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, cwd=root, env=env, check=True).stdout
+    processSeconds = time.perf_counter() - start
+    return dict(json.loads(output.strip().splitlines()[-1]), processSeconds=processSeconds)
+
+def benchStartup(code, repeat):
+    """
+    Measures the time of code in new interpreters.
+
+    Args:
+        code (str): The code, it sets t to the perf_counter time the measure starts.
+        repeat (int): The number of interpreters.
+
+    Returns:
+        dict: The median and minimum times in milliseconds, the median time of the whole process including the
+        interpreter start up and the heavy packages loaded.
+    """
+    runs = [runChild(code) for _ in range(repeat)]
+    times = [run['seconds'] * 1e3 for run in runs]
+    return {'medianMs': statistics.median(times), 'minMs': min(times),
+            'processMs': statistics.median(run['processSeconds'] * 1e3 for run in runs), 'loaded': runs[-1]['loaded']}
+
+def runAll(repeat):
+    """
+    Runs every startup benchmark.
+
+    Args:
+        repeat (int): The number of interpreters of each benchmark.
+
+    Returns:
+        dict: The results with the version and the platform they have been measured on.
+    """
+    results = {
+        'version': gitVersion(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'interpreter': benchStartup('pass', repeat),
+        'imports': {module: benchStartup('import ' + module, repeat) for module in imports},
+        'inits': {name: benchStartup(code, repeat) for name, code in inits.items()},
+    }
+    return results
+
+def printResults(results, previous=None):
+    """
+    Prints the results, compared to previous results if given.
+
+    Args:
+        results (dict): The results of runAll.
+        previous (dict): The results of a previous version, None to print the results alone.
+    """
+    print('version {} (python {}), empty interpreter process {:.1f} ms'.format(results['version'], results['python'], results['interpreter']['processMs']))
+    for section in ('imports', 'inits'):
+        for name, summary in results[section].items():
+            line = '{:>7} {:<22} median {:>8.1f} ms  min {:>8.1f} ms  process {:>8.1f} ms  loads {}'.format(
+                section, name, summary['medianMs'], summary['minMs'], summary['processMs'], ', '.join(summary['loaded']) or '-')
+            old = previous.get(section, {}).get(name) if previous else None
+            if old and old['medianMs']:
+                line += '  x{:.2f} vs {}'.format(summary['medianMs'] / old['medianMs'], previous.get('version'))
+            print(line)
+
+if __name__ == '__main__':
+    argParser = argparse.ArgumentParser(description="Import and joystick initialization times of the module, each in a new interpreter")
+    argParser.add_argument('--repeat', type=int, default=5, help="interpreters per measure")
+    argParser.add_argument('--output', metavar='FILE', help="save the results to a JSON file")
+    argParser.add_argument('--compare', metavar='FILE', help="compare to the results of a previous version")
+    args = argParser.parse_args()
+
+    results = runAll(args.repeat)
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as file:
+            previous = json.load(file)
+    printResults(results, previous)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
@@ -1,4 +1,6 @@
+import re, time, threading, queue
 from ivy.std_api import *
+from messages import edgeTriggeredFamilies
 
 def on_cx_proc(agent, connected):
     print("Agent {} is {}connected".format(agent, "" if connected else "dis"))
@@ -6,6 +8,483 @@ def on_cx_proc(agent, connected):
 def on_die_proc(agent):
     print("Agent {} has died".format(agent))
 
+class MessagePattern:
+    """
+    A bus regex compiled into a whitespace tokenizer.
+
+    Only the regexes made of a literal message family followed by 'key=(\\S+)' fields and literal words
+    can be compiled, e.g. '^StateVector x=(\\S+) y=(\\S+)' or '^FCUAP1 push'.
+    The values are returned in the same order as the regex captures so the callbacks are unchanged.
+
+    Attributes:
+        regex (str): The regular expression the pattern has been compiled from.
+        family (str): The first word of the message, None if the regex can not be tokenized.
+        parts (list): The (key prefix, is field) tuples of the words following the family.
+
+    Methods:
+        parse(tokens): Returns the field values of the tokenized message or None if it does not match.
+    """
+
+    familyRegex = re.compile(r'[A-Za-z_][\w.]*')
+    fieldRegex = re.compile(r'([\w.]+=)\(\\S\+\)')
+    literalRegex = re.compile(r'[\w.\-]+')
+
+    def __init__(self, regex):
+        self.regex = regex
+        self.family = None
+        self.parts = []
+
+        words = regex[1:].split(' ') if regex.startswith('^') else []
+        if len(words) < 2 or not self.familyRegex.fullmatch(words[0]):
+            return
+
+        for word in words[1:]:
+            field = self.fieldRegex.fullmatch(word)
+            if field:
+                self.parts.append((field.group(1), True))
+            elif self.literalRegex.fullmatch(word):
+                self.parts.append((word, False))
+            else:
+                self.parts = []
+                return
+
+        self.family = words[0]
+
+    def parse(self, tokens):
+        """
+        Returns the field values of the tokenized message or None if it does not match.
+
+        Args:
+            tokens (list): The words of the message following the family.
+
+        Returns:
+            list: The field values as strings, in the order of the regex captures.
+        """
+        if len(tokens) < len(self.parts):
+            return None
+
+        values = []
+        last = len(self.parts) - 1
+        for i, (text, isField) in enumerate(self.parts):
+            token = tokens[i]
+            if isField:
+                if len(token) <= len(text) or not token.startswith(text):
+                    return None
+                values.append(token[len(text):])
+            elif token != text and not (i == last and token.startswith(text)):  # the regex is not anchored at the end
+                return None
+
+        return values
+
+class MessageDispatcher:
+    """
+    Dispatches the bus messages to the subsystems with a single binding per message family.
+
+    The subsystems keep registering their own regex, the dispatcher groups them by family (the first word
+    of the message) and binds '^family (.*)' once. Incoming messages are split once, the family handlers
+    are found with a dict lookup and the fields are parsed by the pre-compiled patterns.
+    Regexes that can not be tokenized are bound as is.
+
+    Attributes:
+        rawBind (function): The function binding a callback to a regex on the underlying bus.
+        families (dict): The (parse, callback, spread, metrics) list of each bound family, spread for the regex
+            callbacks, metrics the HandlerMetrics of the callback when instrumented.
+        recorder (SessionRecorder): The recorder of the incoming messages, None when not recording. The messages
+            of the coalesced families are recorded when handled, the replay handles the same ones.
+        metrics (BusMetrics): The metrics of the handlers bound from now on, None to not instrument them.
+        coalescedFamilies (set): The families of which only the newest unprocessed message is handled.
+        coalescer (Coalescer): The worker handling the coalesced families, None until a family is coalesced.
+
+    Methods:
+        bind(callback, regex): Binds a callback to a regex.
+        bindSchema(callback, schema, family): Binds a callback to the records of a message schema.
+        coalesce(family): Handles only the newest unprocessed message of a family, from a worker thread.
+        dispatch(family, agent, body, arrivalNs): Calls the callbacks of the family matching the message body.
+        handle(family, agent, body, arrivalNs): Calls the callbacks, without recording nor coalescing the message.
+        handleNewest(family, agent, body, arrivalNs): Records and handles the newest message of a coalesced family.
+        stop(): Stops the worker of the coalesced families.
+    """
+
+    def __init__(self, rawBind):
+        """
+        Initializes a new instance of the MessageDispatcher class.
+
+        Args:
+            rawBind (function): The function binding a callback to a regex on the underlying bus.
+        """
+        self.rawBind = rawBind
+        self.families = {}
+        self.recorder = None
+        self.metrics = None
+        self.coalescedFamilies = set()
+        self.coalescer = None
+
+    def bind(self, callback, regex):
+        """
+        Binds a callback to a regex, the callback is called with the agent followed by the captured values.
+
+        Args:
+            callback (function): The function called when a message matches the regex.
+            regex (str): The regular expression of the message.
+        """
+        pattern = MessagePattern(regex)
+        if pattern.family is None:
+            self.rawBind(callback, regex)
+            return
+
+        self.handlers(pattern.family).append((pattern.parse, callback, True, self.instrument(pattern.family, callback)))
+
+    def bindSchema(self, callback, schema, family=None):
+        """
+        Binds a callback to a message schema, the callback is called with the agent and the parsed record.
+
+        Args:
+            callback (function): The function called with the record of each message of the schema.
+            schema (MessageSchema): The schema of the message.
+            family (str): The family the schema is bound to, the schema family by default.
+        """
+        family = family or schema.family
+        self.handlers(family).append((schema.parse, callback, False, self.instrument(family, callback)))
+
+    def instrument(self, family, callback):
+        """
+        Returns the HandlerMetrics of a new binding, None when the dispatcher is not instrumented.
+
+        Args:
+            family (str): The family of the messages.
+            callback (function): The bound callback.
+
+        Returns:
+            HandlerMetrics: The metrics of the handler, None when not instrumented.
+        """
+        return self.metrics.register(family, callback) if self.metrics is not None else None
+
+    def handlers(self, family):
+        """
+        Returns the handlers of a family, binding the family on the underlying bus the first time.
+
+        Args:
+            family (str): The family of the messages.
+
+        Returns:
+            list: The (parse, callback, spread, metrics) tuples of the family.
+        """
+        if family not in self.families:
+            self.families[family] = []
+            self.rawBind(FamilyBinding(self, family), '^{}(?: (.*))?$'.format(re.escape(family)))
+        return self.families[family]
+
+    def coalesce(self, family):
+        """
+        Handles only the newest unprocessed message of a family: the bus thread keeps the message without parsing
+        it and a worker thread handles the newest one, the messages replaced before being handled are dropped.
+
+        Args:
+            family (str): The family of the messages, e.g. 'StateVector' or 'C1.StateVector'.
+
+        Raises:
+            ValueError: If the family is edge-triggered, each of its messages being an event.
+        """
+        if family.rsplit('.', 1)[-1] in edgeTriggeredFamilies:
+            raise ValueError('{} messages are edge-triggered, they can not be coalesced'.format(family))
+        if self.coalescer is None:
+            self.coalescer = Coalescer(self.handleNewest)
+            if self.metrics is not None:
+                self.metrics.coalescer = self.coalescer
+        self.coalescer.add(family)
+        self.coalescedFamilies.add(family)
+
+    def dispatch(self, family, agent, body, arrivalNs=None):
+        """
+        Calls the callbacks of the family matching the message body, or hands the message over to the
+        coalescing worker when its family is coalesced.
+
+        Args:
+            family (str): The family of the message.
+            agent (object): The agent that sent the message.
+            body (str): The message without its family.
+            arrivalNs (int): The perf_counter_ns time the message was queued at, None if it has just arrived.
+        """
+        if family in self.coalescedFamilies:
+            if arrivalNs is None and self.metrics is not None:
+                arrivalNs = time.perf_counter_ns() # the messages wait for the coalescing worker
+            self.coalescer.put(family, agent, body, arrivalNs) # recorded by handleNewest() if not dropped
+            return
+
+        if self.recorder is not None:
+            self.recorder.recordMessage('{} {}'.format(family, body) if body else family)
+        self.handle(family, agent, body, arrivalNs)
+
+    def handleNewest(self, family, agent, body, arrivalNs=None):
+        """
+        Records and handles the newest message of a coalesced family, called by the coalescing worker. The messages
+        dropped by the coalescing are not recorded, so the replay of the session handles the same messages.
+
+        Args:
+            family (str): The family of the message.
+            agent (object): The agent that sent the message.
+            body (str): The message without its family.
+            arrivalNs (int): The perf_counter_ns time the message was queued at, None when not instrumented.
+        """
+        if self.recorder is not None:
+            self.recorder.recordMessage('{} {}'.format(family, body) if body else family)
+        self.handle(family, agent, body, arrivalNs)
+
+    def handle(self, family, agent, body, arrivalNs=None):
+        """
+        Calls the callbacks of the family matching the message body, without recording nor coalescing the message.
+
+        Args:
+            family (str): The family of the message.
+            agent (object): The agent that sent the message.
+            body (str): The message without its family.
+            arrivalNs (int): The perf_counter_ns time the message was queued at, None if it has just arrived.
+        """
+        if self.metrics is not None:
+            self.dispatchInstrumented(family, agent, body, arrivalNs)
+            return
+
+        tokens = body.split()
+        for parse, callback, spread, _ in self.families[family]:
+            values = parse(tokens)
+            if values is None:
+                continue
+            if spread:
+                callback(agent, *values)
+            else:
+                callback(agent, values)
+
+    def dispatchInstrumented(self, family, agent, body, arrivalNs=None):
+        """
+        Calls the callbacks of the family matching the message body and records their metrics.
+
+        The clock is read once before the first handler and once after each handler. The queueing delay of a
+        handler is the time from the queuing of the message by a queued LoopbackBus or by the coalescing worker
+        to the call of the handler, the time spent in the previous handlers included, it is not recorded for the
+        messages handled as they arrive. The updates are those documented by HandlerMetrics, inlined.
+
+        Args:
+            family (str): The family of the message.
+            agent (object): The agent that sent the message.
+            body (str): The message without its family.
+            arrivalNs (int): The perf_counter_ns time the message was queued at, None if it has just arrived.
+        """
+        clock = time.perf_counter_ns
+        start = clock()
+        size = len(family) + 1 + len(body)
+
+        tokens = body.split()
+        for parse, callback, spread, metrics in self.families[family]:
+            values = parse(tokens) # the time of the parse is counted in the handler time
+            if values is None:
+                continue
+            if spread:
+                callback(agent, *values)
+            else:
+                callback(agent, values)
+            end = clock()
+            if metrics is not None:
+                timeNs = end - start
+                metrics.bytes += size
+                metrics.timeNs += timeNs
+                metrics.timeBuckets[(timeNs >> 10).bit_length()] += 1
+                if arrivalNs is not None:
+                    delayNs = start - arrivalNs
+                    metrics.delayNs += delayNs
+                    metrics.delayBuckets[(delayNs >> 10).bit_length()] += 1
+            start = end
+
+    def stop(self):
+        """
+        Stops the worker of the coalesced families.
+        """
+        if self.coalescer is not None:
+            self.coalescer.stop()
+
+class FamilyBinding:
+    """
+    The callback bound on the underlying bus for a message family, it dispatches the messages of the family.
+
+    The bus calls it with the agent and the message body, a queued LoopbackBus also passes the time the message
+    was queued at, so the queueing delay is tied to its message.
+
+    Attributes:
+        dispatcher (MessageDispatcher): The dispatcher of the family.
+        family (str): The family of the messages.
+    """
+
+    def __init__(self, dispatcher, family):
+        self.dispatcher = dispatcher
+        self.family = family
+
+    def __call__(self, agent, body, arrivalNs=None):
+        self.dispatcher.dispatch(self.family, agent, body, arrivalNs)
+
+class Coalescer:
+    """
+    The worker handling the newest unprocessed message of the coalesced families.
+
+    The bus thread only stores the message in the slot of its family, replacing the previous one if it has not
+    been handled yet, so the parsing cost is bounded by the worker rate whatever the message rate.
+
+    Attributes:
+        handle (function): The function recording and calling the handlers of a message, MessageDispatcher.handleNewest.
+        pending (dict): The (agent, body, arrival time) of the newest unprocessed message of each family.
+        received (dict): The number of messages received for each family.
+        dropped (dict): The number of messages replaced before being handled for each family.
+        condition (threading.Condition): Protects the slots and wakes the worker up.
+        running (bool): Indicates whether the worker is running.
+        thread (threading.Thread): The worker thread.
+
+    Methods:
+        add(family): Adds a coalesced family.
+        put(family, agent, body, arrivalNs): Stores the newest message of a family, called by the bus thread.
+        stop(): Stops the worker, the pending messages are not handled.
+    """
+
+    def __init__(self, handle):
+        self.handle = handle
+        self.pending = {}
+        self.received = {}
+        self.dropped = {}
+        self.condition = threading.Condition()
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def add(self, family):
+        with self.condition:
+            self.received.setdefault(family, 0)
+            self.dropped.setdefault(family, 0)
+
+    def put(self, family, agent, body, arrivalNs):
+        """
+        Stores the newest message of a family, called by the bus thread.
+
+        Args:
+            family (str): The family of the message.
+            agent (object): The agent that sent the message.
+            body (str): The message without its family.
+            arrivalNs (int): The perf_counter_ns time the message was queued at, None when the handlers are not instrumented.
+        """
+        with self.condition:
+            if family in self.pending:
+                self.dropped[family] += 1
+            self.pending[family] = (agent, body, arrivalNs)
+            self.received[family] += 1
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.running and not self.pending:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                pending, self.pending = self.pending, {}
+            for family, (agent, body, arrivalNs) in pending.items():
+                self.handle(family, agent, body, arrivalNs)
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.thread.join()
+
+class MessageBatch:
+    """
+    A transactional batch of messages sent together at the end of a cycle.
+
+    The messages are stored in a pre-sized buffer and flushed back to back while holding the bus send lock,
+    so no other thread can send in the middle of the batch and the consumers never see a torn frame.
+    The batch is discarded if an exception is raised before it is flushed.
+
+    Usage:
+        with batch:
+            batch.add('APNxControl nx=0.0')
+            batch.add('APNzControl nz=1.0')
+
+    Attributes:
+        aviBus (AviBus): The bus the messages are sent on.
+        messages (list): The pre-sized message buffer.
+        count (int): The number of messages in the buffer.
+        sends (int): The number of messages sent by the last flush.
+        bytes (int): The number of bytes sent by the last flush.
+        totalSends (int): The number of messages sent since the batch has been created.
+        totalBytes (int): The number of bytes sent since the batch has been created.
+
+    Methods:
+        add(msg): Adds a message to the batch.
+        flush(): Sends the messages of the batch and empties it.
+        discard(): Empties the batch without sending it.
+    """
+
+    def __init__(self, aviBus, size):
+        """
+        Initializes a new instance of the MessageBatch class.
+
+        Args:
+            aviBus (AviBus): The bus the messages are sent on.
+            size (int): The expected number of messages per batch, the buffer grows if it is exceeded.
+        """
+        self.aviBus = aviBus
+        self.messages = [None] * size
+        self.count = 0
+
+        self.sends = 0
+        self.bytes = 0
+        self.totalSends = 0
+        self.totalBytes = 0
+
+    def __enter__(self):
+        self.discard()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        if excType is None:
+            self.flush()
+        else:
+            self.discard()
+        return False
+
+    def add(self, msg):
+        """
+        Adds a message to the batch.
+
+        Args:
+            msg (str): The message to send.
+        """
+        if self.count < len(self.messages):
+            self.messages[self.count] = msg
+        else:
+            self.messages.append(msg)
+        self.count += 1
+
+    def flush(self):
+        """
+        Sends the messages of the batch and empties it.
+        """
+        sentBytes = 0
+        with self.aviBus.sendLock:
+            for i in range(self.count):
+                msg = self.messages[i]
+                self.aviBus.rawSend(msg)
+                sentBytes += len(msg.encode()) # the encoded size, not the number of characters
+
+        self.sends = self.count
+        self.bytes = sentBytes
+        self.totalSends += self.count
+        self.totalBytes += sentBytes
+        self.discard()
+
+    def discard(self):
+        """
+        Empties the batch without sending it.
+        """
+        for i in range(self.count):
+            self.messages[i] = None
+        self.count = 0
+
 class AviBus :
     def __init__(self, appName, adress):
         self.adress = adress
@@ -15,11 +494,276 @@ class AviBus :
         IvyInit(self.appName, "hello, world !", 0, on_cx_proc, on_die_proc)
         IvyStart(self.adress)
 
-    def sendMsg(self, msg):
+        self.dispatcher = MessageDispatcher(IvyBindMsg)
+        self.sendLock = threading.Lock() # keeps single messages out of the middle of a MessageBatch
+        self.recorder = None
+
+    def setRecorder(self, recorder):
+        self.recorder = recorder
+        self.dispatcher.recorder = recorder
+
+    def setMetrics(self, metrics):
+        self.dispatcher.metrics = metrics # instruments the handlers bound from now on
+
+    def coalesce(self, family):
+        self.dispatcher.coalesce(family)
+
+    def rawSend(self, msg):
+        if self.recorder is not None:
+            self.recorder.recordOutput(msg)
         IvySendMsg(msg)
-    
+
+    def sendMsg(self, msg):
+        with self.sendLock:
+            self.rawSend(msg)
+
     def bindMsg(self, callback, regex):
-        IvyBindMsg(callback, regex)
-    
+        self.dispatcher.bind(callback, regex)
+
+    def bindRecord(self, callback, schema):
+        self.dispatcher.bindSchema(callback, schema)
+
+    def stop(self):
+        IvyStop()
+        self.dispatcher.stop()
+
+class LoopbackHub:
+    """
+    The in-memory medium shared by the LoopbackBus agents of a process.
+
+    A message sent by an agent is matched against the bindings of every other agent, like on the Ivy bus
+    an agent does not receive its own messages.
+
+    Attributes:
+        agents (tuple): The attached LoopbackBus agents.
+        lock (threading.Lock): Protects the attachments.
+
+    Methods:
+        attach(agent): Attaches an agent to the hub.
+        detach(agent): Detaches an agent from the hub.
+        publish(sender, msg): Delivers a message to the matching bindings of the other agents.
+    """
+
+    def __init__(self):
+        self.agents = ()
+        self.lock = threading.Lock()
+
+    def attach(self, agent):
+        """
+        Attaches an agent to the hub.
+
+        Args:
+            agent (LoopbackBus): The agent to attach.
+        """
+        with self.lock:
+            self.agents = self.agents + (agent,)
+
+    def detach(self, agent):
+        """
+        Detaches an agent from the hub.
+
+        Args:
+            agent (LoopbackBus): The agent to detach.
+        """
+        with self.lock:
+            self.agents = tuple(other for other in self.agents if other is not agent)
+
+    def publish(self, sender, msg):
+        """
+        Delivers a message to the matching bindings of the other agents.
+
+        Args:
+            sender (LoopbackBus): The agent sending the message.
+            msg (str): The message.
+
+        Returns:
+            int: The number of bindings the message matched.
+        """
+        count = 0
+        for agent in self.agents:
+            if agent is sender:
+                continue
+            for regex, callback in agent.bindings:
+                match = regex.match(msg)
+                if match:
+                    agent.deliver(callback, sender.appName, match.groups(default=''))
+                    count += 1
+        return count
+
+class LoopbackBus:
+    """
+    An in-memory AviBus backend for co-located modules and network free tests.
+
+    It has the AviBus interface and the Ivy regex semantics: the messages are matched with re.match
+    against the bindings of the other agents of the hub and the callbacks receive the sender name followed
+    by the captures. The callbacks run synchronously in the sender thread, or in a delivery thread of the
+    receiving agent when it is queued, like with Ivy.
+
+    Attributes:
+        appName (str): The name of the agent.
+        hub (LoopbackHub): The medium shared with the other agents.
+        queued (bool): Indicates whether the messages are delivered by the agent thread.
+        bindings (list): The (compiled regex, callback) tuples of the agent.
+        dispatcher (MessageDispatcher): The dispatcher grouping the bindings by message family.
+        sendLock (threading.RLock): Keeps single messages out of the middle of a MessageBatch.
+        recorder (SessionRecorder): The recorder of the messages, None when not recording.
+        deliveryQueue (queue.Queue): The callbacks waiting for the delivery thread when queued.
+        deliveryThread (threading.Thread): The thread running the callbacks when queued.
+
+    Methods:
+        sendMsg(msg): Sends a message to the other agents.
+        bindMsg(callback, regex): Binds a callback to a regex.
+        bindRecord(callback, schema): Binds a callback to the records of a message schema.
+        setRecorder(recorder): Records the messages sent and received.
+        setMetrics(metrics): Instruments the handlers bound from now on.
+        coalesce(family): Handles only the newest unprocessed message of a family.
+        stop(): Detaches the agent from the hub and stops its delivery thread.
+    """
+
+    def __init__(self, appName, hub, queued=False):
+        """
+        Initializes a new instance of the LoopbackBus class and attaches it to the hub.
+
+        Args:
+            appName (str): The name of the agent.
+            hub (LoopbackHub): The medium shared with the other agents.
+            queued (bool): Runs the callbacks in a delivery thread instead of the sender thread.
+        """
+        self.appName = appName
+        self.hub = hub
+        self.queued = queued
+        self.bindings = []
+
+        self.dispatcher = MessageDispatcher(self.rawBind)
+        self.sendLock = threading.RLock() # reentrant, a synchronous callback may send on the same agent
+        self.recorder = None
+
+        self.deliveryQueue = None
+        self.deliveryThread = None
+        if queued:
+            self.deliveryQueue = queue.Queue()
+            self.deliveryThread = threading.Thread(target=self.deliveryLoop, daemon=True)
+            self.deliveryThread.start()
+
+        hub.attach(self)
+
+    def rawBind(self, callback, regex):
+        self.bindings.append((re.compile(regex), callback))
+
+    def bindMsg(self, callback, regex):
+        self.dispatcher.bind(callback, regex)
+
+    def bindRecord(self, callback, schema):
+        self.dispatcher.bindSchema(callback, schema)
+
+    def setRecorder(self, recorder):
+        self.recorder = recorder
+        self.dispatcher.recorder = recorder
+
+    def setMetrics(self, metrics):
+        self.dispatcher.metrics = metrics
+
+    def coalesce(self, family):
+        self.dispatcher.coalesce(family)
+
+    def rawSend(self, msg):
+        if self.recorder is not None:
+            self.recorder.recordOutput(msg)
+        self.hub.publish(self, msg)
+
+    def sendMsg(self, msg):
+        with self.sendLock:
+            self.rawSend(msg)
+
+    def deliver(self, callback, agent, captures):
+        """
+        Runs a callback matched by a message, now or in the delivery thread.
+
+        Args:
+            callback (function): The bound callback.
+            agent (str): The name of the sender.
+            captures (tuple): The captures of the regex.
+        """
+        if self.deliveryQueue is not None:
+            queuedNs = time.perf_counter_ns() if self.dispatcher.metrics is not None else None # only timed when instrumented
+            self.deliveryQueue.put((callback, agent, captures, queuedNs))
+        else:
+            callback(agent, *captures)
+
+    def deliveryLoop(self):
+        while True:
+            delivery = self.deliveryQueue.get()
+            if delivery is None:
+                return
+            callback, agent, captures, queuedNs = delivery
+            if isinstance(callback, FamilyBinding):
+                callback(agent, *captures, arrivalNs=queuedNs) # the queueing delay includes the time in the delivery queue
+            else:
+                callback(agent, *captures)
+
+    def stop(self):
+        self.hub.detach(self)
+        if self.deliveryThread is not None:
+            self.deliveryQueue.put(None)
+            self.deliveryThread.join()
+        self.dispatcher.stop()
+
+class PrefixedBus:
+    """
+    The namespace of a cockpit on a bus shared by several cockpits of the process.
+
+    Every message sent is prefixed with 'namespace.' and only the messages of the namespace are received,
+    e.g. 'C2.StateVector x=...' is delivered to the StateVector bindings of the cockpit 'C2' which sends
+    'C2.APNzControl nz=...'. The bindings are made on the dispatcher of the shared bus, so every cockpit
+    is served by the same bus thread with one binding per prefixed message family.
+
+    Attributes:
+        bus (AviBus): The shared bus, an AviBus or a LoopbackBus.
+        namespace (str): The name of the cockpit.
+        prefix (str): The prefix of the messages of the cockpit, the namespace followed by a dot.
+        sendLock (threading.Lock): The send lock of the shared bus, used by the MessageBatch.
+
+    Methods:
+        sendMsg(msg): Sends a message of the namespace.
+        bindMsg(callback, regex): Binds a callback to a regex of the namespace.
+        bindRecord(callback, schema): Binds a callback to the records of a message schema of the namespace.
+        coalesce(family): Handles only the newest unprocessed message of a family of the namespace.
+        stop(): Nothing to do, the shared bus is stopped by its owner.
+    """
+
+    namespaceRegex = re.compile(r'[A-Za-z_]\w*')
+
+    def __init__(self, bus, namespace):
+        """
+        Initializes a new instance of the PrefixedBus class.
+
+        Args:
+            bus (AviBus): The shared bus, an AviBus or a LoopbackBus.
+            namespace (str): The name of the cockpit, a word such as 'C1'.
+        """
+        if not self.namespaceRegex.fullmatch(namespace):
+            raise ValueError('Invalid namespace {!r}, expected a word such as C1'.format(namespace))
+        self.bus = bus
+        self.namespace = namespace
+        self.prefix = namespace + '.'
+        self.sendLock = bus.sendLock
+
+    def rawSend(self, msg):
+        self.bus.rawSend(self.prefix + msg)
+
+    def sendMsg(self, msg):
+        self.bus.sendMsg(self.prefix + msg)
+
+    def bindMsg(self, callback, regex):
+        if not regex.startswith('^'):
+            raise ValueError('Only the anchored regexes can be bound in a namespace: {!r}'.format(regex))
+        self.bus.bindMsg(callback, '^' + self.prefix + regex[1:]) # the dot is kept literal by the dispatcher
+
+    def bindRecord(self, callback, schema):
+        self.bus.dispatcher.bindSchema(callback, schema, family=self.prefix + schema.family)
+
+    def coalesce(self, family):
+        self.bus.dispatcher.coalesce(self.prefix + family)
+
     def stop(self):
-        IvyStop()
\ No newline at end of file
+        pass
@@ -0,0 +1,188 @@
+import time, threading
+
+class SystemClock:
+    """
+    The real clock, used by default by the classes that need the time.
+
+    Methods:
+        monotonic(): Returns the monotonic time in seconds.
+        time(): Returns the wall clock time in seconds.
+        sleep(seconds): Sleeps for the given time.
+        wait(event, timeout): Waits for an event set with set() or the timeout.
+        set(event): Sets an event waited for with wait().
+        wake(thread): Wakes a thread sleeping on the clock up (nothing to do on the real clock).
+        join(): Registers a thread sleeping on the clock (nothing to do on the real clock).
+        leave(): Unregisters a thread sleeping on the clock (nothing to do on the real clock).
+    """
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def time(self):
+        return time.time()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def wait(self, event, timeout):
+        return event.wait(timeout)
+
+    def set(self, event):
+        event.set()
+
+    def wake(self, thread):
+        pass
+
+    def join(self):
+        pass
+
+    def leave(self):
+        pass
+
+class VirtualClock:
+    """
+    A discrete event clock to simulate time.sleep based code at maximum speed.
+
+    The time only moves forward when every participant thread is sleeping on the clock: it then jumps to
+    the earliest deadline and the threads whose deadline is reached are woken up. Each thread sleeping on
+    the clock must be registered with join() before it first sleeps and unregistered with leave() when it
+    stops, otherwise the clock waits for it forever. A participant may also wait for an event set by another
+    one with set(), the time does not move forward while the event of a waiting participant is set.
+
+    Attributes:
+        now (float): The current virtual time in seconds.
+        participants (int): The number of threads sleeping on the clock.
+        sleeping (int): The number of participants currently sleeping.
+        deadlines (list): The wake up times of the sleeping participants.
+        events (list): The events the sleeping participants wait for.
+        sleepers (set): The sleeping threads.
+        woken (set): The threads woken up with wake() before their deadline.
+        condition (threading.Condition): Protects the clock and wakes up the sleeping participants.
+
+    Methods:
+        monotonic(): Returns the virtual time in seconds.
+        time(): Returns the virtual time in seconds.
+        sleep(seconds): Sleeps for the given virtual time.
+        wait(event, timeout): Sleeps until an event is set with set() or for the given virtual time.
+        set(event): Sets an event waited for with wait().
+        wake(thread): Wakes a thread sleeping on the clock up before its deadline, e.g. to stop it.
+        advance(): Jumps to the earliest deadline if every participant is sleeping.
+        join(): Registers a thread sleeping on the clock.
+        leave(): Unregisters a thread sleeping on the clock.
+    """
+
+    def __init__(self, participants=1, start=0.0):
+        """
+        Initializes a new instance of the VirtualClock class.
+
+        Args:
+            participants (int): The number of threads already sleeping on the clock (usually the calling thread).
+            start (float): The initial virtual time in seconds.
+        """
+        self.now = start
+        self.participants = participants
+        self.sleeping = 0
+        self.deadlines = []
+        self.events = []
+        self.sleepers = set()
+        self.woken = set()
+        self.condition = threading.Condition()
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        """
+        Sleeps for the given virtual time, or until the thread is woken up with wake().
+
+        Args:
+            seconds (float): The time to sleep in seconds.
+        """
+        self.wait(None, seconds)
+
+    def wait(self, event, timeout):
+        """
+        Sleeps until an event is set with set(), for the given virtual time, or until the thread is woken up with wake().
+
+        Args:
+            event (threading.Event): The event, None to sleep for the given time.
+            timeout (float): The maximum time to wait in seconds.
+
+        Returns:
+            bool: True if the event is set, False otherwise.
+        """
+        thread = threading.current_thread()
+        with self.condition:
+            deadline = self.now + max(0.0, timeout)
+            self.deadlines.append(deadline)
+            if event is not None:
+                self.events.append(event)
+            self.sleepers.add(thread)
+            self.sleeping += 1
+            try:
+                while self.now < deadline and thread not in self.woken and not (event is not None and event.is_set()):
+                    self.advance()
+                    if self.now < deadline:
+                        self.condition.wait()
+            finally:
+                self.sleeping -= 1
+                self.sleepers.discard(thread)
+                self.woken.discard(thread)
+                self.deadlines.remove(deadline)
+                if event is not None:
+                    self.events.remove(event)
+            return event is not None and event.is_set()
+
+    def set(self, event):
+        """
+        Sets an event waited for with wait(), the waiting participant runs before the time moves forward.
+
+        Args:
+            event (threading.Event): The event.
+        """
+        with self.condition:
+            event.set()
+            self.condition.notify_all()
+
+    def wake(self, thread):
+        """
+        Wakes a thread sleeping on the clock up before its deadline, or makes its next sleep return at once
+        if it is not sleeping, e.g. to stop a thread whose loop sleeps on the clock.
+
+        Args:
+            thread (threading.Thread): The thread.
+        """
+        with self.condition:
+            self.woken.add(thread)
+            self.condition.notify_all()
+
+    def advance(self):
+        """
+        Jumps to the earliest deadline if every participant is sleeping and none is already due.
+        Must be called with the condition held.
+        """
+        if self.woken & self.sleepers or any(event.is_set() for event in self.events):
+            return # a participant is about to run at the current time
+        if self.sleeping >= self.participants and self.deadlines:
+            earliest = min(self.deadlines)
+            if earliest > self.now:
+                self.now = earliest
+                self.condition.notify_all()
+
+    def join(self):
+        """
+        Registers a thread sleeping on the clock.
+        """
+        with self.condition:
+            self.participants += 1
+
+    def leave(self):
+        """
+        Unregisters a thread sleeping on the clock, the others may now be able to move forward.
+        """
+        with self.condition:
+            self.participants -= 1
+            self.advance()
@@ -0,0 +1,193 @@
+import threading
+from systems import FCC, MiniYoke, ApLAT, ApLONG, FMGS, FCU, FlightModel, FccStateMachine, initPygame, staleThresholds
+from bus import MessageBatch, PrefixedBus
+from scheduler import PeriodicTimer
+from clock import SystemClock
+from filters import buildChain
+from metrics import InputAges
+
+pygame = None # set by CockpitGroup.begin(), see systems.initPygame()
+
+class Cockpit:
+    """
+    The miniYoke module of one simulated cockpit: its subsystems, FCC, mini yoke and state machine,
+    talking in its own namespace of a shared bus.
+
+    Attributes:
+        name (str): The namespace of the cockpit on the bus, e.g. 'C1', None for a cockpit alone on its bus.
+        aviBus (PrefixedBus): The namespace of the cockpit on the shared bus, the bus itself without namespace.
+        apLat (ApLAT): The lateral autopilot.
+        apLong (ApLONG): The longitudinal autopilot.
+        fmgs (FMGS): The fmgs limits.
+        fcu (FCU): The flight control unit.
+        flightModel (FlightModel): The flight model state.
+        fcc (FCC): The Flight Control Computer.
+        miniYoke (MiniYoke): The mini yoke, its joystick is set by the CockpitGroup.
+        controlFrame (MessageBatch): The batch the nx, nz and p commands are sent with each cycle.
+        stateMachine (FccStateMachine): The state machine of the FCC.
+    """
+
+    def __init__(self, name, bus, alphaFilter=0.1, notifier=None, clock=None, filterSettings=None, inputAges=None):
+        """
+        Initializes a new instance of the Cockpit class and binds its parsers in its namespace.
+
+        Args:
+            name (str): The namespace of the cockpit on the bus, e.g. 'C1', None for a cockpit alone on its bus.
+            bus (AviBus): The bus shared by the cockpits, an AviBus or a LoopbackBus.
+            alphaFilter (float): The coefficient of the mini yoke low pass filter.
+            notifier (DataNotifier): The notifier shared by the cockpits, woken up by the parsers and the mini yoke.
+            clock (SystemClock): The clock of the mini yoke and of the inputs ages, the real clock by default.
+            filterSettings (dict): The buildChain settings of the mini yoke axes chains, None for the alphaFilter Smoothing.
+            inputAges (InputAges): The input ages the state machine records, its own by default.
+        """
+        self.name = name
+        self.aviBus = PrefixedBus(bus, name) if name is not None else bus
+
+        self.apLat = ApLAT(notifier=notifier, clock=clock)
+        self.apLong = ApLONG(notifier=notifier, clock=clock)
+        self.fmgs = FMGS(clock=clock)
+        self.fcu = FCU(notifier=notifier)
+        self.flightModel = FlightModel(notifier=notifier, clock=clock)
+
+        self.fcc = FCC(self.fcu, self.fmgs, self.flightModel, self.aviBus, clock=clock)
+        self.miniYoke = MiniYoke(self.fcc, alphaFilter=alphaFilter, notifier=notifier, clock=clock)
+        if filterSettings:
+            self.miniYoke.setFilters(*(buildChain(alpha=alphaFilter, rate=self.miniYoke.timer.rate, **filterSettings) for axis in ('pitch', 'roll')))
+        self.controlFrame = MessageBatch(self.aviBus, size=3)
+        self.stateMachine = FccStateMachine(self.fcc, self.miniYoke, self.apLat, self.apLong, self.controlFrame, inputAges=inputAges)
+
+        self.aviBus.bindRecord(self.apLat.receive, self.apLat.schema)
+        self.aviBus.bindRecord(self.apLong.receive, self.apLong.schema)
+        self.aviBus.bindRecord(self.fmgs.receive, self.fmgs.schema)
+        self.aviBus.bindMsg(self.fcu.parser, self.fcu.regex)
+        self.aviBus.bindRecord(self.flightModel.receive, self.flightModel.schema)
+
+class CockpitGroup:
+    """
+    Runs several cockpits in one process, one per attached joystick.
+
+    The cockpits share the bus and its dispatcher thread, a single polling thread samples every joystick
+    at the same rate and a single main loop steps every state machine when the shared notifier is woken up.
+
+    Attributes:
+        bus (AviBus): The bus shared by the cockpits.
+        alphaFilter (float): The coefficient of the mini yokes low pass filter.
+        filterSettings (dict): The buildChain settings of the mini yokes axes chains, None for the alphaFilter Smoothing.
+        notifier (DataNotifier): The notifier shared by the cockpits.
+        clock (SystemClock): The clock the polling thread sleeps on.
+        timer (PeriodicTimer): The timer pacing the polling loop.
+        namespaceFormat (str): The format of the cockpit namespaces, formatted with the cockpit number from 1.
+        cockpits (list): The cockpits, in the joysticks order.
+        inputAges (InputAges): The input ages shared by the state machines, their outputs are the namespaced commands.
+        threadRunning (bool): Indicates whether the polling thread is running.
+        listenerThread (threading.Thread): The polling thread, woken up by end(), None when not running.
+
+    Methods:
+        begin(): Opens every attached joystick and creates a cockpit for each.
+        addCockpit(joystick): Adds a cockpit reading a joystick.
+        listener(): The polling loop sampling every joystick.
+        step(): Runs one cycle of every state machine.
+        end(): Stops the polling loop.
+    """
+
+    def __init__(self, bus, alphaFilter=0.1, notifier=None, rate=10, clock=None, namespaceFormat='C{}', filterSettings=None):
+        """
+        Initializes a new instance of the CockpitGroup class.
+
+        Args:
+            bus (AviBus): The bus shared by the cockpits, an AviBus or a LoopbackBus.
+            alphaFilter (float): The coefficient of the mini yokes low pass filter.
+            notifier (DataNotifier): The notifier shared by the cockpits, None to disable it.
+            rate (float): The polling rate in Hz.
+            clock (SystemClock): The clock to use, the real clock by default.
+            namespaceFormat (str): The format of the cockpit namespaces, formatted with the cockpit number from 1.
+            filterSettings (dict): The buildChain settings of the mini yokes axes chains, None for the alphaFilter Smoothing.
+        """
+        self.bus = bus
+        self.alphaFilter = alphaFilter
+        self.filterSettings = filterSettings
+        self.notifier = notifier
+        self.clock = clock if clock is not None else SystemClock()
+        self.timer = PeriodicTimer(rate, clock=self.clock)
+        self.namespaceFormat = namespaceFormat
+        self.cockpits = []
+        self.inputAges = InputAges(staleThresholds)
+        self.threadRunning = True
+        self.listenerThread = None
+
+    def begin(self):
+        """
+        Initializes the pygame joystick subsystem, opens every attached joystick and creates a cockpit for each.
+
+        Returns:
+            bool: True if at least one joystick has been found, False otherwise.
+        """
+        global pygame
+        pygame = initPygame()
+
+        joystickCount = pygame.joystick.get_count()
+        if joystickCount == 0:
+            print("No joystick found. Please plug one.")
+            pygame.quit()
+            self.clock.sleep(2)
+            return False
+
+        for index in range(joystickCount):
+            joystick = pygame.joystick.Joystick(index)
+            joystick.init()
+            cockpit = self.addCockpit(joystick)
+            print("Cockpit {} : joystick {} ({})".format(cockpit.name, index, joystick.get_name()))
+
+        return True
+
+    def addCockpit(self, joystick):
+        """
+        Adds a cockpit reading a joystick, in the next namespace.
+
+        Args:
+            joystick (object): The joystick, a pygame joystick or an object with the same get_axis and get_button methods.
+
+        Returns:
+            Cockpit: The new cockpit.
+        """
+        cockpit = Cockpit(self.namespaceFormat.format(len(self.cockpits) + 1), self.bus,
+                          alphaFilter=self.alphaFilter, notifier=self.notifier, clock=self.clock, filterSettings=self.filterSettings,
+                          inputAges=self.inputAges)
+        cockpit.miniYoke.joystick = joystick
+        self.cockpits.append(cockpit)
+        return cockpit
+
+    def listener(self):
+        """
+        The polling loop: pumps the pygame events once then samples every joystick, at the timer rate.
+        The thread takes part in the clock until it stops, like the MiniYoke listener.
+        """
+        self.clock.join()
+        self.listenerThread = threading.current_thread()
+        try:
+            self.timer.start()
+            while self.threadRunning:
+                if pygame is not None: # None when the cockpits have been added without begin()
+                    pygame.event.pump()
+                for cockpit in self.cockpits:
+                    cockpit.miniYoke.sample()
+                self.timer.wait()
+        finally:
+            self.listenerThread = None
+            self.clock.leave()
+
+    def step(self):
+        """
+        Runs one cycle of every state machine, the cockpits without new data send nothing.
+        """
+        for cockpit in self.cockpits:
+            cockpit.stateMachine.step()
+
+    def end(self):
+        """
+        Stops the polling loop.
+        """
+        self.threadRunning = False
+        listenerThread = self.listenerThread
+        if listenerThread is not None:
+            self.clock.wake(listenerThread)
@@ -0,0 +1,131 @@
+"""
+Array versions of the FCC protection laws for offline envelope validation.
+
+The functions accept NumPy arrays (or scalars) broadcast against each other and return the same values,
+bit for bit, as FCC.nzLaw and FCC.pLaw called on each element. Python's max(a, min(b, x)) is reproduced
+with np.where instead of np.clip so the ties and NaN inputs give the same results as the scalar path.
+"""
+
+import numpy as np
+
+limitNames = ('nxMax', 'nxMin', 'nzMax', 'nzMin', 'pMax', 'pMin', 'phiMax', 'phiMin', 'fpaMax', 'fpaMin')
+
+def clamp(value, lower, upper):
+    """
+    Element wise equivalent of max(lower, min(upper, value)).
+
+    Args:
+        value (array): The values to clamp.
+        lower (array): The lower bounds.
+        upper (array): The upper bounds.
+
+    Returns:
+        array: The clamped values.
+    """
+    value = np.where(value < upper, value, upper)  # min(upper, value) keeps upper unless value is smaller
+    return np.where(value > lower, value, lower)  # max(lower, value) keeps lower unless value is greater
+
+def nzLaw(nz, pitchAxisValue, fpa, fpaMin, fpaMax, nzMin, nzMax, nzMargin):
+    """
+    Array version of FCC.nzLaw.
+
+    Args:
+        nz (array): The nz commands.
+        pitchAxisValue (array): The pitch axis values.
+        fpa (array): The flight path angles of the flight model.
+        fpaMin (array): The fmgs minimum flight path angles.
+        fpaMax (array): The fmgs maximum flight path angles.
+        nzMin (array): The fmgs minimum nz.
+        nzMax (array): The fmgs maximum nz.
+        nzMargin (float): The margin of the nz control law (FCC.nzMargin).
+
+    Returns:
+        array: The nz values either limited in nz or fpa.
+    """
+    nz, pitchAxisValue, fpa = np.asarray(nz, dtype=float), np.asarray(pitchAxisValue, dtype=float), np.asarray(fpa, dtype=float)
+    fpaMin, fpaMax = np.asarray(fpaMin, dtype=float), np.asarray(fpaMax, dtype=float)
+    nzMin, nzMax = np.asarray(nzMin, dtype=float), np.asarray(nzMax, dtype=float)
+
+    fpaMinProtection = (fpa <= fpaMin * nzMargin) & (pitchAxisValue < 0)
+    fpaMaxProtection = (fpa >= fpaMax * nzMargin) & (pitchAxisValue > 0)
+
+    result = clamp(nz, nzMin, nzMax)
+    result = np.where(fpaMaxProtection, nzMin, result)
+    return np.where(fpaMinProtection, nzMax, result)  # checked first by the scalar law
+
+def pLaw(p, rollAxisValue, phi, phiMin, phiMax, pMin, pMax, pMargin):
+    """
+    Array version of FCC.pLaw.
+
+    Args:
+        p (array): The p commands.
+        rollAxisValue (array): The roll axis values.
+        phi (array): The roll angles of the flight model.
+        phiMin (array): The fmgs minimum roll angles.
+        phiMax (array): The fmgs maximum roll angles.
+        pMin (array): The fmgs minimum p.
+        pMax (array): The fmgs maximum p.
+        pMargin (float): The margin of the p control law (FCC.pMargin).
+
+    Returns:
+        array: The p values either limited in p or phi.
+    """
+    p, rollAxisValue, phi = np.asarray(p, dtype=float), np.asarray(rollAxisValue, dtype=float), np.asarray(phi, dtype=float)
+    phiMin, phiMax = np.asarray(phiMin, dtype=float), np.asarray(phiMax, dtype=float)
+    pMin, pMax = np.asarray(pMin, dtype=float), np.asarray(pMax, dtype=float)
+
+    phiProtection = ((phi < phiMin * pMargin) & (rollAxisValue < 0)) | ((phi > phiMax * pMargin) & (rollAxisValue > 0))
+
+    return np.where(phiProtection, 0.0, clamp(p, pMin, pMax))
+
+def limitsArrays(limits):
+    """
+    Gathers a sequence of fmgs limits into one array per limit.
+
+    Args:
+        limits (list): The FMGS objects or FmgsLimits snapshots.
+
+    Returns:
+        dict: The 1-D array of each limit by name.
+    """
+    return {name: np.array([getattr(limit, name) for limit in limits], dtype=float) for name in limitNames}
+
+def sweepNz(fcc, nz, pitchAxisValue, fpa, limits):
+    """
+    Evaluates the nz law over every combination of nz command, pitch axis value, fpa and fmgs limits.
+
+    Args:
+        fcc (FCC): The FCC whose nzMargin is used.
+        nz (array): The 1-D nz commands.
+        pitchAxisValue (array): The 1-D pitch axis values.
+        fpa (array): The 1-D flight path angles.
+        limits (list): The FMGS objects or FmgsLimits snapshots.
+
+    Returns:
+        array: The nz values, with shape (len(limits), len(nz), len(pitchAxisValue), len(fpa)).
+    """
+    envelope = {name: values[:, None, None, None] for name, values in limitsArrays(limits).items()}
+    nz, pitchAxisValue, fpa = np.ix_(np.asarray(nz, dtype=float), np.asarray(pitchAxisValue, dtype=float), np.asarray(fpa, dtype=float))
+
+    return nzLaw(nz[None], pitchAxisValue[None], fpa[None], envelope['fpaMin'], envelope['fpaMax'],
+                 envelope['nzMin'], envelope['nzMax'], fcc.nzMargin)
+
+def sweepP(fcc, p, rollAxisValue, phi, limits):
+    """
+    Evaluates the p law over every combination of p command, roll axis value, phi and fmgs limits.
+
+    Args:
+        fcc (FCC): The FCC whose pMargin is used.
+        p (array): The 1-D p commands.
+        rollAxisValue (array): The 1-D roll axis values.
+        phi (array): The 1-D roll angles.
+        limits (list): The FMGS objects or FmgsLimits snapshots.
+
+    Returns:
+        array: The p values, with shape (len(limits), len(p), len(rollAxisValue), len(phi)).
+    """
+    envelope = {name: values[:, None, None, None] for name, values in limitsArrays(limits).items()}
+    p, rollAxisValue, phi = np.ix_(np.asarray(p, dtype=float), np.asarray(rollAxisValue, dtype=float), np.asarray(phi, dtype=float))
+
+    return pLaw(p[None], rollAxisValue[None], phi[None], envelope['phiMin'], envelope['phiMax'],
+                envelope['pMin'], envelope['pMax'], fcc.pMargin)
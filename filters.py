@@ -0,0 +1,437 @@
+"""
+The input filters of the mini yoke axes.
+
+A FilterChain runs the stages of an axis in order, e.g. a deadband, an expo curve, a low pass and a rate limit.
+The stages are defined in physical units (a cutoff frequency in Hz, a rate in axis units per second) and their
+coefficients are computed once for the sampling rate by configure(), so each sample only costs a few
+multiplications and the response does not change with the listener rate.
+
+Each chain also filters a whole recorded signal with batch(), from the same coefficients, to design and validate
+the filters offline against the axes of a flight data file. The memoryless stages (Deadband, Expo) are NumPy array
+expressions, the recursive ones (the low pass filters and the rate limit) still run sample by sample over the signal:
+    python3 filters.py flight.fdr --cutoff 1.5 --order 2 --deadband 0.05 --png filters.png
+"""
+
+import math, sys
+
+class Smoothing:
+    """
+    The first order exponential filter of a fixed coefficient, its cutoff frequency depends on the sampling rate.
+
+    Attributes:
+        alpha (float): The weight of the new value.
+        value (float): The last output.
+    """
+
+    def __init__(self, alpha):
+        self.alpha = alpha
+        self.value = 0.0
+
+    def configure(self, dt):
+        pass
+
+    def reset(self, value=0.0):
+        self.value = value
+
+    def steady(self, x):
+        return x
+
+    def step(self, x):
+        self.value = self.alpha * x + (1 - self.alpha) * self.value
+        return self.value
+
+    def batch(self, values, initial=0.0):
+        alpha, y, out = self.alpha, initial, []
+        for x in values.tolist():
+            y = alpha * x + (1 - alpha) * y
+            out.append(y)
+        return out
+
+class LowPass1:
+    """
+    The first order low pass filter of a cutoff frequency.
+
+    Attributes:
+        cutoff (float): The cutoff frequency in Hz.
+        a (float): The weight of the new value for the sampling period, computed by configure().
+        value (float): The last output.
+    """
+
+    def __init__(self, cutoff):
+        self.cutoff = cutoff
+        self.a = 1.0
+        self.value = 0.0
+
+    def configure(self, dt):
+        self.a = 1 - math.exp(-2 * math.pi * self.cutoff * dt)
+
+    def reset(self, value=0.0):
+        self.value = value
+
+    def steady(self, x):
+        return x
+
+    def step(self, x):
+        self.value += self.a * (x - self.value)
+        return self.value
+
+    def batch(self, values, initial=0.0):
+        a, y, out = self.a, initial, []
+        for x in values.tolist():
+            y += a * (x - y)
+            out.append(y)
+        return out
+
+class LowPass2:
+    """
+    The second order low pass filter of a cutoff frequency, a biquad designed by the bilinear transform.
+
+    Attributes:
+        cutoff (float): The cutoff frequency in Hz, below the half of the sampling rate.
+        q (float): The quality factor, 0.7071 for a Butterworth response without overshoot.
+        coefficients (tuple): The b0, b1, b2, a1 and a2 coefficients, computed by configure().
+        z1 (float): The first state of the transposed direct form II.
+        z2 (float): The second state of the transposed direct form II.
+    """
+
+    def __init__(self, cutoff, q=0.7071):
+        self.cutoff = cutoff
+        self.q = q
+        self.coefficients = (1.0, 0.0, 0.0, 0.0, 0.0)
+        self.z1 = 0.0
+        self.z2 = 0.0
+
+    def configure(self, dt):
+        k = math.tan(math.pi * min(self.cutoff * dt, 0.49))
+        norm = 1 / (1 + k / self.q + k * k)
+        b0 = k * k * norm
+        self.coefficients = (b0, 2 * b0, b0, 2 * (k * k - 1) * norm, (1 - k / self.q + k * k) * norm)
+
+    def reset(self, value=0.0):
+        b0, b1, b2, a1, a2 = self.coefficients
+        self.z2 = (b2 - a2) * value
+        self.z1 = (b1 - a1) * value + self.z2
+
+    def steady(self, x):
+        return x
+
+    def step(self, x):
+        b0, b1, b2, a1, a2 = self.coefficients
+        y = b0 * x + self.z1
+        self.z1 = b1 * x - a1 * y + self.z2
+        self.z2 = b2 * x - a2 * y
+        return y
+
+    def batch(self, values, initial=0.0):
+        b0, b1, b2, a1, a2 = self.coefficients
+        z2 = (b2 - a2) * initial
+        z1 = (b1 - a1) * initial + z2
+        out = []
+        for x in values.tolist():
+            y = b0 * x + z1
+            z1 = b1 * x - a1 * y + z2
+            z2 = b2 * x - a2 * y
+            out.append(y)
+        return out
+
+class Deadband:
+    """
+    Reads the values inside a band around 0 as 0, the values outside are rescaled to keep the full range.
+
+    Attributes:
+        width (float): The half width of the band, below 1.
+    """
+
+    def __init__(self, width):
+        self.width = width
+
+    def configure(self, dt):
+        pass
+
+    def reset(self, value=0.0):
+        pass
+
+    def steady(self, x):
+        return self.step(x)
+
+    def step(self, x):
+        if abs(x) <= self.width:
+            return 0.0
+        return math.copysign((abs(x) - self.width) / (1 - self.width), x)
+
+    def batch(self, values, initial=0.0):
+        import numpy as np
+        return np.sign(values) * np.maximum(np.abs(values) - self.width, 0.0) / (1 - self.width)
+
+class Expo:
+    """
+    The expo curve softening the center of the axis: (1 - amount) * x + amount * x**3.
+
+    Attributes:
+        amount (float): The weight of the cubic term, 0 for a linear axis, 1 for a cubic one.
+    """
+
+    def __init__(self, amount):
+        self.amount = amount
+
+    def configure(self, dt):
+        pass
+
+    def reset(self, value=0.0):
+        pass
+
+    def steady(self, x):
+        return self.step(x)
+
+    def step(self, x):
+        return (1 - self.amount) * x + self.amount * x * x * x
+
+    def batch(self, values, initial=0.0):
+        return (1 - self.amount) * values + self.amount * values ** 3
+
+class RateLimit:
+    """
+    Limits the rate of change of the axis.
+
+    Attributes:
+        rate (float): The maximum rate of change in axis units per second.
+        maxStep (float): The maximum change per sample, computed by configure().
+        value (float): The last output.
+    """
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.maxStep = math.inf
+        self.value = 0.0
+
+    def configure(self, dt):
+        self.maxStep = self.rate * dt
+
+    def reset(self, value=0.0):
+        self.value = value
+
+    def steady(self, x):
+        return x
+
+    def step(self, x):
+        self.value += max(-self.maxStep, min(self.maxStep, x - self.value))
+        return self.value
+
+    def batch(self, values, initial=0.0):
+        maxStep, y, out = self.maxStep, initial, []
+        for x in values.tolist():
+            y += max(-maxStep, min(maxStep, x - y))
+            out.append(y)
+        return out
+
+class FilterChain:
+    """
+    The filter stages of an axis, run in order.
+
+    Attributes:
+        stages (tuple): The stages, each with configure(dt), reset(value), steady(x), step(x) and batch(values, initial) methods,
+            steady(x) returning the output of the stage in steady state.
+        rate (float): The sampling rate in Hz the coefficients are computed for.
+
+    Methods:
+        configure(rate): Computes the coefficients of the stages for a sampling rate.
+        reset(value): Sets the state of the stages to a steady value.
+        steady(x): Returns the output of the chain in steady state.
+        step(x): Filters a sample.
+        batch(values, initial): Filters a whole signal from a steady initial value, the state of the chain is not changed.
+    """
+
+    def __init__(self, *stages, rate=10):
+        """
+        Initializes a new instance of the FilterChain class.
+
+        Args:
+            *stages: The stages, in order.
+            rate (float): The sampling rate in Hz.
+        """
+        self.stages = stages
+        self.configure(rate)
+
+    def configure(self, rate):
+        """
+        Computes the coefficients of the stages for a sampling rate and resets their state.
+
+        Args:
+            rate (float): The sampling rate in Hz.
+        """
+        self.rate = rate
+        for stage in self.stages:
+            stage.configure(1 / rate)
+        self.reset()
+
+    def reset(self, value=0.0):
+        """
+        Sets the state of the stages to a steady value.
+
+        Args:
+            value (float): The steady input value.
+        """
+        for stage in self.stages:
+            stage.reset(value)
+            value = stage.steady(value)
+
+    def steady(self, x):
+        """
+        Returns the output of the chain in steady state, the value its output settles at for a constant input.
+        It is not the input when the chain has a deadband or an expo stage.
+
+        Args:
+            x (float): The constant input value.
+
+        Returns:
+            float: The steady output value.
+        """
+        for stage in self.stages:
+            x = stage.steady(x)
+        return x
+
+    def step(self, x):
+        """
+        Filters a sample.
+
+        Args:
+            x (float): The input value.
+
+        Returns:
+            float: The output value.
+        """
+        for stage in self.stages:
+            x = stage.step(x)
+        return x
+
+    def batch(self, values, initial=0.0):
+        """
+        Filters a whole signal, starting from a steady initial value, without changing the state of the chain.
+
+        Args:
+            values (array): The input values, sampled at the rate of the chain.
+            initial (float): The steady input value before the signal.
+
+        Returns:
+            numpy.ndarray: The output values.
+        """
+        import numpy as np # only needed offline, the mini yoke filters sample by sample
+        values = np.asarray(values, dtype=np.float64)
+        for stage in self.stages:
+            values = np.asarray(stage.batch(values, initial), dtype=np.float64)
+            initial = stage.steady(initial)
+        return values
+
+def riseTime(chain, low=0.1, high=0.9, duration=10.0):
+    """
+    Returns the time the chain takes to go from 10% to 90% of a unit step.
+
+    Args:
+        chain (FilterChain): The filter chain.
+        low (float): The low fraction of the step.
+        high (float): The high fraction of the step.
+        duration (float): The duration of the simulated step in seconds.
+
+    Returns:
+        float: The rise time in seconds, None if the step is not reached within the duration.
+    """
+    import numpy as np
+    response = chain.batch(np.ones(int(duration * chain.rate)))
+    above = np.nonzero(response >= high)[0]
+    if not len(above):
+        return None
+    return (above[0] - np.nonzero(response >= low)[0][0]) / chain.rate
+
+def buildChain(cutoff=None, order=1, deadband=0.0, expo=0.0, rateLimit=None, alpha=0.1, rate=10):
+    """
+    Builds the chain of an axis from its settings: deadband, expo, low pass then rate limit.
+
+    Args:
+        cutoff (float): The cutoff frequency in Hz, None for the fixed coefficient Smoothing filter of alpha.
+        order (int): The order of the low pass filter, 1 or 2.
+        deadband (float): The half width of the deadband, 0 for none.
+        expo (float): The amount of expo, 0 for none.
+        rateLimit (float): The maximum rate of change in axis units per second, None for none.
+        alpha (float): The coefficient of the Smoothing filter when no cutoff is given.
+        rate (float): The sampling rate in Hz.
+
+    Returns:
+        FilterChain: The chain.
+    """
+    stages = []
+    if deadband:
+        stages.append(Deadband(deadband))
+    if expo:
+        stages.append(Expo(expo))
+    if cutoff is None:
+        stages.append(Smoothing(alpha))
+    else:
+        stages.append(LowPass2(cutoff) if order == 2 else LowPass1(cutoff))
+    if rateLimit is not None:
+        stages.append(RateLimit(rateLimit))
+    return FilterChain(*stages, rate=rate)
+
+def compareAxis(records, axis, chain):
+    """
+    Filters an axis of a flight data file with a chain and compares it to the filtered axis recorded in flight.
+
+    Args:
+        records (numpy.ndarray): The records of loadFlightRecord.
+        axis (str): The axis, 'pitch' or 'roll'.
+        chain (FilterChain): The chain, at the rate of the records.
+
+    Returns:
+        dict: The raw, recorded and new filtered values, and the roughness (rms of the sample to sample changes) of each.
+    """
+    import numpy as np
+    raw = records[axis + 'Axis'].astype(np.float64)
+    recorded = records['filtered' + axis.capitalize() + 'Axis'].astype(np.float64)
+    filtered = chain.batch(raw)
+    roughness = lambda values: float(np.sqrt(np.mean(np.diff(values) ** 2))) if len(values) > 1 else 0.0
+    return {'raw': raw, 'recorded': recorded, 'filtered': filtered,
+            'rawRoughness': roughness(raw), 'recordedRoughness': roughness(recorded), 'filteredRoughness': roughness(filtered)}
+
+if __name__ == '__main__':
+    import argparse # only the command line needs it, the mini yoke imports this module at startup
+    argParser = argparse.ArgumentParser(description="Designs the axis filters offline against the axes of a flight data file recorded with main.py --fdr")
+    argParser.add_argument('path', help="the flight data file")
+    argParser.add_argument('--cutoff', type=float, help="cutoff frequency of the low pass in Hz, the alpha filter by default")
+    argParser.add_argument('--order', type=int, choices=[1, 2], default=1, help="order of the low pass")
+    argParser.add_argument('--alpha', type=float, default=0.1, help="coefficient of the alpha filter without cutoff")
+    argParser.add_argument('--deadband', type=float, default=0.0, help="half width of the deadband")
+    argParser.add_argument('--expo', type=float, default=0.0, help="amount of expo")
+    argParser.add_argument('--rateLimit', type=float, help="maximum rate of change in axis units per second")
+    argParser.add_argument('--png', metavar='FILE', help="plot the raw, recorded and new filtered axes to a PNG file")
+    args = argParser.parse_args()
+
+    import numpy as np
+    from flightRecorder import loadFlightRecord
+
+    records, layout = loadFlightRecord(args.path)
+    if len(records) < 2:
+        print('Not enough records in {}'.format(args.path))
+        sys.exit(1)
+    rate = 1 / float(np.median(np.diff(records['t'])))
+    chain = buildChain(args.cutoff, args.order, args.deadband, args.expo, args.rateLimit, args.alpha, rate)
+    rise = riseTime(chain)
+    print('{} records at {:.1f} Hz, step rise time {}'.format(len(records), rate, '{:.3f} s'.format(rise) if rise is not None else 'over 10 s'))
+
+    results = {axis: compareAxis(records, axis, chain) for axis in ('pitch', 'roll')}
+    for axis, result in results.items():
+        print('{:>5} roughness raw {:.4f}  recorded {:.4f}  filtered {:.4f}'.format(
+            axis, result['rawRoughness'], result['recordedRoughness'], result['filteredRoughness']))
+
+    if args.png:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+        figure, axes = plt.subplots(2, 1, sharex=True, figsize=(10, 6))
+        for plot, (axis, result) in zip(axes, results.items()):
+            plot.plot(records['t'], result['raw'], label='raw', alpha=0.5)
+            plot.plot(records['t'], result['recorded'], label='recorded filter')
+            plot.plot(records['t'], result['filtered'], label='new filter')
+            plot.set_ylabel(axis)
+            plot.legend(loc='upper right')
+        axes[-1].set_xlabel('time (s)')
+        figure.savefig(args.png)
+    sys.exit(0)
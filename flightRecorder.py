@@ -0,0 +1,222 @@
+"""
+Memory-mapped binary flight data recorder.
+
+The samples of the mini yoke are appended as fixed layout records to a memory-mapped file, so recording is a
+copy into the mapping and the RAM used does not grow with the session: the kernel writes the pages back and
+can evict them. The file is a 4096 bytes header followed by the records:
+- magic (4 bytes 'FDR1'), header size (uint32), number of flushed records (uint64)
+- the length (uint32) and the JSON of the layout: the NumPy record dtype and the session start time.
+
+The number of records in the header is only updated after the records have been flushed, so a file left by a
+crash holds every record up to the last flush. loadFlightRecord maps it back as a NumPy structured array.
+"""
+
+import os, sys, json, struct, time, threading, argparse
+import numpy as np
+from clock import SystemClock
+
+magic = b'FDR1'
+headerSize = 4096  # the records start on a page boundary
+headerFormat = '<4sIQ'
+
+# One record per mini yoke sample, the axis values are the raw joystick values and the low pass filtered ones.
+# The values that are not computed (None, e.g. nx while the nx law is not implemented) are recorded as NaN.
+recordType = np.dtype([
+    ('t', '<f8'),
+    ('throttleAxis', '<f4'), ('pitchAxis', '<f4'), ('rollAxis', '<f4'),
+    ('filteredPitchAxis', '<f4'), ('filteredRollAxis', '<f4'),
+    ('nx', '<f4'), ('nz', '<f4'), ('p', '<f4'),
+    ('state', 'i1'),
+    ('x', '<f8'), ('y', '<f8'), ('z', '<f8'), ('Vp', '<f4'), ('fpa', '<f4'), ('psi', '<f4'), ('phi', '<f4'),
+    ('nxMax', '<f4'), ('nxMin', '<f4'), ('nzMax', '<f4'), ('nzMin', '<f4'), ('pMax', '<f4'), ('pMin', '<f4'),
+    ('phiMax', '<f4'), ('phiMin', '<f4'), ('fpaMax', '<f4'), ('fpaMin', '<f4'),
+])
+
+# The FCC states recorded in the state field, -1 for an unknown state
+stateCodes = {'MANUAL': 0, 'AP_ENGAGED': 1}
+
+class FlightRecorder:
+    """
+    Appends the mini yoke samples to a memory-mapped flight data file.
+
+    The file is grown by chunks of records and remapped when full, and the records are flushed to disk at
+    most every flushInterval seconds, the number of records in the header being updated after them.
+
+    Attributes:
+        path (str): The path of the flight data file.
+        clock (SystemClock): The clock the record times are taken from.
+        startTime (float): The monotonic time of the beginning of the session.
+        growRecords (int): The number of records the file is grown by when full.
+        flushInterval (float): The maximum time in seconds between two flushes.
+        count (int): The number of records appended.
+        flushedCount (int): The number of records flushed to disk.
+        records (numpy.memmap): The mapped records of the file.
+        lock (threading.Lock): Serializes the appends and the close.
+
+    Methods:
+        recordSample(miniYoke): Appends a record of the sample the mini yoke has just computed.
+        append(values): Appends a record.
+        flush(): Writes the appended records to disk and updates the header.
+        close(): Flushes and truncates the file to its records.
+    """
+
+    def __init__(self, path, clock=None, growRecords=65536, flushInterval=1.0):
+        """
+        Initializes a new instance of the FlightRecorder class and creates the flight data file.
+
+        Args:
+            path (str): The path of the flight data file, overwritten if it exists.
+            clock (SystemClock): The clock the record times are taken from, the real clock by default.
+            growRecords (int): The number of records the file is grown by when full (65536 is 11 minutes at 100 Hz).
+            flushInterval (float): The maximum time in seconds between two flushes.
+        """
+        self.path = path
+        self.clock = clock if clock is not None else SystemClock()
+        self.startTime = self.clock.monotonic()
+        self.growRecords = growRecords
+        self.flushInterval = flushInterval
+        self.count = 0
+        self.flushedCount = 0
+        self.lastFlush = self.startTime
+        self.lock = threading.Lock()
+
+        layout = json.dumps({'dtype': recordType.descr, 'startTime': self.clock.time()}).encode()
+        if struct.calcsize(headerFormat) + 4 + len(layout) > headerSize:
+            raise ValueError('The record layout does not fit in the header')
+
+        self.file = open(path, 'w+b')
+        self.file.write(struct.pack(headerFormat, magic, headerSize, 0) + struct.pack('<I', len(layout)) + layout)
+        self.file.truncate(headerSize)
+        self.records = None
+        self.grow()
+
+    def grow(self):
+        """
+        Grows the file by growRecords records and maps it again.
+        """
+        capacity = self.growRecords
+        if self.records is not None:
+            capacity += len(self.records)
+            self.records.flush()
+            self.records = None  # unmapped before the file is resized
+        self.file.truncate(headerSize + capacity * recordType.itemsize)
+        self.records = np.memmap(self.file, dtype=recordType, mode='r+', offset=headerSize, shape=(capacity,))
+
+    def recordSample(self, miniYoke):
+        """
+        Appends a record of the sample the mini yoke has just computed, with the FCC commands and state,
+        the last StateVector and the fmgs limits.
+
+        Args:
+            miniYoke (MiniYoke): The mini yoke that has just computed a sample.
+        """
+        fcc = miniYoke.fcc
+        state = fcc.flightModel.snapshot.read()
+        limits = fcc.fmgs.limits.read()
+        self.append((self.clock.monotonic() - self.startTime,
+                     miniYoke.throttleAxisValue, miniYoke.pitchAxisValue, miniYoke.rollAxisValue,
+                     miniYoke.filteredPitchAxisValue, miniYoke.filteredRollAxisValue,
+                     fcc.nx, fcc.nz, fcc.p, stateCodes.get(fcc.state, -1),
+                     state.x, state.y, state.z, state.Vp, state.fpa, state.psi, state.phi,
+                     limits.nxMax, limits.nxMin, limits.nzMax, limits.nzMin, limits.pMax, limits.pMin,
+                     limits.phiMax, limits.phiMin, limits.fpaMax, limits.fpaMin))
+
+    def append(self, values):
+        """
+        Appends a record, flushing the file if the last flush is older than flushInterval.
+
+        Args:
+            values (tuple): The values of the record, in the recordType fields order.
+        """
+        with self.lock:
+            if self.records is None:
+                return  # closed
+            if self.count == len(self.records):
+                self.grow()
+            self.records[self.count] = values
+            self.count += 1
+
+            now = self.clock.monotonic()
+            if now - self.lastFlush >= self.flushInterval:
+                self.flushRecords()
+                self.lastFlush = now
+
+    def flushRecords(self):
+        self.records.flush()  # the records first, the header never counts records that are not on disk
+        self.file.seek(struct.calcsize('<4sI'))
+        self.file.write(struct.pack('<Q', self.count))
+        self.file.flush()
+        self.flushedCount = self.count
+
+    def flush(self):
+        """
+        Writes the appended records to disk and updates the number of records of the header.
+        """
+        with self.lock:
+            if self.records is not None:
+                self.flushRecords()
+
+    def close(self):
+        """
+        Flushes the records and truncates the file to them.
+        """
+        with self.lock:
+            if self.records is None:
+                return
+            self.flushRecords()
+            self.records = None  # unmapped before the file is truncated
+            self.file.truncate(headerSize + self.count * recordType.itemsize)
+            self.file.close()
+
+def readHeader(file):
+    """
+    Reads the header of a flight data file.
+
+    Args:
+        file (file): The file opened in binary mode.
+
+    Returns:
+        tuple: The number of flushed records and the layout dict (dtype and startTime).
+    """
+    fixed = file.read(struct.calcsize(headerFormat))
+    fileMagic, size, count = struct.unpack(headerFormat, fixed)
+    if fileMagic != magic or size != headerSize:
+        raise ValueError('Not a flight data file')
+    layoutLength, = struct.unpack('<I', file.read(4))
+    layout = json.loads(file.read(layoutLength))
+    return count, layout
+
+def loadFlightRecord(path):
+    """
+    Maps the records of a flight data file, without reading nor parsing them.
+
+    Args:
+        path (str): The path of the flight data file.
+
+    Returns:
+        tuple: The records as a read only NumPy structured array and the layout dict (dtype and startTime).
+    """
+    with open(path, 'rb') as file:
+        count, layout = readHeader(file)
+    dtype = np.dtype([tuple(field) for field in layout['dtype']])
+
+    available = (os.path.getsize(path) - headerSize) // dtype.itemsize
+    count = min(count, available)
+    if count == 0:
+        return np.zeros(0, dtype=dtype), layout
+    return np.memmap(path, dtype=dtype, mode='r', offset=headerSize, shape=(count,)), layout
+
+if __name__ == '__main__':
+    argParser = argparse.ArgumentParser(description="Summary of a flight data file recorded with main.py --fdr")
+    argParser.add_argument('path', help="the flight data file")
+    argParser.add_argument('--fields', nargs='+', default=['nx', 'nz', 'p', 'fpa', 'phi'], help="the fields to summarize")
+    args = argParser.parse_args()
+
+    records, layout = loadFlightRecord(args.path)
+    duration = float(records['t'][-1]) if len(records) else 0.0
+    print('{} records, {:.1f} s from {}'.format(len(records), duration, time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(layout['startTime']))))
+    for name in args.fields:
+        values = records[name]
+        if len(values):
+            print('{:>8} min {:>10.4f}  mean {:>10.4f}  max {:>10.4f}'.format(name, values.min(), values.mean(), values.max()))
+    sys.exit(0)
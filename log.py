@@ -0,0 +1,133 @@
+"""
+Asynchronous, rate limited logging of the miniYoke module.
+
+The records are filtered and queued in the calling thread, then formatted and written by a background
+thread, so the Ivy callbacks and the yoke listener never wait on the terminal. The loggers are named
+'miniYoke.<category>' so each category can get its own level.
+"""
+
+import sys, time, queue, threading, logging, logging.handlers
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets at most a given number of records per second through for each message type of a category.
+
+    The message type is the logger name with the unformatted message, so 'p = %s' records are limited
+    together whatever their values. The number of suppressed records is appended to the next one let through.
+
+    Attributes:
+        rates (dict): The records per second allowed for each logger name, missing names are not limited.
+        buckets (dict): The (tokens, last refill time, suppressed count) of each message type.
+        lock (threading.Lock): Protects the buckets, the records come from several threads.
+
+    Methods:
+        filter(record): Returns True if the record is let through.
+    """
+
+    def __init__(self, rates):
+        """
+        Initializes a new instance of the RateLimitFilter class.
+
+        Args:
+            rates (dict): The records per second allowed for each logger name.
+        """
+        super().__init__()
+        self.rates = rates
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        rate = self.rates.get(record.name)
+        if rate is None:
+            return True
+
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self.lock:
+            tokens, lastTime, suppressed = self.buckets.get(key, (rate, now, 0))
+            tokens = min(rate, tokens + (now - lastTime) * rate)  # the burst is limited to one second of records
+            if tokens < 1:
+                self.buckets[key] = (tokens, now, suppressed + 1)
+                return False
+            self.buckets[key] = (tokens - 1, now, 0)
+
+        if suppressed:
+            record.msg = '{} ({} similar messages suppressed)'.format(record.msg, suppressed)
+        return True
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    A QueueHandler that drops the records when the queue is full instead of blocking the caller.
+
+    Attributes:
+        dropped (int): The number of records dropped because the queue was full.
+    """
+
+    def __init__(self, recordQueue):
+        super().__init__(recordQueue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record  # formatted by the background thread, the arguments are plain values
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class LogSystem:
+    """
+    The background logging of the module, returned by setupLogging.
+
+    Attributes:
+        handler (DroppingQueueHandler): The handler queuing the records of the 'miniYoke' loggers.
+        listener (QueueListener): The background thread writing the records.
+
+    Methods:
+        stop(): Writes the queued records and stops the background thread.
+    """
+
+    def __init__(self, handler, listener):
+        self.handler = handler
+        self.listener = listener
+
+    def stop(self):
+        """
+        Writes the queued records and stops the background thread.
+        """
+        self.listener.stop()
+        logging.getLogger('miniYoke').removeHandler(self.handler)
+        if self.handler.dropped:
+            print('{} log records dropped, the log queue was full'.format(self.handler.dropped))
+
+def setupLogging(levels=None, rateLimits=None, stream=None, queueSize=10000):
+    """
+    Configures the 'miniYoke' loggers to write through a queue from a background thread.
+
+    Args:
+        levels (dict): The level of each category logger, e.g. {'miniYoke.apLat': logging.WARNING}.
+        rateLimits (dict): The records per second allowed for each message type of a category logger.
+        stream (file): The stream the records are written to, sys.stdout by default.
+        queueSize (int): The maximum number of queued records, the newer ones are dropped when it is full.
+
+    Returns:
+        LogSystem: The logging system, to stop when the module is closed.
+    """
+    recordQueue = queue.Queue(maxsize=queueSize)
+    handler = DroppingQueueHandler(recordQueue)
+    handler.addFilter(RateLimitFilter(rateLimits or {}))
+
+    output = logging.StreamHandler(stream if stream is not None else sys.stdout)
+    output.setFormatter(logging.Formatter('%(message)s'))
+    listener = logging.handlers.QueueListener(recordQueue, output)
+
+    root = logging.getLogger('miniYoke')
+    root.setLevel(logging.INFO)
+    root.propagate = False
+    root.addHandler(handler)
+    for name, level in (levels or {}).items():
+        logging.getLogger(name).setLevel(level)
+
+    listener.start()
+    return LogSystem(handler, listener)
@@ -1,21 +1,46 @@
-import threading, sys
-from systems import FCC, MiniYoke, ApLAT, ApLONG, FMGS, FCU, FlightModel
-from bus import AviBus
+import threading, sys, argparse, asyncio
+from systems import FCC, MiniYoke, ApLAT, ApLONG, FMGS, FCU, FlightModel, FccStateMachine, staleThresholds
+from bus import AviBus, MessageBatch
+from scheduler import DataNotifier
+from clock import SystemClock
+from log import setupLogging
+from replay import SessionRecorder
+from filters import buildChain
 
 aviBus = AviBus(appName="MiniYokeModule", adress="192.168.219.255:2087")
+controlFrame = MessageBatch(aviBus, size=3) # nx, nz and p commands sent together each cycle
 
-apLat = ApLAT()
-apLong = ApLONG()
-fmgs = FMGS() 
-fcu = FCU()
-flightModel = FlightModel()
+clock = SystemClock() # replace with a VirtualClock to simulate the module, the main thread is then its first participant
+notifier = DataNotifier(clock=clock) # woken up by the parsers and the miniYoke listener, the main loop waits on the clock
 
-fcc = FCC(fcu, fmgs, flightModel, aviBus)
-miniYoke = MiniYoke(fcc, alphaFilter=0.1)
+apLat = ApLAT(notifier=notifier, clock=clock)
+apLong = ApLONG(notifier=notifier, clock=clock)
+fmgs = FMGS(clock=clock) 
+fcu = FCU(notifier=notifier)
+flightModel = FlightModel(notifier=notifier, clock=clock)
+
+fcc = FCC(fcu, fmgs, flightModel, aviBus, clock=clock)
+miniYoke = MiniYoke(fcc, alphaFilter=0.1, notifier=notifier, clock=clock)
+
+stateMachine = FccStateMachine(fcc, miniYoke, apLat, apLong, controlFrame)
+cockpits = None # CockpitGroup of the multi cockpit mode, None in the single cockpit mode
+asyncFrontEnd = None # AsyncBus of the asyncio mode, None in the threaded modes
+busMetrics = None # BusMetrics of the bus handlers, None when not instrumented
+coalescedFamilies = [] # only the newest unprocessed message of these families is handled, none by default
+filterSettings = None # buildChain settings of the axes chains, None for the alphaFilter Smoothing
+sessionRecorder = None
+flightRecorder = None
+logSystem = None
+
+# Records per second let through for each message type, the autopilots publish at the bus rate
+logRateLimits = {'miniYoke.apLat': 2, 'miniYoke.apLong': 2, 'miniYoke.stateMachine': 2}
 
 running = True
 
 def init():
+    global logSystem
+    logSystem = setupLogging(rateLimits=logRateLimits)
+
     while not miniYoke.begin() :
         pass
 
@@ -23,78 +48,200 @@ def init():
     yokeThread = threading.Thread(target=miniYoke.listener)
     yokeThread.start()
 
-    aviBus.bindMsg(apLat.parser, apLat.regex)
-    aviBus.bindMsg(apLong.parser, apLong.regex)
-    aviBus.bindMsg(fmgs.parser, fmgs.regex)
+    aviBus.bindRecord(apLat.receive, apLat.schema)
+    aviBus.bindRecord(apLong.receive, apLong.schema)
+    aviBus.bindRecord(fmgs.receive, fmgs.schema)
     aviBus.bindMsg(fcu.parser, fcu.regex)
-    aviBus.bindMsg(flightModel.parser, flightModel.regex)
+    aviBus.bindRecord(flightModel.receive, flightModel.schema)
+    for family in coalescedFamilies:
+        aviBus.coalesce(family)
+
+def initCockpits():
+    """
+    Starts the multi cockpit mode: a cockpit per attached joystick, each in its own namespace of the bus
+    ('C1.StateVector ...', 'C1.APNzControl ...'), polled by a single thread.
+    """
+    global logSystem, cockpits, yokeThread
+    logSystem = setupLogging(rateLimits=logRateLimits)
+
+    from cockpits import CockpitGroup
+    cockpits = CockpitGroup(aviBus, alphaFilter=miniYoke.alpha, notifier=notifier, clock=clock, filterSettings=filterSettings)
+    while not cockpits.begin() :
+        pass
+
+    yokeThread = threading.Thread(target=cockpits.listener)
+    yokeThread.start()
+
+    for cockpit in cockpits.cockpits:
+        for family in coalescedFamilies:
+            cockpit.aviBus.coalesce(family)
+    if busMetrics is not None:
+        busMetrics.inputAges = cockpits.inputAges # the commands of every cockpit, by namespaced family
+
+async def runAsync():
+    """
+    Runs the asyncio mode: the bus subscriptions, the mini yoke and the state machine are coroutines of the
+    main thread, the bus thread only queues the messages of the subscriptions and the control frame is sent with
+    AsyncBus.send.
+    """
+    global logSystem, asyncFrontEnd, controlFrame
+    from asyncBus import AsyncBus, AsyncNotifier, AsyncBatch
+    logSystem = setupLogging(rateLimits=logRateLimits)
+
+    while not miniYoke.begin() :
+        pass
+
+    asyncFrontEnd = AsyncBus(aviBus)
+    controlFrame = stateMachine.controlFrame = AsyncBatch(asyncFrontEnd, size=3)
+    asyncNotifier = AsyncNotifier()
+    for system in (apLat, apLong, fcu, flightModel, miniYoke):
+        system.notifier = asyncNotifier
+
+    async def consume(family, receive):
+        subscription = asyncFrontEnd.subscribe(family)
+        async for record in subscription:
+            receive(subscription.lastAgent, record)
+
+    def fcuReceive(agent, words):
+        if words and words[0].startswith('push'):
+            fcu.parser(agent)
+
+    async def stepLoop():
+        while running:
+            await asyncNotifier.wait()
+            main()
+
+    await asyncio.gather(
+        consume(apLat.schema.family, apLat.receive),
+        consume(apLong.schema.family, apLong.receive),
+        consume(fmgs.schema.family, fmgs.receive),
+        consume('FCUAP1', fcuReceive),
+        consume(flightModel.schema.family, flightModel.receive),
+        miniYoke.asyncListener(),
+        stepLoop())
+
+def record(path):
+    global sessionRecorder
+    sessionRecorder = SessionRecorder(path, alphaFilter=miniYoke.alpha, clock=clock, filterSettings=filterSettings,
+                                      staleThresholds=stateMachine.inputAges.thresholds)
+    aviBus.setRecorder(sessionRecorder)
+    miniYoke.sessionRecorder = sessionRecorder
+
+def serveMetrics(port):
+    """
+    Instruments the handlers of the bus and serves their metrics on http://127.0.0.1:port/metrics.
+    """
+    global busMetrics
+    from metrics import BusMetrics
+    busMetrics = BusMetrics()
+    aviBus.setMetrics(busMetrics) # before the bindings of init()
+    busMetrics.inputAges = stateMachine.inputAges # replaced by the ages of every cockpit by initCockpits()
+    busMetrics.serve(port)
+
+def recordFlightData(path):
+    global flightRecorder
+    from flightRecorder import FlightRecorder # needs numpy, only imported when recording
+    flightRecorder = FlightRecorder(path, clock=clock)
+    miniYoke.flightRecorder = flightRecorder
 
 def main():
-    match fcc.state :  # Manage states transitions
-        case 'MANUAL':
-            if fcu.apState == 'ON':
-                print('fcc state switch from MANUAL to AP_ENGAGED')
-                aviBus.sendMsg('FCUAP1 on') # Send acknowledge message to the fcu
-
-                fcc.setState('AP_ENGAGED')
-
-        case 'AP_ENGAGED':
-            if fcu.apState == 'OFF':
-                print('fcc state switch from AP_ENGAGED to MANUAL')
-                aviBus.sendMsg('FCUAP1 off') # Send acknowledge message to the fcu
-
-                fcc.setState('MANUAL')
-            
-            elif miniYoke.moved : 
-                print('miniYoke has been mooved state switch from AP_ENGAGED to MANUAL')
-                aviBus.sendMsg('FCUAP1 off') # Send acknowledge message to the fcu
-                
-                fcu.setApState('OFF')
-                fcc.setState('MANUAL')
-
-        case _:
-            print("Error : unknown fcc state")
-        
-    match fcc.state :  # Manage states actions
-        case 'MANUAL':
-            if fcc.ready and flightModel.ready:
-                aviBus.sendMsg('APNxControl nx={}'.format(float(apLong.nx)))
-                aviBus.sendMsg('APNzControl nz={}'.format(float(fcc.nz)))
-                aviBus.sendMsg('APLatControl rollRate={}'.format(float(fcc.p)))
-                
-
-                #print('Sent APNxControl nx={}'.format(fcc.nx))
-                #print('Sent APNzControl nz={}'.format(fcc.nz))
-                #print('Sent APLatControl p={}'.format(fcc.p))
-
-                fcc.setReady(False)
-                flightModel.setReady(False)
-
-        case 'AP_ENGAGED':
-            if apLat.ready and apLong.ready :
-                aviBus.sendMsg('APNxControl nx={}'.format(float(apLong.nx)))
-                aviBus.sendMsg('APNzControl nz={}'.format(float(apLong.nz)))
-                aviBus.sendMsg('APLatControl rollRate={}'.format(float(apLat.p)))
-                
-
-                print('Sent APNxControl nx={}'.format(apLong.nx))
-                print('Sent APNzControl nz={}'.format(apLong.nz))
-                print('Sent APLatControl p={}'.format(apLat.p))
-
-                apLat.setReady(False)
-                apLong.setReady(False)
-            
-        case _:
-            print("Error : unknown fcc state")
+    if cockpits is not None:
+        cockpits.step()
+    else:
+        stateMachine.step()
     
 def close():
-    miniYoke.end()
+    if cockpits is not None:
+        cockpits.end()
+        print('{} cockpits polling timing :'.format(len(cockpits.cockpits)), cockpits.timer.getStats())
+    else:
+        miniYoke.end()
+        if miniYoke.eventDriven:
+            print('miniYoke events : {} joystick events, {} commands updates'.format(miniYoke.eventCount, miniYoke.updateCount))
+        else:
+            print('miniYoke listener timing :', miniYoke.timer.getStats())
+    if asyncFrontEnd is not None:
+        print('subscriptions : {} messages received, {} dropped'.format(
+            sum(subscription.received for subscription in asyncFrontEnd.subscriptions), sum(subscription.dropped for subscription in asyncFrontEnd.subscriptions)))
+        asyncFrontEnd.close()
+    frames = [cockpit.controlFrame for cockpit in cockpits.cockpits] if cockpits is not None else [controlFrame]
+    print('control frames : {} messages, {} bytes sent'.format(sum(frame.totalSends for frame in frames), sum(frame.totalBytes for frame in frames)))
     aviBus.stop()
+    coalescer = aviBus.dispatcher.coalescer
+    if coalescer is not None:
+        print('coalesced messages :', ', '.join('{} {} received, {} dropped'.format(family, coalescer.received[family], coalescer.dropped[family]) for family in coalescer.received))
+    machines = [cockpit.stateMachine for cockpit in cockpits.cockpits] if cockpits is not None else [stateMachine]
+    inputAges = cockpits.inputAges if cockpits is not None else stateMachine.inputAges
+    for ages in inputAges.snapshot():
+        if ages['count'] or ages['stale']:
+            print('{output} {input} age : mean {meanAge:.2e} s, {stale} stale'.format(**ages))
+    print('stale frames : {} not sent'.format(sum(machine.staleFrames for machine in machines)))
+    if busMetrics is not None:
+        busMetrics.stop()
+        for handler in busMetrics.snapshot()['handlers']:
+            print('{family} {handler} : {count} messages, {rate:.1f} msg/s, {meanTime:.2e} s per message'.format(**handler))
+    if sessionRecorder is not None:
+        sessionRecorder.close()
+    if flightRecorder is not None:
+        flightRecorder.close()
+    logSystem.stop()
 
 if __name__ == '__main__':
-    init()
+    argParser = argparse.ArgumentParser(description="787 miniYoke module")
+    argParser.add_argument('--record', metavar='FILE', help="record the joystick samples and the bus messages for replay.py")
+    argParser.add_argument('--multi', action='store_true', help="one cockpit per attached joystick, each in its namespace of the bus (C1, C2, ...)")
+    argParser.add_argument('--fdr', metavar='FILE', help="record the flight data to a binary file, see flightRecorder.py")
+    argParser.add_argument('--events', action='store_true', help="wait for the joystick events instead of polling the joystick")
+    argParser.add_argument('--deadband', type=float, default=0.0, help="half width of the pitch and roll deadband, e.g. 0.05, the values outside are rescaled to keep the full range")
+    argParser.add_argument('--cutoff', type=float, help="cutoff frequency of the axes low pass in Hz instead of the alpha filter, see filters.py")
+    argParser.add_argument('--order', type=int, choices=[1, 2], default=1, help="order of the axes low pass")
+    argParser.add_argument('--expo', type=float, default=0.0, help="amount of expo on the pitch and roll axes")
+    argParser.add_argument('--rateLimit', type=float, help="maximum rate of change of the filtered axes per second")
+    argParser.add_argument('--asyncio', action='store_true', help="run the bus subscriptions, the mini yoke and the state machine as coroutines of one thread")
+    argParser.add_argument('--coalesce', nargs='*', metavar='FAMILY', default=[], help="families of which only the newest unprocessed message is handled, e.g. StateVector, none by default")
+    argParser.add_argument('--metrics', type=int, metavar='PORT', help="serve the bus handlers metrics on http://127.0.0.1:PORT/metrics")
+    argParser.add_argument('--staleAfter', type=float, metavar='SECONDS', help="maximum age of the flight state, yoke and autopilots data the commands are computed from, 1 s by default")
+    args = argParser.parse_args()
+    if args.multi and (args.record or args.fdr):
+        argParser.error('--record and --fdr record a single cockpit, they can not be used with --multi')
+    if args.multi and args.events:
+        argParser.error('--events listens to a single joystick, it can not be used with --multi')
+    if args.asyncio and (args.multi or args.events):
+        argParser.error('--asyncio polls a single joystick, it can not be used with --multi or --events')
+    if args.asyncio and args.coalesce:
+        argParser.error('--asyncio handles the messages in its event loop, it can not be used with --coalesce')
+
+    coalescedFamilies = args.coalesce
+    if args.staleAfter is not None:
+        staleThresholds.update(dict.fromkeys(staleThresholds, args.staleAfter)) # before initCockpits() builds the cockpits state machines
+        stateMachine.inputAges.thresholds.update(staleThresholds)
+    miniYoke.eventDriven = args.events
+    if args.cutoff is not None or args.deadband or args.expo or args.rateLimit is not None:
+        filterSettings = dict(cutoff=args.cutoff, order=args.order, deadband=args.deadband, expo=args.expo, rateLimit=args.rateLimit)
+        miniYoke.setFilters(*(buildChain(alpha=miniYoke.alpha, rate=miniYoke.timer.rate, **filterSettings) for axis in ('pitch', 'roll')))
+
+    if args.metrics:
+        serveMetrics(args.metrics)
+    if args.record:
+        record(args.record)
+    if args.fdr:
+        recordFlightData(args.fdr)
+
+    if args.asyncio:
+        try:
+            asyncio.run(runAsync())
+        except KeyboardInterrupt:
+            running = False
+        close()
+        sys.exit(0)
+
+    if args.multi:
+        initCockpits()
+    else:
+        init()
     try:
         while running:
+            notifier.wait(timeout=0.5) # on the clock, the timeout keeps the loop responsive to KeyboardInterrupt
             main()
     except KeyboardInterrupt:
         running = False
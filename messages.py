@@ -0,0 +1,128 @@
+"""
+The schemas of the bus messages, declared once for each message type.
+
+A MessageSchema is compiled into a parser building a typed record straight from the words of a message and
+into a template rendering an outgoing message, the same way namedtuple compiles its class: the code of the
+parser and of the template is generated once for the fields of the message so each message costs a single
+function call without any regex, loop or intermediate list.
+"""
+
+from collections import namedtuple
+
+class MessageSchema:
+    """
+    A message type: its family and its 'key=value' fields, compiled into a parser and a template.
+
+    Attributes:
+        family (str): The first word of the message.
+        keys (tuple): The keys of the fields, in the message order.
+        fields (tuple): The record field of each key, None for the fields skipped when parsing.
+        recordType (type): The namedtuple of the parsed records.
+        regex (str): The equivalent Ivy regex, capturing every field.
+        parse (function): Returns the record of the words following the family, None if they do not match.
+        format (function): Returns the message of the given record field values.
+
+    Methods:
+        convert(values): Returns the record of the values captured by the equivalent regex.
+    """
+
+    def __init__(self, family, fields, recordName=None, types=None):
+        """
+        Initializes a new instance of the MessageSchema class.
+
+        Args:
+            family (str): The first word of the message.
+            fields (list): The keys of the fields, or (key, record field) tuples to rename a field or to skip it with None.
+            recordName (str): The name of the record namedtuple, family + 'Record' by default.
+            types (dict): The type of the record fields that are not float, by record field name.
+        """
+        self.family = family
+        fields = [field if isinstance(field, tuple) else (field, field) for field in fields]
+        self.keys = tuple(key for key, _ in fields)
+        self.fields = tuple(name for _, name in fields)
+        kept = [name for name in self.fields if name is not None]
+        self.recordType = namedtuple(recordName or family + 'Record', kept)
+        self.types = {name: (types or {}).get(name, float) for name in kept}
+        self.regex = '^{} {}'.format(family, ' '.join('{}=(\\S+)'.format(key) for key in self.keys))
+
+        self.parse = self.compileParser()
+        self.format = self.compileTemplate()
+
+    def compileParser(self):
+        """
+        Generates the parser of the words following the family.
+
+        The words are checked like the equivalent regex does: each starts with its 'key=' and has a value,
+        the words after the last field are ignored.
+        """
+        count = len(self.keys)
+        words = ['w{}'.format(i) for i in range(count)]
+        checks = ' and '.join("{0}.startswith('{1}=') and len({0}) > {2}".format(word, key, len(key) + 1)
+                              for word, key in zip(words, self.keys))
+        values = ', '.join('{}({}[{}:])'.format(self.types[name].__name__, word, len(key) + 1)
+                           for word, key, name in zip(words, self.keys, self.fields) if name is not None)
+        source = (
+            'def parse(words):\n'
+            '    if len(words) < {count}:\n'
+            '        return None\n'
+            '    {words}, = words[:{count}]\n'
+            '    if not ({checks}):\n'
+            '        return None\n'
+            '    return _new(_record, ({values},))\n'
+        ).format(count=count, words=', '.join(words), checks=checks, values=values)
+
+        namespace = {'_new': tuple.__new__, '_record': self.recordType}
+        namespace.update({kind.__name__: kind for kind in self.types.values()})
+        exec(source, namespace)
+        return namespace['parse']
+
+    def compileTemplate(self):
+        """
+        Generates the template rendering a message from the record field values, in the record order.
+
+        The values are converted to their field type first, so 0 is sent as 0.0 like the parsers expect.
+        """
+        names = [name for name in self.fields if name is not None]
+        text = ' '.join([self.family] + ['{}=%s'.format(key) for key, name in zip(self.keys, self.fields) if name is not None])
+        values = ', '.join('{}({})'.format(self.types[name].__name__, name) for name in names)
+        source = (
+            'def format({names}):\n'
+            '    return {text!r} % ({values},)\n'
+        ).format(names=', '.join(names), text=text, values=values)
+
+        namespace = {kind.__name__: kind for kind in self.types.values()}
+        exec(source, namespace)
+        return namespace['format']
+
+    def convert(self, values):
+        """
+        Returns the record of the values captured by the equivalent regex, for the callbacks bound with a regex.
+
+        Args:
+            values (sequence): The captured values of every field, as strings.
+
+        Returns:
+            namedtuple: The record.
+        """
+        return self.recordType._make(self.types[name](value) for value, name in zip(values, self.fields) if name is not None)
+
+# Incoming messages
+stateVectorSchema = MessageSchema('StateVector', ['x', 'y', 'z', 'Vp', 'fpa', 'psi', 'phi'])
+performancesSchema = MessageSchema('Performances', [
+    ('NxMax', 'nxMax'), ('NxMin', 'nxMin'), ('NzMax', 'nzMax'), ('NzMin', 'nzMin'), ('PMax', 'pMax'), ('PMin', 'pMin'),
+    ('AlphaMax', None), ('AlphaMin', None), ('PhiMaxManuel', 'phiMax'), ('PhiMaxAutomatique', None),
+    ('GammaMax', 'fpaMax'), ('GammaMin', 'fpaMin')])
+paLongSchema = MessageSchema('PaLong', [('Nx', 'nx'), ('Nz', 'nz')])
+apLatSchema = MessageSchema('AP_LAT', ['p'])
+
+# Outgoing messages
+nxControlSchema = MessageSchema('APNxControl', ['nx'])
+nzControlSchema = MessageSchema('APNzControl', ['nz'])
+latControlSchema = MessageSchema('APLatControl', [('rollRate', 'p')])
+
+# The families of which each message is an event (a button push), they are never coalesced
+edgeTriggeredFamilies = frozenset({'FCUAP1'})
+
+# The schemas by family
+schemas = {schema.family: schema for schema in (stateVectorSchema, performancesSchema, paLongSchema, apLatSchema,
+                                                nxControlSchema, nzControlSchema, latControlSchema)}
@@ -0,0 +1,367 @@
+"""
+The instrumentation of the bus handlers.
+
+When a BusMetrics is set on a bus before its bindings, the dispatcher times every handler it calls and counts
+its messages and bytes. The handler time and the queueing delay are kept in histograms of power of two buckets,
+the counts of messages are the sums of the buckets, so recording a message costs a few integer operations done
+inline by the dispatcher, with one clock read per message and one per handler. The queueing delay (from the
+queuing of the message by a queued LoopbackBus or by the coalescing worker to the call of the handler) is only
+recorded for the queued messages, a message handled on the bus thread as it arrives, e.g. on the Ivy AviBus,
+has no queueing delay.
+
+The metrics are read with BusMetrics.snapshot() or served on localhost in the Prometheus text format:
+    python3 main.py --metrics 9108
+    curl http://127.0.0.1:9108/metrics
+
+The handlers run on the bus thread which is the only writer, the readers may see a message counted in one
+metric and not yet in another.
+
+The InputAges of the state machine keep, in the same histograms, the age of the inputs each outgoing command
+was computed from (from the publication of their snapshot to the send of the command), and count the inputs
+older than their stale data threshold. They are served with the bus metrics when set on the BusMetrics.
+"""
+
+import time, threading
+
+# The histogram buckets: the first is up to 1024 ns, each next one doubles, the last is up to about 1 s.
+# The bucket of a duration is the bit length of its 1024 ns units, the buckets beyond the last bound are only
+# counted in the infinite bound, the 64 buckets cover any 64 bit duration without a bound check.
+bucketCount = 21
+bucketBounds = tuple(1024e-9 * 2 ** i for i in range(bucketCount))
+
+class HandlerMetrics:
+    """
+    The counters and histograms of a bus handler, updated inline by MessageDispatcher.dispatchInstrumented.
+
+    Attributes:
+        family (str): The family of the messages of the handler.
+        handler (str): The name of the handler, e.g. 'FlightModel.receive'.
+        bytes (int): The number of bytes of the messages handled.
+        timeNs (int): The total time spent in the handler in nanoseconds.
+        timeBuckets (list): The number of calls in each handler time bucket.
+        delayNs (int): The total queueing delay of the queued messages in nanoseconds.
+        delayBuckets (list): The number of queued messages in each queueing delay bucket.
+        count (int): The number of messages handled, the sum of the handler time buckets.
+        delayCount (int): The number of queued messages handled, the sum of the queueing delay buckets.
+    """
+
+    def __init__(self, family, handler):
+        self.family = family
+        self.handler = handler
+        self.bytes = 0
+        self.timeNs = 0
+        self.timeBuckets = [0] * 64
+        self.delayNs = 0
+        self.delayBuckets = [0] * 64
+
+    @property
+    def count(self):
+        return sum(self.timeBuckets)
+
+    @property
+    def delayCount(self):
+        return sum(self.delayBuckets)
+
+class BusMetrics:
+    """
+    The metrics of the handlers of a bus, set on the bus with setMetrics() before the bindings.
+
+    Attributes:
+        handlers (list): The HandlerMetrics of the instrumented handlers, in the binding order.
+        startTime (float): The monotonic time the metrics were created.
+        server (ThreadingHTTPServer): The server of the metrics endpoint, None when not serving.
+        coalescer (Coalescer): The worker of the coalesced families of the bus, None when no family is coalesced.
+        inputAges (InputAges): The ages of the inputs of the state machine, None when not served.
+
+    Methods:
+        register(family, callback): Returns the HandlerMetrics of a new binding.
+        snapshot(): Returns the metrics of every handler.
+        render(): Returns the metrics in the Prometheus text format.
+        serve(port, host): Serves the metrics on http://host:port/metrics from a background thread.
+        stop(): Stops the metrics endpoint.
+    """
+
+    def __init__(self):
+        self.handlers = []
+        self.startTime = time.monotonic()
+        self.server = None
+        self.coalescer = None
+        self.inputAges = None
+
+    def register(self, family, callback):
+        """
+        Returns the HandlerMetrics of a new binding.
+
+        Args:
+            family (str): The family of the messages.
+            callback (function): The bound callback, named after its qualified name.
+
+        Returns:
+            HandlerMetrics: The metrics of the handler.
+        """
+        metrics = HandlerMetrics(family, getattr(callback, '__qualname__', type(callback).__name__))
+        self.handlers.append(metrics)
+        return metrics
+
+    def snapshot(self):
+        """
+        Returns the metrics of every handler.
+
+        Returns:
+            dict: The uptime in seconds, the list of the handlers with their family, name, count, rate in messages
+            per second, bytes, mean handler time and mean queueing delay of the queued messages in seconds, the number
+            of queued messages and the histograms of the times and delays, each a list
+            of (bucket upper bound in seconds, cumulative count) tuples ending with the infinite bound, and the
+            received and dropped counts of each coalesced family, and the input ages of the state machine.
+        """
+        uptime = time.monotonic() - self.startTime
+        handlers = []
+        for metrics in list(self.handlers):
+            count, delayCount = metrics.count, metrics.delayCount
+            handlers.append({
+                'family': metrics.family,
+                'handler': metrics.handler,
+                'count': count,
+                'rate': count / uptime if uptime else 0.0,
+                'bytes': metrics.bytes,
+                'meanTime': metrics.timeNs / count * 1e-9 if count else 0.0,
+                'meanDelay': metrics.delayNs / delayCount * 1e-9 if delayCount else 0.0,
+                'queued': delayCount,
+                'timeHistogram': cumulative(metrics.timeBuckets),
+                'delayHistogram': cumulative(metrics.delayBuckets),
+            })
+        coalesced = {}
+        if self.coalescer is not None:
+            coalesced = {family: {'received': received, 'dropped': self.coalescer.dropped[family]}
+                         for family, received in list(self.coalescer.received.items())}
+        inputAges = self.inputAges.snapshot() if self.inputAges is not None else []
+        return {'uptime': uptime, 'handlers': handlers, 'coalesced': coalesced, 'inputAges': inputAges}
+
+    def render(self):
+        """
+        Returns the metrics in the Prometheus text exposition format.
+
+        Returns:
+            str: The metrics.
+        """
+        lines = []
+        handlers = list(self.handlers)
+
+        def labels(metrics, extra=''):
+            return '{{family="{}",handler="{}"{}}}'.format(metrics.family, metrics.handler, extra)
+
+        for name, help, attribute in (('avibus_handler_messages_total', 'Messages handled by each bus handler.', 'count'),
+                                      ('avibus_handler_bytes_total', 'Bytes of the messages handled by each bus handler.', 'bytes')):
+            lines += ['# HELP {} {}'.format(name, help), '# TYPE {} counter'.format(name)]
+            lines += ['{}{} {}'.format(name, labels(metrics), getattr(metrics, attribute)) for metrics in handlers]
+
+        for name, help, buckets, total, counter in (('avibus_handler_seconds', 'Time spent in each bus handler.', 'timeBuckets', 'timeNs', 'count'),
+                                                  ('avibus_handler_queue_seconds', 'Delay from the queuing of a queued message to the call of its handler.', 'delayBuckets', 'delayNs', 'delayCount')):
+            lines += ['# HELP {} {}'.format(name, help), '# TYPE {} histogram'.format(name)]
+            for metrics in handlers:
+                for bound, count in cumulative(getattr(metrics, buckets)):
+                    le = '+Inf' if bound == float('inf') else '{:.6g}'.format(bound)
+                    lines.append('{}_bucket{} {}'.format(name, labels(metrics, ',le="{}"'.format(le)), count))
+                lines.append('{}_sum{} {:.9f}'.format(name, labels(metrics), getattr(metrics, total) * 1e-9))
+                lines.append('{}_count{} {}'.format(name, labels(metrics), getattr(metrics, counter)))
+
+        if self.coalescer is not None:
+            for name, help, counts in (('avibus_coalesced_messages_total', 'Messages received in each coalesced family.', self.coalescer.received),
+                                       ('avibus_coalesced_dropped_total', 'Messages of each coalesced family replaced before being handled.', self.coalescer.dropped)):
+                lines += ['# HELP {} {}'.format(name, help), '# TYPE {} counter'.format(name)]
+                lines += ['{}{{family="{}"}} {}'.format(name, family, count) for family, count in list(counts.items())]
+
+        if self.inputAges is not None:
+            lines += self.inputAges.render()
+
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, port=9108, host='127.0.0.1'):
+        """
+        Serves the metrics on http://host:port/metrics from a background thread.
+
+        Args:
+            port (int): The port of the endpoint.
+            host (str): The address of the endpoint, localhost only by default.
+        """
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass # the requests are not logged to the terminal of the module
+
+        self.server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        """
+        Stops the metrics endpoint.
+        """
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+class AgeMetrics:
+    """
+    The ages of an input of an outgoing command.
+
+    Attributes:
+        output (str): The family of the command, e.g. 'APNzControl'.
+        input (str): The name of the input, e.g. 'flightModel'.
+        count (int): The number of commands recorded.
+        ageNs (int): The total age in nanoseconds.
+        buckets (list): The number of commands in each age bucket.
+        stale (int): The number of commands computed from the input older than its threshold.
+        generation (int): The generation of the input used by the last command, 0 if never received.
+        lastAge (float): The age of the input used by the last command in seconds, None if never received.
+    """
+
+    def __init__(self, output, input):
+        self.output = output
+        self.input = input
+        self.count = 0
+        self.ageNs = 0
+        self.buckets = [0] * 64
+        self.stale = 0
+        self.generation = 0
+        self.lastAge = None
+
+class InputAges:
+    """
+    The ages of the inputs of the outgoing commands and their stale data thresholds.
+
+    The inputs are snapshots published by a SnapshotBuffer, their age is taken from their publication time, an
+    input never received has no age and is always stale when it has a threshold.
+
+    Attributes:
+        thresholds (dict): The maximum age in seconds of each input by name, the inputs without a threshold are
+            never stale.
+        metrics (dict): The AgeMetrics by (output, input) names.
+
+    Methods:
+        record(output, now, **inputs): Records the ages of the inputs of a command, returns the stale inputs.
+        snapshot(): Returns the ages of every input of every command.
+        render(): Returns the ages in the Prometheus text format.
+    """
+
+    def __init__(self, thresholds=None):
+        """
+        Initializes a new instance of the InputAges class.
+
+        Args:
+            thresholds (dict): The maximum age in seconds of each input by name, e.g. {'flightModel': 0.5}.
+        """
+        self.thresholds = dict(thresholds) if thresholds is not None else {}
+        self.metrics = {}
+
+    def record(self, output, now, **inputs):
+        """
+        Records the ages of the inputs of a command.
+
+        Args:
+            output (str): The family of the command.
+            now (float): The monotonic time of the command, on the clock of the snapshots.
+            **inputs: The snapshot of each input by name.
+
+        Returns:
+            list: The names of the inputs older than their threshold, empty when the command is fresh.
+        """
+        stale = []
+        for name, snapshot in inputs.items():
+            metrics = self.metrics.get((output, name))
+            if metrics is None:
+                metrics = self.metrics[output, name] = AgeMetrics(output, name)
+            metrics.generation = snapshot.generation
+            if snapshot.time is None:
+                metrics.lastAge = None
+                if name in self.thresholds:
+                    metrics.stale += 1
+                    stale.append(name)
+                continue
+            age = now - snapshot.time
+            ageNs = max(0, int(age * 1e9))
+            metrics.lastAge = age
+            metrics.count += 1
+            metrics.ageNs += ageNs
+            metrics.buckets[(ageNs >> 10).bit_length()] += 1
+            threshold = self.thresholds.get(name)
+            if threshold is not None and age > threshold:
+                metrics.stale += 1
+                stale.append(name)
+        return stale
+
+    def snapshot(self):
+        """
+        Returns the ages of every input of every command.
+
+        Returns:
+            list: The output and input names, count, mean and last age in seconds, generation of the last input
+            used, stale count and age histogram of each input of each command.
+        """
+        return [{
+            'output': metrics.output,
+            'input': metrics.input,
+            'count': metrics.count,
+            'meanAge': metrics.ageNs / metrics.count * 1e-9 if metrics.count else 0.0,
+            'lastAge': metrics.lastAge,
+            'generation': metrics.generation,
+            'stale': metrics.stale,
+            'histogram': cumulative(metrics.buckets),
+        } for metrics in list(self.metrics.values())]
+
+    def render(self):
+        """
+        Returns the ages in the Prometheus text exposition format.
+
+        Returns:
+            list: The lines of the metrics.
+        """
+        ages = list(self.metrics.values())
+
+        def labels(metrics, extra=''):
+            return '{{output="{}",input="{}"{}}}'.format(metrics.output, metrics.input, extra)
+
+        name = 'miniyoke_input_age_seconds'
+        lines = ['# HELP {} Age of the inputs of each command when it is sent.'.format(name), '# TYPE {} histogram'.format(name)]
+        for metrics in ages:
+            for bound, count in cumulative(metrics.buckets):
+                le = '+Inf' if bound == float('inf') else '{:.6g}'.format(bound)
+                lines.append('{}_bucket{} {}'.format(name, labels(metrics, ',le="{}"'.format(le)), count))
+            lines.append('{}_sum{} {:.9f}'.format(name, labels(metrics), metrics.ageNs * 1e-9))
+            lines.append('{}_count{} {}'.format(name, labels(metrics), metrics.count))
+
+        name = 'miniyoke_stale_inputs_total'
+        lines += ['# HELP {} Commands computed from an input older than its threshold.'.format(name), '# TYPE {} counter'.format(name)]
+        lines += ['{}{} {}'.format(name, labels(metrics), metrics.stale) for metrics in ages]
+        return lines
+
+def cumulative(buckets):
+    """
+    Returns the cumulative histogram of bucket counts.
+
+    Args:
+        buckets (list): The count of each bucket.
+
+    Returns:
+        list: The (upper bound in seconds, cumulative count) tuples, ending with the infinite bound.
+    """
+    total, histogram = 0, []
+    for bound, count in zip(bucketBounds, buckets):
+        total += count
+        histogram.append((bound, total))
+    histogram.append((float('inf'), sum(buckets)))
+    return histogram
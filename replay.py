@@ -0,0 +1,355 @@
+import json, time, threading, re, io, sys, contextlib, difflib, argparse
+from bus import MessageDispatcher, MessageBatch
+from systems import FCC, MiniYoke, ApLAT, ApLONG, FMGS, FCU, FlightModel, FccStateMachine
+from clock import SystemClock, VirtualClock
+from filters import buildChain
+from metrics import InputAges
+
+class SessionRecorder:
+    """
+    Records the joystick samples and the bus messages of a session to a JSON lines file.
+
+    Each line is a record with its kind and its time in seconds since the beginning of the session:
+    - {"kind": "header", "alphaFilter": ..., "filterSettings": ..., "staleThresholds": ...}: the configuration of the recorded module.
+    - {"kind": "joy", "t": ..., "axes": [throttle, pitch, roll], "buttons": [flapsUp, flapsDown, apDisconnect, gear]}
+    - {"kind": "buttons", "t": ..., "buttons": [...]}: a button event of the event driven mini yoke, between two samples.
+    - {"kind": "msg", "t": ..., "text": ...}: a message received from the bus.
+    - {"kind": "out", "t": ..., "text": ...}: a message sent on the bus.
+
+    Attributes:
+        file (file): The file the records are written to.
+        lock (threading.Lock): Serializes the writes of the yoke, bus and main threads.
+        clock (SystemClock): The clock the records are timed on.
+        startTime (float): The monotonic time of the beginning of the session.
+
+    Methods:
+        recordJoystick(miniYoke): Records the joystick values read by the mini yoke.
+        recordButtons(miniYoke): Records the buttons state of a button event.
+        recordMessage(msg): Records a message received from the bus.
+        recordOutput(msg): Records a message sent on the bus.
+        close(): Closes the recording.
+    """
+
+    def __init__(self, path, alphaFilter, clock=None, filterSettings=None, staleThresholds=None):
+        """
+        Initializes a new instance of the SessionRecorder class.
+
+        Args:
+            path (str): The path of the recording file.
+            alphaFilter (float): The coefficient of the mini yoke low pass filter.
+            clock (SystemClock): The clock of the recorded module, the real clock by default.
+            filterSettings (dict): The buildChain settings of the axes chains, None for the alphaFilter Smoothing.
+            staleThresholds (dict): The maximum age in seconds of each input of the commands, None for the defaults.
+        """
+        self.file = open(path, 'w')
+        self.lock = threading.Lock()
+        self.clock = clock if clock is not None else SystemClock()
+        self.startTime = self.clock.monotonic()
+        self.write({'kind': 'header', 'alphaFilter': alphaFilter, 'filterSettings': filterSettings, 'staleThresholds': staleThresholds})
+
+    def write(self, record):
+        with self.lock:
+            self.file.write(json.dumps(record) + '\n')
+
+    def now(self):
+        return self.clock.monotonic() - self.startTime
+
+    def recordJoystick(self, miniYoke):
+        """
+        Records the joystick values read by the mini yoke.
+
+        Args:
+            miniYoke (MiniYoke): The mini yoke that has just read the joystick.
+        """
+        self.write({'kind': 'joy', 't': self.now(),
+                    'axes': [miniYoke.throttleAxisValue, miniYoke.pitchAxisValue, miniYoke.rollAxisValue],
+                    'buttons': [miniYoke.flapsUpPushed, miniYoke.flapsDownPushed, miniYoke.apDisconnectPushed, miniYoke.gearPushed]})
+
+    def recordButtons(self, miniYoke):
+        """
+        Records the buttons state of a button event, the edges sent between two samples are replayed.
+
+        Args:
+            miniYoke (MiniYoke): The mini yoke that has just received a button event.
+        """
+        self.write({'kind': 'buttons', 't': self.now(),
+                    'buttons': [miniYoke.flapsUpPushed, miniYoke.flapsDownPushed, miniYoke.apDisconnectPushed, miniYoke.gearPushed]})
+
+    def recordMessage(self, msg):
+        """
+        Records a message received from the bus.
+
+        Args:
+            msg (str): The message.
+        """
+        self.write({'kind': 'msg', 't': self.now(), 'text': msg})
+
+    def recordOutput(self, msg):
+        """
+        Records a message sent on the bus.
+
+        Args:
+            msg (str): The message.
+        """
+        self.write({'kind': 'out', 't': self.now(), 'text': msg})
+
+    def close(self):
+        """
+        Closes the recording.
+        """
+        with self.lock:
+            self.file.close()
+
+def loadSession(path):
+    """
+    Loads a session recorded by a SessionRecorder.
+
+    Args:
+        path (str): The path of the recording file.
+
+    Returns:
+        tuple: The header record and the list of the other records sorted by time.
+    """
+    header = {}
+    records = []
+    with open(path) as file:
+        for line in file:
+            record = json.loads(line)
+            if record['kind'] == 'header':
+                header = record
+            else:
+                records.append(record)
+
+    records.sort(key=lambda record: record['t'])  # stable, the threads may have written slightly out of order
+    return header, records
+
+class RecordedJoystick:
+    """
+    A joystick returning the recorded samples through the pygame joystick interface used by MiniYoke.
+
+    Attributes:
+        axes (dict): The current value of each axis by index.
+        buttons (dict): The current state of each button by index.
+        axisIndexes (tuple): The throttle, pitch and roll axis indexes of the mini yoke.
+        buttonIndexes (tuple): The flaps up, flaps down, ap disconnect and gear button indexes of the mini yoke.
+
+    Methods:
+        setSample(record): Sets the current axes and buttons values from a 'joy' record.
+        get_axis(index): Returns the current value of an axis.
+        get_button(index): Returns the current state of a button.
+    """
+
+    def __init__(self, miniYoke):
+        self.axes = {}
+        self.buttons = {}
+        self.axisIndexes = (miniYoke.throttleAxis, miniYoke.pitchAxis, miniYoke.rollAxis)
+        self.buttonIndexes = (miniYoke.flapsUpButton, miniYoke.flapsDownButton, miniYoke.apDisconnectButton, miniYoke.gearButton)
+
+    def setSample(self, record):
+        """
+        Sets the current axes and buttons values from a 'joy' record.
+
+        Args:
+            record (dict): The joystick record.
+        """
+        self.axes = dict(zip(self.axisIndexes, record['axes']))
+        self.buttons = dict(zip(self.buttonIndexes, record['buttons']))
+
+    def get_axis(self, index):
+        return self.axes.get(index, 0.0)
+
+    def get_button(self, index):
+        return self.buttons.get(index, False)
+
+class ReplayBus:
+    """
+    An in-memory bus with the AviBus interface, the messages sent are captured with their replay time.
+
+    Attributes:
+        bindings (list): The (compiled regex, callback) tuples bound by the dispatcher.
+        dispatcher (MessageDispatcher): The dispatcher shared with AviBus.
+        sendLock (threading.Lock): The lock used by the MessageBatch.
+        now (float): The current replay time.
+        outputs (list): The (time, message) tuples sent on the bus.
+
+    Methods:
+        bindMsg(callback, regex): Binds a callback to a regex.
+        bindRecord(callback, schema): Binds a callback to the records of a message schema.
+        deliver(msg): Delivers a recorded message to the bound callbacks.
+        sendMsg(msg): Captures a message sent on the bus.
+    """
+
+    def __init__(self):
+        self.bindings = []
+        self.dispatcher = MessageDispatcher(self.rawBind)
+        self.sendLock = threading.Lock()
+        self.now = 0.0
+        self.outputs = []
+
+    def rawBind(self, callback, regex):
+        self.bindings.append((re.compile(regex), callback))
+
+    def bindMsg(self, callback, regex):
+        self.dispatcher.bind(callback, regex)
+
+    def bindRecord(self, callback, schema):
+        self.dispatcher.bindSchema(callback, schema)
+
+    def deliver(self, msg):
+        """
+        Delivers a recorded message to the bound callbacks, with the Ivy regex semantics.
+
+        Args:
+            msg (str): The message.
+        """
+        for regex, callback in self.bindings:
+            match = regex.match(msg)
+            if match:
+                callback('replay', *match.groups(default=''))
+
+    def rawSend(self, msg):
+        self.outputs.append((self.now, msg))
+
+    def sendMsg(self, msg):
+        self.rawSend(msg)
+
+class ReplayEngine:
+    """
+    Replays a recorded session into MiniYoke, FCC, the parsers and the FCC state machine on a virtual clock.
+
+    The records are replayed in time order as fast as possible, the state machine is stepped after each one
+    like the main loop is woken up by each new data, and the messages sent are captured for comparison.
+    The virtual clock is set to the time of each record before it is replayed, so the replayed module reads the
+    recorded time whatever the replay speed, the snapshots are stamped and the stale inputs detected on it.
+
+    Attributes:
+        header (dict): The configuration of the recorded module.
+        records (list): The records to replay.
+        clock (VirtualClock): The clock of the replayed module, at the time of the record being replayed.
+        aviBus (ReplayBus): The in-memory bus of the replayed module.
+        fcc (FCC): The replayed Flight Control Computer.
+        miniYoke (MiniYoke): The replayed mini yoke.
+        joystick (RecordedJoystick): The joystick returning the recorded samples.
+        stateMachine (FccStateMachine): The replayed FCC state machine.
+
+    Methods:
+        run(quiet): Replays the session and returns the messages sent.
+    """
+
+    def __init__(self, header, records):
+        """
+        Initializes a new instance of the ReplayEngine class.
+
+        Args:
+            header (dict): The configuration of the recorded module.
+            records (list): The records to replay.
+        """
+        self.header = header
+        self.records = records
+        self.clock = VirtualClock()
+
+        self.aviBus = ReplayBus()
+        self.apLat = ApLAT(clock=self.clock)
+        self.apLong = ApLONG(clock=self.clock)
+        self.fmgs = FMGS(clock=self.clock)
+        self.fcu = FCU()
+        self.flightModel = FlightModel(clock=self.clock)
+
+        self.fcc = FCC(self.fcu, self.fmgs, self.flightModel, self.aviBus, clock=self.clock)
+        self.miniYoke = MiniYoke(self.fcc, alphaFilter=header.get('alphaFilter', 0.1), clock=self.clock)
+        if header.get('filterSettings'):
+            self.miniYoke.setFilters(*(buildChain(alpha=self.miniYoke.alpha, rate=self.miniYoke.timer.rate, **header['filterSettings']) for axis in ('pitch', 'roll')))
+        self.joystick = RecordedJoystick(self.miniYoke)
+        self.miniYoke.joystick = self.joystick
+
+        inputAges = InputAges(header['staleThresholds']) if header.get('staleThresholds') else None # the defaults for older recordings
+        self.stateMachine = FccStateMachine(self.fcc, self.miniYoke, self.apLat, self.apLong, MessageBatch(self.aviBus, size=3), inputAges=inputAges)
+
+        self.aviBus.bindRecord(self.apLat.receive, self.apLat.schema)
+        self.aviBus.bindRecord(self.apLong.receive, self.apLong.schema)
+        self.aviBus.bindRecord(self.fmgs.receive, self.fmgs.schema)
+        self.aviBus.bindMsg(self.fcu.parser, self.fcu.regex)
+        self.aviBus.bindRecord(self.flightModel.receive, self.flightModel.schema)
+
+    def run(self, quiet=True):
+        """
+        Replays the session and returns the messages sent.
+
+        Args:
+            quiet (bool): Discards what the subsystems print, printing is the main cost of a replay.
+
+        Returns:
+            list: The (time, message) tuples sent on the bus.
+        """
+        output = contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext()
+        with output:
+            for record in self.records:
+                self.clock.now = record['t'] # the replay thread is the only one reading the clock, nothing sleeps on it
+                self.aviBus.now = record['t']
+                if record['kind'] == 'msg':
+                    self.aviBus.deliver(record['text'])
+                elif record['kind'] == 'joy':
+                    self.joystick.setSample(record)
+                    self.miniYoke.sample()
+                elif record['kind'] == 'buttons':
+                    miniYoke = self.miniYoke
+                    miniYoke.flapsUpPushed, miniYoke.flapsDownPushed, miniYoke.apDisconnectPushed, miniYoke.gearPushed = record['buttons']
+                    miniYoke.sendButtons()
+                else:
+                    continue
+                self.stateMachine.step()
+
+        return self.aviBus.outputs
+
+def formatOutputs(outputs):
+    """
+    Formats the messages sent into the lines of a golden file.
+
+    Args:
+        outputs (list): The (time, message) tuples sent on the bus.
+
+    Returns:
+        list: The lines, one per message.
+    """
+    return ['{:.6f} {}'.format(t, msg) for t, msg in outputs]
+
+def diffGolden(outputs, path):
+    """
+    Compares the messages sent to a golden file.
+
+    Args:
+        outputs (list): The (time, message) tuples sent on the bus.
+        path (str): The path of the golden file.
+
+    Returns:
+        list: The lines of the unified diff, empty if the outputs match.
+    """
+    with open(path) as file:
+        golden = file.read().splitlines()
+    return list(difflib.unified_diff(golden, formatOutputs(outputs), 'golden', 'replay', lineterm=''))
+
+if __name__ == '__main__':
+    argParser = argparse.ArgumentParser(description="Replays a session recorded with main.py --record")
+    argParser.add_argument('session', help="the recorded session file")
+    argParser.add_argument('--golden', metavar='FILE', help="the golden file the messages sent are compared to")
+    argParser.add_argument('--update-golden', action='store_true', help="write the messages sent to the golden file")
+    args = argParser.parse_args()
+
+    header, records = loadSession(args.session)
+    engine = ReplayEngine(header, records)
+
+    startTime = time.perf_counter()
+    outputs = engine.run()
+    replayTime = time.perf_counter() - startTime
+
+    duration = records[-1]['t'] if records else 0.0
+    print('Replayed {} records ({:.1f} s of flight) in {:.3f} s, {} messages sent'.format(len(records), duration, replayTime, len(outputs)))
+
+    if args.golden and args.update_golden:
+        with open(args.golden, 'w') as file:
+            file.write('\n'.join(formatOutputs(outputs)) + '\n')
+        print('Golden file updated')
+    elif args.golden:
+        diff = diffGolden(outputs, args.golden)
+        print('\n'.join(diff) if diff else 'Outputs match the golden file')
+        sys.exit(1 if diff else 0)
@@ -0,0 +1,147 @@
+import threading
+from clock import SystemClock
+
+class DataNotifier:
+    """
+    Wakes up the fcc state machine when new data has been published.
+
+    The parsers and the miniYoke listener call notify() once their attributes are up to date,
+    the main loop blocks in wait() instead of spinning on the ready flags. On a VirtualClock the main loop
+    waits on the clock, so the simulated module runs at maximum speed.
+
+    Attributes:
+        event (threading.Event): The event set by the producers and cleared by the consumer.
+        clock (SystemClock): The clock the consumer waits on.
+
+    Methods:
+        notify(): Signals that new data is available.
+        wait(timeout): Blocks until new data is available or the timeout expires.
+    """
+
+    def __init__(self, clock=None):
+        """
+        Initializes a new instance of the DataNotifier class.
+
+        Args:
+            clock (SystemClock): The clock to wait on, a VirtualClock to simulate the module, None for the real clock.
+        """
+        self.event = threading.Event()
+        self.clock = clock if clock is not None else SystemClock()
+
+    def notify(self):
+        """
+        Signals that new data is available.
+        Must be called after the producer has updated its attributes.
+        """
+        self.clock.set(self.event)
+
+    def wait(self, timeout=None):
+        """
+        Blocks until new data is available or the timeout expires.
+
+        The event is cleared before returning so that every notification sent while the consumer
+        is processing wakes it up again on the next call.
+
+        Args:
+            timeout (float): The maximum time to wait in seconds on the clock, None to wait forever on the real clock.
+
+        Returns:
+            bool: True if new data is available, False if the timeout expired.
+        """
+        hasData = self.clock.wait(self.event, timeout)
+        self.event.clear()
+        return hasData
+
+class PeriodicTimer:
+    """
+    Paces a loop at a fixed rate using absolute deadlines on the monotonic time of a clock.
+
+    The deadlines are computed from the start time and never from the end of the work,
+    so the time spent in the loop body does not make the period drift.
+    When the body overruns its period the late tick is run immediately and the ticks that
+    were completely missed are skipped to keep the original phase.
+
+    Attributes:
+        rate (float): The loop rate in Hz.
+        clock (SystemClock): The clock giving the monotonic time and sleeping until the deadlines.
+        period (float): The loop period in seconds.
+        nextDeadline (float): The monotonic time of the next tick.
+        ticks (int): The number of ticks since the timer has been started.
+        overruns (int): The number of ticks for which the deadline was already passed.
+        missedTicks (int): The number of ticks skipped because of overruns.
+        maxJitter (float): The maximum delay between a deadline and the actual wake up in seconds.
+        totalJitter (float): The sum of the wake up delays in seconds.
+
+    Methods:
+        start(): Starts the timer, the first tick is one period from now.
+        wait(): Sleeps until the next tick.
+        getStats(): Returns the timing statistics of the timer.
+    """
+
+    def __init__(self, rate, clock=None):
+        """
+        Initializes a new instance of the PeriodicTimer class.
+
+        Args:
+            rate (float): The loop rate in Hz (e.g. 50, 100, 250).
+            clock (SystemClock): The clock to use, a VirtualClock to simulate the loop, None for the real clock.
+        """
+        if rate <= 0:
+            raise ValueError("rate must be positive, got {}".format(rate))
+
+        self.rate = rate
+        self.clock = clock if clock is not None else SystemClock()
+        self.period = 1.0 / rate
+        self.nextDeadline = None
+
+        self.ticks = 0
+        self.overruns = 0
+        self.missedTicks = 0
+        self.maxJitter = 0.0
+        self.totalJitter = 0.0
+
+    def start(self):
+        """
+        Starts the timer, the first tick is one period from now.
+        """
+        self.nextDeadline = self.clock.monotonic() + self.period
+
+    def wait(self):
+        """
+        Sleeps until the next tick.
+        """
+        if self.nextDeadline is None:
+            self.start()
+
+        now = self.clock.monotonic()
+        if now < self.nextDeadline:
+            self.clock.sleep(self.nextDeadline - now)
+            now = self.clock.monotonic()
+        else:
+            self.overruns += 1
+            missed = int((now - self.nextDeadline) // self.period)
+            self.missedTicks += missed
+            self.nextDeadline += missed * self.period
+
+        jitter = now - self.nextDeadline
+        self.maxJitter = max(self.maxJitter, jitter)
+        self.totalJitter += jitter
+        self.ticks += 1
+
+        self.nextDeadline += self.period
+
+    def getStats(self):
+        """
+        Returns the timing statistics of the timer.
+
+        Returns:
+            dict: The rate, ticks, overruns, missed ticks, mean and max jitter (in seconds).
+        """
+        return {
+            'rate': self.rate,
+            'ticks': self.ticks,
+            'overruns': self.overruns,
+            'missedTicks': self.missedTicks,
+            'meanJitter': self.totalJitter / self.ticks if self.ticks else 0.0,
+            'maxJitter': self.maxJitter,
+        }
@@ -0,0 +1,269 @@
+"""
+A scripted joystick replacing the operator of the yoke tests.
+
+The ScriptedJoystick has the pygame joystick interface used by MiniYoke (get_axis and get_button) and
+returns the value of an input profile at the time read on a clock, so the inputs are delivered with exact
+timing whatever the sampling rate, and faster than real time on a VirtualClock. A profile is any callable
+returning the value of an axis (or the state of a button) at a time in seconds from its start.
+"""
+
+import math, bisect
+from clock import SystemClock
+
+class Constant:
+    """
+    A constant value.
+    """
+
+    def __init__(self, value):
+        self.value = value
+
+    def __call__(self, t):
+        return self.value
+
+class Step:
+    """
+    A step from a value to another at a given time.
+    """
+
+    def __init__(self, before, after, at=0.0):
+        self.before = before
+        self.after = after
+        self.at = at
+
+    def __call__(self, t):
+        return self.after if t >= self.at else self.before
+
+class Hold:
+    """
+    A value held for a duration, then a rest value, e.g. Hold(1.0, 10) pulls the yoke for 10 seconds.
+    """
+
+    def __init__(self, value, duration, rest=0.0):
+        self.value = value
+        self.duration = duration
+        self.rest = rest
+
+    def __call__(self, t):
+        return self.value if 0.0 <= t < self.duration else self.rest
+
+class Ramp:
+    """
+    A linear ramp from a value to another over a duration, after a delay, the end value is then held.
+    """
+
+    def __init__(self, start, end, duration, delay=0.0):
+        self.start = start
+        self.end = end
+        self.duration = duration
+        self.delay = delay
+
+    def __call__(self, t):
+        if t <= self.delay:
+            return self.start
+        if t >= self.delay + self.duration:
+            return self.end
+        return self.start + (self.end - self.start) * (t - self.delay) / self.duration
+
+class SineSweep:
+    """
+    A sine sweeping linearly from a frequency to another over a duration (a chirp), the offset is held outside.
+    """
+
+    def __init__(self, amplitude, startFrequency, endFrequency, duration, offset=0.0):
+        self.amplitude = amplitude
+        self.startFrequency = startFrequency
+        self.endFrequency = endFrequency
+        self.duration = duration
+        self.offset = offset
+
+    def __call__(self, t):
+        if not 0.0 <= t <= self.duration:
+            return self.offset
+        phase = 2 * math.pi * (self.startFrequency * t + (self.endFrequency - self.startFrequency) * t * t / (2 * self.duration))
+        return self.offset + self.amplitude * math.sin(phase)
+
+class Pulses:
+    """
+    Button presses: pressed for width seconds every interval seconds, count times.
+    """
+
+    def __init__(self, count=1, width=0.3, interval=0.6):
+        self.count = count
+        self.width = width
+        self.interval = interval
+
+    def __call__(self, t):
+        if t < 0.0 or t >= self.count * self.interval:
+            return False
+        return t % self.interval < self.width
+
+class Trace:
+    """
+    A recorded trace, linearly interpolated between its samples, the first and last values are held outside.
+    """
+
+    def __init__(self, times, values):
+        """
+        Initializes a new instance of the Trace class.
+
+        Args:
+            times (list): The increasing times of the samples in seconds from the start of the trace.
+            values (list): The values of the samples.
+        """
+        self.times = list(times)
+        self.values = list(values)
+
+    @classmethod
+    def fromSession(cls, records, axis):
+        """
+        Builds the trace of an axis from the 'joy' records of a session recorded by a SessionRecorder.
+
+        Args:
+            records (list): The records of loadSession.
+            axis (int): The position of the axis in the records, 0 throttle, 1 pitch, 2 roll.
+
+        Returns:
+            Trace: The trace, starting at the first joystick record.
+        """
+        samples = [(record['t'], record['axes'][axis]) for record in records if record['kind'] == 'joy']
+        start = samples[0][0] if samples else 0.0
+        return cls([t - start for t, _ in samples], [value for _, value in samples])
+
+    def __call__(self, t):
+        if not self.times:
+            return 0.0
+        i = bisect.bisect_right(self.times, t)
+        if i == 0:
+            return self.values[0]
+        if i == len(self.times):
+            return self.values[-1]
+        t0, t1 = self.times[i - 1], self.times[i]
+        v0, v1 = self.values[i - 1], self.values[i]
+        return v0 + (v1 - v0) * (t - t0) / (t1 - t0) if t1 > t0 else v1
+
+class Sequence:
+    """
+    Profiles played one after another, each for its duration, the last one is held.
+    """
+
+    def __init__(self, *segments):
+        """
+        Initializes a new instance of the Sequence class.
+
+        Args:
+            *segments: The (duration, profile) tuples, each profile is played from its own start.
+        """
+        self.segments = segments
+        self.starts = []
+        start = 0.0
+        for duration, _ in segments:
+            self.starts.append(start)
+            start += duration
+
+    def __call__(self, t):
+        i = max(0, bisect.bisect_right(self.starts, t) - 1)
+        return self.segments[i][1](t - self.starts[i])
+
+class ScriptedJoystick:
+    """
+    A joystick playing input profiles, with the pygame joystick interface used by MiniYoke.
+
+    Attributes:
+        clock (SystemClock): The clock the profiles time is read on.
+        axes (dict): The (profile, start time) of each scripted axis by index.
+        buttons (dict): The (profile, start time) of each scripted button by index.
+
+    Methods:
+        setAxis(index, profile, start): Plays a profile on an axis.
+        setButton(index, profile, start): Plays a profile on a button.
+        get_axis(index): Returns the current value of an axis, 0.0 if it is not scripted.
+        get_button(index): Returns the current state of a button, False if it is not scripted.
+    """
+
+    def __init__(self, clock=None):
+        """
+        Initializes a new instance of the ScriptedJoystick class.
+
+        Args:
+            clock (SystemClock): The clock the profiles time is read on, the real clock by default.
+        """
+        self.clock = clock if clock is not None else SystemClock()
+        self.axes = {}
+        self.buttons = {}
+
+    def setAxis(self, index, profile, start=None):
+        """
+        Plays a profile on an axis.
+
+        Args:
+            index (int): The index of the axis.
+            profile (callable): The value of the axis at a time from the start.
+            start (float): The clock time of the start of the profile, now by default.
+        """
+        self.axes[index] = (profile, self.clock.monotonic() if start is None else start)
+
+    def setButton(self, index, profile, start=None):
+        """
+        Plays a profile on a button.
+
+        Args:
+            index (int): The index of the button.
+            profile (callable): The state of the button at a time from the start.
+            start (float): The clock time of the start of the profile, now by default.
+        """
+        self.buttons[index] = (profile, self.clock.monotonic() if start is None else start)
+
+    def get_axis(self, index):
+        if index not in self.axes:
+            return 0.0
+        profile, start = self.axes[index]
+        return float(profile(self.clock.monotonic() - start))
+
+    def get_button(self, index):
+        if index not in self.buttons:
+            return False
+        profile, start = self.buttons[index]
+        return bool(profile(self.clock.monotonic() - start))
+
+class ScriptedPilot:
+    """
+    Plays the requests of the yoke tests on a ScriptedJoystick, by input name.
+
+    Attributes:
+        joystick (ScriptedJoystick): The joystick of the mini yoke.
+        axes (dict): The axis index of each input name: throttle, pitch, roll.
+        buttons (dict): The button index of each input name: flapsUp, flapsDown, apDisconnect, gear.
+
+    Methods:
+        play(**profiles): Plays profiles from now, e.g. play(pitch=Hold(1.0, 10)).
+    """
+
+    def __init__(self, joystick, miniYoke):
+        """
+        Initializes a new instance of the ScriptedPilot class.
+
+        Args:
+            joystick (ScriptedJoystick): The joystick of the mini yoke.
+            miniYoke (MiniYoke): The mini yoke, for its axis and button indexes.
+        """
+        self.joystick = joystick
+        self.axes = {'throttle': miniYoke.throttleAxis, 'pitch': miniYoke.pitchAxis, 'roll': miniYoke.rollAxis}
+        self.buttons = {'flapsUp': miniYoke.flapsUpButton, 'flapsDown': miniYoke.flapsDownButton,
+                        'apDisconnect': miniYoke.apDisconnectButton, 'gear': miniYoke.gearButton}
+
+    def play(self, **profiles):
+        """
+        Plays profiles from now, the inputs not given keep their profile.
+
+        Args:
+            **profiles: The profile of each input by name.
+        """
+        start = self.joystick.clock.monotonic()
+        for name, profile in profiles.items():
+            if name in self.axes:
+                self.joystick.setAxis(self.axes[name], profile, start)
+            elif name in self.buttons:
+                self.joystick.setButton(self.buttons[name], profile, start)
+            else:
+                raise ValueError('Unknown yoke input {!r}'.format(name))
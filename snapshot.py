@@ -0,0 +1,93 @@
+from clock import SystemClock
+
+class SnapshotBuffer:
+    """
+    Publishes immutable snapshots of the state of a producer to the other threads.
+
+    The producer builds a new snapshot (a namedtuple with 'generation' and 'time' fields) and publishes it
+    with a single reference assignment, which is atomic in CPython, so the consumers read the whole state in
+    one step without any lock and never see a half updated one.
+    Each buffer must have a single producer thread, the generation is incremented at each publication and
+    works as the sequence number of the data, the time is the monotonic time of the publication so the
+    consumers know the age of the data they use. The time of the generation 0 snapshot is None.
+
+    Attributes:
+        snapshotType (type): The namedtuple type of the snapshots, its first fields are 'generation' and 'time'.
+        clock (SystemClock): The clock the publication times are taken from.
+        generation (int): The generation of the last published snapshot.
+        latest (namedtuple): The last published snapshot.
+
+    Methods:
+        publish(**fields): Publishes a new snapshot.
+        read(): Returns the last published snapshot.
+    """
+
+    def __init__(self, snapshotType, clock=None, **fields):
+        """
+        Initializes a new instance of the SnapshotBuffer class with a generation 0 snapshot.
+
+        Args:
+            snapshotType (type): The namedtuple type of the snapshots, its first fields are 'generation' and 'time'.
+            clock (SystemClock): The clock the publication times are taken from, the real clock by default.
+            **fields: The initial values of the snapshot fields.
+        """
+        self.snapshotType = snapshotType
+        self.clock = clock if clock is not None else SystemClock()
+        self.generation = 0
+        self.latest = snapshotType(generation=0, time=None, **fields)
+
+    def publish(self, **fields):
+        """
+        Publishes a new snapshot.
+
+        Args:
+            **fields: The values of the snapshot fields.
+        """
+        self.generation += 1
+        self.latest = self.snapshotType(generation=self.generation, time=self.clock.monotonic(), **fields)
+
+    def read(self):
+        """
+        Returns the last published snapshot.
+
+        Returns:
+            namedtuple: The last published snapshot.
+        """
+        return self.latest
+
+class SnapshotReader:
+    """
+    Keeps track of the snapshot generations already consumed by a consumer.
+
+    Attributes:
+        consumed (dict): The last consumed generation of each snapshot type.
+
+    Methods:
+        isNew(snapshot): Indicates whether the snapshot has not been consumed yet.
+        consume(*snapshots): Marks the snapshots as consumed.
+    """
+
+    def __init__(self):
+        self.consumed = {}
+
+    def isNew(self, snapshot):
+        """
+        Indicates whether the snapshot has not been consumed yet.
+
+        Args:
+            snapshot (namedtuple): The snapshot to check.
+
+        Returns:
+            bool: True if the snapshot is newer than the last consumed one of its type.
+        """
+        return snapshot.generation > self.consumed.get(type(snapshot), 0)
+
+    def consume(self, *snapshots):
+        """
+        Marks the snapshots as consumed.
+
+        Args:
+            *snapshots: The snapshots that have been used.
+        """
+        for snapshot in snapshots:
+            self.consumed[type(snapshot)] = snapshot.generation
@@ -1,6 +1,48 @@
-import pygame
-import time
+from filters import FilterChain, Smoothing
+import logging, math, threading
 from enum import Enum
+from collections import namedtuple
+from scheduler import PeriodicTimer
+from clock import SystemClock
+from snapshot import SnapshotBuffer, SnapshotReader
+from metrics import InputAges
+from messages import stateVectorSchema, performancesSchema, paLongSchema, apLatSchema, nxControlSchema, nzControlSchema, latControlSchema
+
+# Category loggers, see log.setupLogging for the levels and rate limits
+fccLog = logging.getLogger('miniYoke.fcc')
+apLatLog = logging.getLogger('miniYoke.apLat')
+apLongLog = logging.getLogger('miniYoke.apLong')
+fcuLog = logging.getLogger('miniYoke.fcu')
+stateMachineLog = logging.getLogger('miniYoke.stateMachine')
+
+# Immutable states published by the producers to the other threads, with their sequence number and publication time
+FccCommands = namedtuple('FccCommands', 'generation time nx nz p')
+ApLatCommands = namedtuple('ApLatCommands', 'generation time p')
+ApLongCommands = namedtuple('ApLongCommands', 'generation time nx nz')
+FmgsLimits = namedtuple('FmgsLimits', 'generation time nxMax nxMin nzMax nzMin pMax pMin phiMax phiMin fpaMax fpaMin')
+FlightModelState = namedtuple('FlightModelState', 'generation time x y z Vp fpa psi phi')
+
+pygame = None # imported by initPygame() on the first begin(), the tools only parsing messages do not need it
+
+def initPygame():
+    """
+    Imports pygame on first use and initializes only the subsystems the mini yoke uses: the joysticks, and the
+    display (without any window) the pygame event queue depends on. pygame.init() would also start the audio
+    and font subsystems.
+
+    Returns:
+        module: The pygame module.
+    """
+    global pygame
+    if pygame is None:
+        import pygame as module
+        pygame = module
+    pygame.display.init()
+    pygame.joystick.init()
+    return pygame
+
+# Maximum age in seconds of the inputs of the commands sent by the state machine, the older ones are not sent
+staleThresholds = {'yoke': 1.0, 'flightModel': 1.0, 'apLat': 1.0, 'apLong': 1.0}
 
 class FCC:
     """
@@ -24,20 +66,23 @@ class FCC:
         fmgs (object): The Flight Management and Guidance System object.
         flightModel (object): The Flight Model object.
         aviBus (object): The Avionics Bus object.
+        commands (SnapshotBuffer): The FccCommands published each time manual commands are computed.
 
     Methods:
         setState(state): Sets the state of the FCC.
         setReady(ready): Sets the ready status of the FCC.
         setManualCommands(nx, nz, p, throttleAxisValue, pitchAxisValue, rollAxisValue): Sets the manual commands for the FCC.
+        republishCommands(): Publishes the last manual commands again, for a new flight model state which does not change them.
         nxLaw(nx, throttleAxisValue, fmgs, flightModel): Computes the nx control law.
         nzLaw(nz, pitchAxisValue, fmgs, flightModel): Computes the nz control law.
         pLaw(p, rollAxisValue, fmgs, flightModel): Computes the p control law.
+        protections(fmgs, flightModel): Returns the flight envelope conditions of the nz and p control laws.
         sendButtonsState(flapsUp, flapsDown, apDisconnect, gear, previousFlapsUp, previousFlapsDown, previousApDisconnect, previousGear): Sends the rising edge of the buttons to the Avionics Bus.
     """
 
     fccState = Enum('MANUAL', 'AP_ENGAGED')
 
-    def __init__(self, fcu, fmgs, flightModel, aviBus):
+    def __init__(self, fcu, fmgs, flightModel, aviBus, clock=None):
         """
         Initializes a new instance of the FCC class.
 
@@ -46,6 +91,7 @@ class FCC:
             fmgs (object): The Flight Management and Guidance System object.
             flightModel (object): The Flight Model object.
             aviBus (object): The Avionics Bus object.
+            clock (SystemClock): The clock the commands are timed on, the real clock by default.
         """
         self.state = 'MANUAL'
         self.nx = 0
@@ -63,6 +109,8 @@ class FCC:
         self.flightModel = flightModel
         self.aviBus = aviBus
 
+        self.commands = SnapshotBuffer(FccCommands, clock, nx=0, nz=0, p=0)
+
     def setState(self, state):
         """
         Sets the state of the FCC.
@@ -94,11 +142,23 @@ class FCC:
             rollAxisValue (float): The value of the roll axis.
         """
         if self.state == 'MANUAL':
-            self.nx = self.nxLaw(nx, throttleAxisValue, self.fmgs, self.flightModel)
-            self.nz = self.nzLaw(nz, pitchAxisValue, self.fmgs, self.flightModel)
-            self.p = self.pLaw(p, rollAxisValue, self.fmgs, self.flightModel)
+            fmgs = self.fmgs.limits.read()  # consistent limits and state even if a message is being parsed
+            flightModel = self.flightModel.snapshot.read()
+
+            self.nx = self.nxLaw(nx, throttleAxisValue, fmgs, flightModel)
+            self.nz = self.nzLaw(nz, pitchAxisValue, fmgs, flightModel)
+            self.p = self.pLaw(p, rollAxisValue, fmgs, flightModel)
             self.ready = True
 
+            self.commands.publish(nx=self.nx, nz=self.nz, p=self.p)
+
+    def republishCommands(self):
+        """
+        Publishes the last manual commands again, for a new flight model state which does not change them.
+        """
+        if self.state == 'MANUAL' and self.ready:
+            self.commands.publish(nx=self.nx, nz=self.nz, p=self.p)
+
     def nxLaw(self, nx, throttleAxisValue, fmgs, flightModel):
         """
         Calculates the nx control law.
@@ -129,10 +189,10 @@ class FCC:
             float: The nz value either limited in nz or fpa.
         """
         if flightModel.fpa <= fmgs.fpaMin * self.nzMargin and pitchAxisValue < 0:
-            return self.fmgs.nzMax
+            return fmgs.nzMax
 
         elif flightModel.fpa >= fmgs.fpaMax * self.nzMargin and pitchAxisValue > 0:
-            return self.fmgs.nzMin
+            return fmgs.nzMin
 
         return max(fmgs.nzMin, min(fmgs.nzMax, nz))
 
@@ -156,6 +216,22 @@ class FCC:
 
         return max(fmgs.pMin, min(fmgs.pMax, p))
 
+    def protections(self, fmgs, flightModel):
+        """
+        Returns the flight envelope conditions of the nz and p control laws, the laws only depend on the flight model
+        state through them.
+
+        Args:
+            fmgs (object): The Flight Management and Guidance System object.
+            flightModel (object): The Flight Model object.
+
+        Returns:
+            tuple: The fpa below its minimum, fpa above its maximum, phi below its minimum and phi above its maximum
+            conditions, with the margins of the laws.
+        """
+        return (flightModel.fpa <= fmgs.fpaMin * self.nzMargin, flightModel.fpa >= fmgs.fpaMax * self.nzMargin,
+                flightModel.phi < fmgs.phiMin * self.pMargin, flightModel.phi > fmgs.phiMax * self.pMargin)
+
     def sendButtonsState(self, flapsUp, flapsDown, apDisconnect, gear, previousFlapsUp, previousFlapsDown,
                          previousApDisconnect, previousGear):
         """
@@ -172,26 +248,24 @@ class FCC:
             previousGear (bool): The previous state of the gear down button.
         """
         if flapsUp and not previousFlapsUp:
-            print('Flaps up button pushed')
             self.flaps -= 1
             self.flaps = 0 if self.flaps < 0 else self.flaps
-            print('Flaps =', self.flaps)
+            fccLog.info('Flaps up button pushed, flaps = %s', self.flaps)
             self.aviBus.sendMsg('VoletState={}'.format(self.flaps))
         if flapsDown and not previousFlapsDown:
-            print('Flaps down button pushed')
             self.flaps += 1
             self.flaps = 3 if self.flaps > 3 else self.flaps
-            print('Flaps =', self.flaps)
+            fccLog.info('Flaps down button pushed, flaps = %s', self.flaps)
             self.aviBus.sendMsg('VoletState={}'.format(self.flaps))
         if apDisconnect and not previousApDisconnect:
-            print('AP disconnect button pushed')
+            fccLog.info('AP disconnect button pushed')
             if self.state == 'AP_ENGAGED':
                 self.aviBus.sendMsg('FCUAP1 off')  # Send acknowledge message to the fcu
                 self.state = 'MANUAL'
                 self.fcu.setApState('OFF')
         if gear and not previousGear:
             self.gear = True if not self.gear else False
-            print("Gear = ", self.gear, "(False = down, True = up)")
+            fccLog.info('Gear = %s (False = down, True = up)', self.gear)
             self.aviBus.sendMsg('LandingGearState={}'.format(self.gear))
 
 class MiniYoke :
@@ -205,7 +279,15 @@ class MiniYoke :
     - pitchAxisValue: The pitch axis value from the joystick to compute nz.
     - rollAxisValue: The roll axis value from the joystick to compute p.
     - joystick: The joystick object from the pygame library.
+    - joystickIndex: The index of the pygame joystick opened by begin().
+    - pumpEvents: A boolean indicating whether the listener pumps the pygame events, False for a joystick given to begin().
+    - eventDriven: A boolean indicating whether the listener waits for the pygame joystick events instead of polling the joystick.
+    - settleTolerance: The distance between a filtered axis and the steady output of its chain below which the filter is settled.
+    - inputState: The fmgs limits generation, FCC state and flight envelope protections the commands were last computed with.
+    - eventCount: The number of joystick events received by the event listener.
+    - updateCount: The number of times the event listener computed the commands.
     - threadRunning: A boolean indicating whether the listener thread is running.
+    - listenerThread: The thread running the polling listener, woken up by end(), None when not running.
     - moved: A boolean indicating whether the mini yoke has moved.
     - throttleAxis: The index of the throttle axis on the joystick.
     - pitchAxis: The index of the pitch axis on the joystick.
@@ -232,31 +314,66 @@ class MiniYoke :
     - rollAxisMin: The minimum value of the roll axis.
     - filteredPitchAxisValue: The filtered value of the pitch axis using a low pass filter.
     - filteredRollAxisValue: The filtered value of the roll axis using a low pass filter.
+    - pitchFilter: The FilterChain of the pitch axis, the alphaFilter Smoothing by default.
+    - rollFilter: The FilterChain of the roll axis, the alphaFilter Smoothing by default.
+    - notifier: The DataNotifier woken up after each listener iteration.
+    - timer: The PeriodicTimer pacing the listener loop at a fixed rate.
+    - sessionRecorder: The SessionRecorder the joystick samples are recorded to, None when not recording.
+    - flightRecorder: The FlightRecorder each computed sample is appended to, None when not recording.
+    - clock: The clock the mini yoke sleeps on.
 
     Methods:
-    - begin(): Initializes the pygame library and the joystick.
+    - begin(joystick): Initializes the pygame joystick subsystem and the joystick, or uses the given joystick.
     - listener(): Listens for joystick events and updates the mini yoke attributes accordingly.
+    - eventListener(): Waits for the joystick events of the pygame event queue and updates the mini yoke on each change.
+    - asyncListener(): The listener as a coroutine of an asyncio event loop.
+    - sample(): Reads the joystick once, sends the buttons rising edges and computes the manual commands.
+    - update(): Records the inputs, sends the buttons rising edges and computes the manual commands.
+    - sendButtons(): Sends the rising edges of the buttons since the last call.
+    - settled(): Indicates whether the filtered axes have reached the steady output of their chains.
+    - getInputState(): Returns the inputs of the commands other than the joystick.
+    - setFilters(pitchFilter, rollFilter): Sets the filter chains of the axes, configured for the listener rate.
     - getNx(throttleAxisValue): Computes the value of nx based on the throttle axis value.
     - getNz(pitchAxisValue): Computes the value of nz based on the pitch axis value.
     - getP(rollAxisValue): Computes the value of p based on the roll axis value.
     - end(): Stops the listener thread and cleans up the pygame library and joystick.
     """
-    def __init__(self, fcc, alphaFilter):
+    def __init__(self, fcc, alphaFilter, notifier=None, rate=10, clock=None, joystickIndex=0, eventDriven=False, pitchFilter=None, rollFilter=None):
         """
         Initializes a new instance of the MiniYoke class.
 
         Args:
         - fcc: The flight control computer object associated with the mini yoke.
         - alphaFilter: The coefficient for the low pass filter used to filter the joystick inputs.
+        - notifier: The DataNotifier woken up after each listener iteration, None to disable it.
+        - rate: The listener rate in Hz (e.g. 50, 100, 250), alphaFilter is tuned for this rate.
+        - clock: The clock to use, a VirtualClock to simulate the mini yoke, None for the real clock.
+        - joystickIndex: The index of the pygame joystick opened by begin().
+        - eventDriven: True to wait for the pygame joystick events instead of polling the joystick at the rate.
+        - pitchFilter: The FilterChain of the pitch axis, None for the Smoothing filter of alphaFilter, its Deadband stage if any reads the stick as centered.
+        - rollFilter: The FilterChain of the roll axis, None for the Smoothing filter of alphaFilter.
         """
         self.fcc = fcc
+        self.notifier = notifier
+        self.clock = clock if clock is not None else SystemClock()
+        self.timer = PeriodicTimer(rate, clock=self.clock)
+        self.sessionRecorder = None # SessionRecorder of the joystick samples, None when not recording
+        self.flightRecorder = None # FlightRecorder of the computed samples, None when not recording
 
         self.throttleAxisValue = 0 # throttle axis value from joystick to compute nx
         self.pitchAxisValue = 0 # pitch axis value from joystick to compute nz
         self.rollAxisValue = 0 # roll axis value from joystick to compute p
         
         self.joystick = None # joystick object from pygame
+        self.joystickIndex = joystickIndex # index of the joystick opened by begin()
+        self.pumpEvents = True # False for a joystick given to begin(), e.g. a ScriptedJoystick
+        self.eventDriven = eventDriven
+        self.settleTolerance = 1e-3
+        self.inputState = None
+        self.eventCount = 0
+        self.updateCount = 0
         self.threadRunning = True
+        self.listenerThread = None
         self.moved = False
 
         self.throttleAxis = 3
@@ -291,28 +408,36 @@ class MiniYoke :
         self.filteredPitchAxisValue = 0
         self.filteredRollAxisValue = 0
         self.alpha = alphaFilter  # Coefficient for low pass filter
+        self.setFilters(pitchFilter or FilterChain(Smoothing(alphaFilter), rate=rate), rollFilter or FilterChain(Smoothing(alphaFilter), rate=rate))
 
 
-    def begin(self):
+    def begin(self, joystick=None):
         """
-        Initializes the pygame library and the joystick.
+        Initializes the pygame joystick subsystem and the joystick.
+
+        Args:
+        - joystick: A joystick to use instead of a pygame one, e.g. a ScriptedJoystick, pygame is then not initialized.
 
         Returns:
         - True if the joystick is successfully initialized, False otherwise.
         """
-        pygame.init()
-        pygame.joystick.init()
+        if joystick is not None:
+            self.joystick = joystick
+            self.pumpEvents = False
+            return True
+
+        initPygame()
         
         joystickCount = pygame.joystick.get_count()
-        if joystickCount == 0:
+        if joystickCount <= self.joystickIndex:
             print("No joystick found. Please plug one.")
             pygame.quit()
-            time.sleep(2)
+            self.clock.sleep(2)
             return False
         else:
             print(f"{joystickCount} joystick found.")
 
-        joystick = pygame.joystick.Joystick(0)
+        joystick = pygame.joystick.Joystick(self.joystickIndex)
         joystick.init()
 
         self.joystick = joystick
@@ -322,30 +447,190 @@ class MiniYoke :
     def listener(self):
         """
         Listens for joystick events and updates the mini yoke attributes accordingly.
+        The loop is paced by the timer so its rate does not depend on the time spent polling and sending.
+        The thread takes part in the clock until it stops, so a VirtualClock only moves forward while it sleeps.
+        In the event driven mode the pygame event queue is listened to instead, see eventListener().
+        """
+        if self.eventDriven and self.pumpEvents:
+            return self.eventListener()
+
+        self.clock.join()
+        self.listenerThread = threading.current_thread()
+        try:
+            self.timer.start()
+            while self.threadRunning :
+                if self.pumpEvents:
+                    pygame.event.pump()
+                self.sample()
+                self.timer.wait()
+        finally:
+            self.listenerThread = None
+            self.clock.leave()
+
+    def eventListener(self):
         """
+        Waits for the joystick events of the pygame event queue and updates the mini yoke on each change.
+
+        A button edge is sent as soon as its event is received, so presses shorter than the listener period are
+        not lost. An axis moving out of its previous value makes the commands due, they are computed at most once
+        per timer period so the low pass filter keeps the response it is tuned for. A motion which does not change
+        the steady output of the axis chain, e.g. inside its deadband, is ignored. Without events the thread
+        sleeps in the queue and only wakes up at the timer rate: the commands are then computed again only while
+        the filtered axes settle, or when the fmgs limits, the FCC state or the active protections change. A new
+        flight model state which does not change the protections does not change the commands, they are published
+        again without being computed so the state machine still sends a frame per flight state, at most once per
+        period, like in the polling mode. The pygame queue
+        is waited for in real time, the event driven mode does not run on a VirtualClock.
+        """
+        axes = {self.throttleAxis: 'throttleAxisValue', self.pitchAxis: 'pitchAxisValue', self.rollAxis: 'rollAxisValue'}
+        buttons = {self.flapsUpButton: 'flapsUpPushed', self.flapsDownButton: 'flapsDownPushed',
+                   self.apDisconnectButton: 'apDisconnectPushed', self.gearButton: 'gearPushed'}
+        pygame.event.set_blocked(None)
+        pygame.event.set_allowed([pygame.JOYAXISMOTION, pygame.JOYBUTTONDOWN, pygame.JOYBUTTONUP])
+        steady = {self.throttleAxis: lambda value: value, self.pitchAxis: self.pitchFilter.steady, self.rollAxis: self.rollFilter.steady}
+        instanceId = self.joystick.get_instance_id()
+        period = self.timer.period
+
+        self.sample() # the state before the first event
+        nextUpdate = self.clock.monotonic() + period
+        due = False
+        commandsState = self.fcc.flightModel.snapshot.read().generation
         while self.threadRunning :
-            pygame.event.pump()
-            self.throttleAxisValue = self.joystick.get_axis(self.throttleAxis)
-            self.pitchAxisValue = self.joystick.get_axis(self.pitchAxis)
-            self.rollAxisValue = self.joystick.get_axis(self.rollAxis)
-
-            self.flapsUpPushed = self.joystick.get_button(self.flapsUpButton)
-            self.flapsDownPushed = self.joystick.get_button(self.flapsDownButton)
-            self.apDisconnectPushed = self.joystick.get_button(self.apDisconnectButton)
-            self.gearPushed = self.joystick.get_button(self.gearButton)
-
-            self.fcc.sendButtonsState(self.flapsUpPushed, self.flapsDownPushed, self.apDisconnectPushed, self.gearPushed, self.previousFlapsUpPushed, self.previousFlapsDownPushed, self.previousApDisconnectPushed, self.previousGearPushed)
-
-            self.previousFlapsUpPushed = self.flapsUpPushed
-            self.previousFlapsDownPushed = self.flapsDownPushed
-            self.previousApDisconnectPushed = self.apDisconnectPushed
-            self.previousGearPushed = self.gearPushed
-            
-            self.moved = True if self.pitchAxisValue != 0 and self.rollAxisValue != 0 else False
+            timeout = max(1, math.ceil((nextUpdate - self.clock.monotonic() if due else period) * 1000)) # wait(0) would wait forever
+            event = pygame.event.wait(timeout)
+            while event.type != pygame.NOEVENT:
+                if event.instance_id == instanceId:
+                    self.eventCount += 1
+                    if event.type == pygame.JOYAXISMOTION:
+                        if event.axis in axes:
+                            previous = getattr(self, axes[event.axis])
+                            setattr(self, axes[event.axis], event.value)
+                            if steady[event.axis](event.value) != steady[event.axis](previous):
+                                due = True
+                    elif event.button in buttons:
+                        setattr(self, buttons[event.button], event.type == pygame.JOYBUTTONDOWN)
+                        if self.sessionRecorder is not None:
+                            self.sessionRecorder.recordButtons(self)
+                        self.sendButtons()
+                event = pygame.event.poll()
+
+            due = due or not self.settled() or self.inputState != self.getInputState()
+            now = self.clock.monotonic()
+            state = self.fcc.flightModel.snapshot.read().generation
+            if due and now >= nextUpdate:
+                self.updateCount += 1
+                self.update()
+                nextUpdate = now + period
+                due = False
+                commandsState = state
+            elif not due and state != commandsState:
+                self.fcc.republishCommands() # the same commands for the new flight state, the state machine sends them
+                commandsState = state
+                if self.notifier is not None:
+                    self.notifier.notify()
+
+    async def asyncListener(self):
+        """
+        The listener as a coroutine of an asyncio event loop, the ticks are paced on the loop clock.
+        The pygame event queue can not be awaited, the joystick is polled like in listener().
+        """
+        import asyncio
+        loop = asyncio.get_running_loop()
+        period = self.timer.period
+        nextTick = loop.time()
+        while self.threadRunning :
+            if self.pumpEvents:
+                pygame.event.pump()
+            self.sample()
+            nextTick += period
+            delay = nextTick - loop.time()
+            if delay < 0: # overrun, the missed ticks are skipped
+                nextTick -= delay
+                delay = 0
+            await asyncio.sleep(delay)
+
+    def sample(self):
+        """
+        Reads the joystick once, sends the buttons rising edges and computes the manual commands.
+        """
+        self.throttleAxisValue = self.joystick.get_axis(self.throttleAxis)
+        self.pitchAxisValue = self.joystick.get_axis(self.pitchAxis)
+        self.rollAxisValue = self.joystick.get_axis(self.rollAxis)
+
+        self.flapsUpPushed = self.joystick.get_button(self.flapsUpButton)
+        self.flapsDownPushed = self.joystick.get_button(self.flapsDownButton)
+        self.apDisconnectPushed = self.joystick.get_button(self.apDisconnectButton)
+        self.gearPushed = self.joystick.get_button(self.gearButton)
+
+        self.update()
+
+    def update(self):
+        """
+        Records the inputs, sends the buttons rising edges and computes the manual commands.
+        """
+        if self.sessionRecorder is not None:
+            self.sessionRecorder.recordJoystick(self)
+
+        self.sendButtons()
+        
+        self.inputState = self.getInputState()
+        self.moved = True if self.pitchFilter.steady(self.pitchAxisValue) != 0 and self.rollFilter.steady(self.rollAxisValue) != 0 else False # outside the deadbands
+
+        self.fcc.setManualCommands(self.getNx(self.throttleAxisValue), self.getNz(self.pitchAxisValue), self.getP(self.rollAxisValue), self.throttleAxis, self.pitchAxisValue, self.rollAxisValue)
 
-            self.fcc.setManualCommands(self.getNx(self.throttleAxisValue), self.getNz(self.pitchAxisValue), self.getP(self.rollAxisValue), self.throttleAxis, self.pitchAxisValue, self.rollAxisValue)
-            time.sleep(0.1)
+        if self.flightRecorder is not None:
+            self.flightRecorder.recordSample(self)
+
+        if self.notifier is not None:
+            self.notifier.notify()
+
+    def sendButtons(self):
+        """
+        Sends the rising edges of the buttons since the last call.
+        """
+        self.fcc.sendButtonsState(self.flapsUpPushed, self.flapsDownPushed, self.apDisconnectPushed, self.gearPushed, self.previousFlapsUpPushed, self.previousFlapsDownPushed, self.previousApDisconnectPushed, self.previousGearPushed)
+
+        self.previousFlapsUpPushed = self.flapsUpPushed
+        self.previousFlapsDownPushed = self.flapsDownPushed
+        self.previousApDisconnectPushed = self.apDisconnectPushed
+        self.previousGearPushed = self.gearPushed
+
+    def settled(self):
+        """
+        Indicates whether the filtered axes have reached the steady output of their chains for the axes values, which
+        is not the axis value with a deadband or an expo stage.
+
+        Returns:
+        - True if the filters are settled, False otherwise.
+        """
+        return (abs(self.filteredPitchAxisValue - self.pitchFilter.steady(self.pitchAxisValue)) < self.settleTolerance
+                and abs(self.filteredRollAxisValue - self.rollFilter.steady(self.rollAxisValue)) < self.settleTolerance)
     
+    def getInputState(self):
+        """
+        Returns the inputs of the commands other than the joystick.
+
+        Returns:
+        - The fmgs limits generation, the FCC state and the flight envelope protections of the current flight model state.
+        """
+        limits = self.fcc.fmgs.limits.read()
+        return (limits.generation, self.fcc.state, self.fcc.protections(limits, self.fcc.flightModel.snapshot.read()))
+
+    def setFilters(self, pitchFilter, rollFilter):
+        """
+        Sets the filter chains of the axes, their coefficients are computed for the listener rate.
+
+        Args:
+        - pitchFilter: The FilterChain of the pitch axis.
+        - rollFilter: The FilterChain of the roll axis.
+        """
+        pitchFilter.configure(self.timer.rate)
+        rollFilter.configure(self.timer.rate)
+        self.pitchFilter = pitchFilter
+        self.rollFilter = rollFilter
+        self.filteredPitchAxisValue = 0
+        self.filteredRollAxisValue = 0
+
     def getNx(self, throttleAxisValue):
         """
         Computes the value of nx based on the throttle axis value.
@@ -369,7 +654,7 @@ class MiniYoke :
         Returns:
         - The computed value of nz.
         """
-        self.filteredPitchAxisValue = self.alpha * pitchAxisValue + (1 - self.alpha) * self.filteredPitchAxisValue
+        self.filteredPitchAxisValue = self.pitchFilter.step(pitchAxisValue)
         nz = self.nzMin + (self.nzMax - self.nzMin) * (self.filteredPitchAxisValue - self.pitchAxisMin) / (self.pitchAxisMax - self.pitchAxisMin)
         return nz
     
@@ -383,7 +668,7 @@ class MiniYoke :
         Returns:
         - The computed value of p.
         """
-        self.filteredRollAxisValue = self.alpha * rollAxisValue + (1 - self.alpha) * self.filteredRollAxisValue
+        self.filteredRollAxisValue = self.rollFilter.step(rollAxisValue)
         p = self.pMin + (self.pMax - self.pMin) * (self.filteredRollAxisValue - self.rollAxisMin) / (self.rollAxisMax - self.rollAxisMin)
         return p
     
@@ -392,8 +677,12 @@ class MiniYoke :
         Stops the listener thread and cleans up the pygame library and joystick.
         """
         self.threadRunning = False
-        pygame.quit()
-        pygame.joystick.quit()
+        listenerThread = self.listenerThread
+        if listenerThread is not None:
+            self.clock.wake(listenerThread) # the other participants of a VirtualClock may not sleep anymore
+        if self.pumpEvents and pygame is not None: # None when begin() has not been called
+            pygame.quit()
+            pygame.joystick.quit()
 
 class ApLAT:
     """
@@ -402,33 +691,50 @@ class ApLAT:
     Attributes:
         p (float): The value of p.
         ready (bool): Indicates if the apLat data is ready to be sent.
+        schema (MessageSchema): The schema of ApLAT's messages.
         regex (str): The regular expression pattern for parsing ApLAT's messages.
+        notifier (DataNotifier): The notifier woken up when new data is received.
+        snapshot (SnapshotBuffer): The ApLatCommands published each time a message is received.
 
     Methods:
+        receive(agent, record): Updates the p value from a parsed message.
         parser(*msg): Parses the message and updates the p value.
         setReady(ready): Sets the ready status of the apLat data.
     """
 
-    def __init__(self):
+    def __init__(self, notifier=None, clock=None):
         self.p = 0
         self.ready = False
-        self.regex = '^AP_LAT p=(\S+)'
+        self.schema = apLatSchema
+        self.regex = self.schema.regex
+        self.notifier = notifier
+        self.snapshot = SnapshotBuffer(ApLatCommands, clock, p=0)
     
-    def parser(self, *msg):
+    def receive(self, agent, record):
         """
-        Parses the message and updates the p value.
+        Updates the p value from a parsed message.
 
         Args:
-            *msg: Variable number of message arguments.
-
-        Returns:
-            None
+            agent (object): The agent that sent the message.
+            record (AP_LATRecord): The parsed message.
         """
-        self.p = float(msg[1])
+        self.p = record.p
         self.ready = True  # apLat data is ready to be sent
+        self.snapshot.publish(p=self.p)
+
+        if self.notifier is not None:
+            self.notifier.notify()
+
+        apLatLog.info('Received message from AP_LAT : p = %s', self.p)
 
-        print('Received message from AP_LAT :')
-        print('p =', self.p)
+    def parser(self, *msg):
+        """
+        Parses the message and updates the p value.
+
+        Args:
+            *msg: The agent followed by the values captured by the regex.
+        """
+        self.receive(msg[0], self.schema.convert(msg[1:]))
         
     def setReady(self, ready):
         """
@@ -450,33 +756,52 @@ class ApLONG:
         nx (float): The value of nx.
         nz (float): The value of nz.
         ready (bool): Indicates if the apLong data is ready to be sent.
+        schema (MessageSchema): The schema of ApLONG's messages.
         regex (str): The regular expression used for parsing ApLONG's messages.
+        notifier (DataNotifier): The notifier woken up when new data is received.
+        snapshot (SnapshotBuffer): The ApLongCommands published each time a message is received.
 
     Methods:
+        receive(agent, record): Updates nx and nz values from a parsed message.
         parser(*msg): Parses the given message and updates nx and nz values.
         setReady(ready): Sets the ready attribute to the given value.
     """
 
-    def __init__(self):
+    def __init__(self, notifier=None, clock=None):
         self.nx = 0
         self.nz = 0
         self.ready = False
-        self.regex = '^PaLong Nx=(\S+) Nz=(\S+)'
+        self.schema = paLongSchema
+        self.regex = self.schema.regex
+        self.notifier = notifier
+        self.snapshot = SnapshotBuffer(ApLongCommands, clock, nx=0, nz=0)
 
-    def parser(self, *msg):
+    def receive(self, agent, record):
         """
-        Parses the given message and updates nx and nz values.
+        Updates nx and nz values from a parsed message.
 
         Args:
-            *msg: Variable number of message arguments.
+            agent (object): The agent that sent the message.
+            record (PaLongRecord): The parsed message.
         """
-        self.nx = float(msg[1])
-        self.nz = float(msg[2])
-        print('Received message from AP_LONG :')
-        print('nx =', self.nx)
-        print('nz =', self.nz)
+        self.nx = record.nx
+        self.nz = record.nz
+        apLongLog.info('Received message from AP_LONG : nx = %s nz = %s', self.nx, self.nz)
 
         self.ready = True  # apLong data is ready to be sent
+        self.snapshot.publish(nx=self.nx, nz=self.nz)
+
+        if self.notifier is not None:
+            self.notifier.notify()
+
+    def parser(self, *msg):
+        """
+        Parses the given message and updates nx and nz values.
+
+        Args:
+            *msg: The agent followed by the values captured by the regex.
+        """
+        self.receive(msg[0], self.schema.convert(msg[1:]))
 
     def setReady(self, ready):
         """
@@ -502,13 +827,17 @@ class FMGS:
         phiMin (float): The minimum value for phi.
         fpaMax (float): The maximum value for fpa.
         fpaMin (float): The minimum value for fpa.
+        schema (MessageSchema): The schema of FMGS's messages, the alpha and automatic phi limits are skipped.
         regex (str): The regular expression used for parsing FMGS's messages.
+        limits (SnapshotBuffer): The FmgsLimits published each time a message is received.
 
     Methods:
+        getLimits(): Returns the current limits as keyword arguments for a FmgsLimits snapshot.
+        receive(agent, record): Updates the limits from a parsed message.
         parser: Parses the received message and updates the attribute values accordingly.
     """
 
-    def __init__(self):
+    def __init__(self, clock=None):
         self.nxMax = 0.5
         self.nxMin = -1
         self.nzMax = 2.5
@@ -519,24 +848,49 @@ class FMGS:
         self.phiMin = -self.phiMax
         self.fpaMax = 0.175  # 0.175 rad = 10° # Flight Path Angle = Gamma here
         self.fpaMin = -0.262
-        self.regex = '^Performances NxMax=(\S+) NxMin=(\S+) NzMax=(\S+) NzMin=(\S+) PMax=(\S+) PMin=(\S+) AlphaMax=(\S+) AlphaMin=(\S+) PhiMaxManuel=(\S+) PhiMaxAutomatique=(\S+) GammaMax=(\S+) GammaMin=(\S+)'
+        self.schema = performancesSchema
+        self.regex = self.schema.regex
+        self.limits = SnapshotBuffer(FmgsLimits, clock, **self.getLimits())
+
+    def getLimits(self):
+        """
+        Returns the current limits as keyword arguments for a FmgsLimits snapshot.
+
+        Returns:
+            dict: The limits by name.
+        """
+        return {'nxMax': self.nxMax, 'nxMin': self.nxMin, 'nzMax': self.nzMax, 'nzMin': self.nzMin,
+                'pMax': self.pMax, 'pMin': self.pMin, 'phiMax': self.phiMax, 'phiMin': self.phiMin,
+                'fpaMax': self.fpaMax, 'fpaMin': self.fpaMin}
+
+    def receive(self, agent, record):
+        """
+        Updates the limits from a parsed message.
+
+        Args:
+            agent (object): The agent that sent the message.
+            record (PerformancesRecord): The parsed message.
+        """
+        self.nxMax = record.nxMax
+        self.nxMin = record.nxMin
+        self.nzMax = record.nzMax
+        self.nzMin = record.nzMin
+        self.pMax = record.pMax
+        self.pMin = record.pMin
+        self.phiMax = record.phiMax
+        self.fpaMax = record.fpaMax
+        self.fpaMin = record.fpaMin
+
+        self.limits.publish(**self.getLimits())
 
     def parser(self, *msg):
         """
         Parses the received message and updates the attribute values accordingly.
 
         Args:
-            *msg: Variable number of arguments representing the message to be parsed.
-        """
-        self.nxMax = float(msg[1])
-        self.nxMin = float(msg[2])
-        self.nzMax = float(msg[3])
-        self.nzMin = float(msg[4])
-        self.pMax = float(msg[5])
-        self.pMin = float(msg[6])
-        self.phiMax = float(msg[9])
-        self.fpaMax = float(msg[11])
-        self.fpaMin = float(msg[12])
+            *msg: The agent followed by the values captured by the regex.
+        """
+        self.receive(msg[0], self.schema.convert(msg[1:]))
         
 class FCU:
     """
@@ -546,6 +900,7 @@ class FCU:
     Attributes:
         apState (Enum): The current state of the autopilot. Possible values are 'ON' and 'OFF'.
         regex (str): The regular expression pattern used for parsing messages.
+        notifier (DataNotifier): The notifier woken up when the autopilot state changes.
 
     Methods:
         parser(*msg): Parses the message and updates the autopilot state accordingly.
@@ -554,12 +909,16 @@ class FCU:
 
     apState = Enum('ON', 'OFF')
 
-    def __init__(self):
+    def __init__(self, notifier=None):
         """
         Initializes the FCU object with the autopilot state set to 'OFF'.
+
+        Args:
+            notifier (DataNotifier): The notifier woken up when the autopilot state changes.
         """
         self.apState = 'OFF'
         self.regex = '^FCUAP1 push'
+        self.notifier = notifier
 
     def parser(self, *msg):
         """
@@ -568,9 +927,11 @@ class FCU:
         Args:
             *msg: Variable number of message arguments.
         """
-        print('Ap button pushed on FCU')
         self.apState = 'ON' if self.apState == 'OFF' else 'OFF'
-        print('AP state =', self.apState)
+        fcuLog.info('Ap button pushed on FCU, AP state = %s', self.apState)
+
+        if self.notifier is not None:
+            self.notifier.notify()
 
     def setApState(self, state):
         """
@@ -593,15 +954,19 @@ class FlightModel:
         fpa (float): The flight path angle of the aircraft.
         psi (float): The heading angle of the aircraft.
         phi (float): The roll angle of the aircraft.
+        schema (MessageSchema): The schema of the state vector message.
         regex (str): The regular expression used for parsing the state vector message.
         ready (bool): Indicates whether the flight model's state vector has been received.
+        notifier (DataNotifier): The notifier woken up when a state vector is received.
+        snapshot (SnapshotBuffer): The FlightModelState published each time a state vector is received.
     
     Methods:
+        receive(agent, record): Updates the flight model attributes from a parsed state vector.
         parser(*msg): Parses the state vector message and updates the flight model attributes.
         setReady(ready): Sets either the data of the flightModel has been received or not.
     """
 
-    def __init__(self):
+    def __init__(self, notifier=None, clock=None):
         self.x = 0
         self.y = 0
         self.z = 0
@@ -609,25 +974,36 @@ class FlightModel:
         self.fpa = 0
         self.psi = 0
         self.phi = 0
-        self.regex = '^StateVector x=(\S+) y=(\S+) z=(\S+) Vp=(\S+) fpa=(\S+) psi=(\S+) phi=(\S+)'
+        self.schema = stateVectorSchema
+        self.regex = self.schema.regex
         self.ready = False
+        self.notifier = notifier
+        self.snapshot = SnapshotBuffer(FlightModelState, clock, x=0, y=0, z=0, Vp=0, fpa=0, psi=0, phi=0)
 
-    def parser(self, *msg):
+    def receive(self, agent, record):
         """
-        Parses the state vector message and updates the flight model attributes.
+        Updates the flight model attributes from a parsed state vector.
 
         Args:
-            *msg: Variable number of arguments representing the state vector message.
+            agent (object): The agent that sent the message.
+            record (StateVectorRecord): The parsed message.
         """
-        self.x = float(msg[1])
-        self.y = float(msg[2])
-        self.z = float(msg[3])
-        self.Vp = float(msg[4])
-        self.fpa = float(msg[5])
-        self.psi = float(msg[6])
-        self.phi = float(msg[7])
+        self.x, self.y, self.z, self.Vp, self.fpa, self.psi, self.phi = record
 
         self.ready = True
+        self.snapshot.publish(x=self.x, y=self.y, z=self.z, Vp=self.Vp, fpa=self.fpa, psi=self.psi, phi=self.phi)
+
+        if self.notifier is not None:
+            self.notifier.notify()
+
+    def parser(self, *msg):
+        """
+        Parses the state vector message and updates the flight model attributes.
+
+        Args:
+            *msg: The agent followed by the values captured by the regex.
+        """
+        self.receive(msg[0], self.schema.convert(msg[1:]))
     
     def setReady(self, ready):
         """
@@ -636,4 +1012,148 @@ class FlightModel:
         Args:
             ready (bool): The readiness status of the flight model.
         """
-        self.ready = ready
\ No newline at end of file
+        self.ready = ready
+
+class FccStateMachine:
+    """
+    The state machine of the FCC, managing the MANUAL / AP_ENGAGED transitions and sending the commands.
+
+    Attributes:
+        fcc (FCC): The Flight Control Computer, its fcu, flightModel and aviBus are used.
+        miniYoke (MiniYoke): The mini yoke, its moved attribute disengages the autopilot.
+        apLat (ApLAT): The lateral autopilot.
+        apLong (ApLONG): The longitudinal autopilot.
+        controlFrame (MessageBatch): The batch the nx, nz and p commands are sent with each cycle.
+        reader (SnapshotReader): The generations of the snapshots already sent.
+        cycle (int): The generation number of the state machine cycles.
+        clock (SystemClock): The clock of the mini yoke, the ages of the inputs are measured on it.
+        inputAges (InputAges): The ages of the inputs of each command sent and their stale data thresholds.
+        outputs (tuple): The families of the nx, nz and p commands in the namespace of the bus, the outputs of inputAges.
+        staleFrames (int): The number of command frames not sent because an input was stale.
+
+    Methods:
+        step(): Runs one cycle of the state machine.
+        stale(inputs): Counts and logs a command frame not sent because of stale inputs.
+    """
+
+    def __init__(self, fcc, miniYoke, apLat, apLong, controlFrame, inputAges=None):
+        """
+        Initializes a new instance of the FccStateMachine class.
+
+        Args:
+            fcc (FCC): The Flight Control Computer, its fcu, flightModel and aviBus are used.
+            miniYoke (MiniYoke): The mini yoke, its moved attribute disengages the autopilot.
+            apLat (ApLAT): The lateral autopilot.
+            apLong (ApLONG): The longitudinal autopilot.
+            controlFrame (MessageBatch): The batch the nx, nz and p commands are sent with each cycle.
+            inputAges (InputAges): The ages of the inputs, with the staleThresholds by default.
+        """
+        self.fcc = fcc
+        self.miniYoke = miniYoke
+        self.apLat = apLat
+        self.apLong = apLong
+        self.controlFrame = controlFrame
+
+        self.reader = SnapshotReader()
+        self.cycle = 0
+        self.clock = miniYoke.clock
+        self.inputAges = inputAges if inputAges is not None else InputAges(staleThresholds)
+        prefix = getattr(fcc.aviBus, 'prefix', '') # the cockpits of a CockpitGroup may share their InputAges
+        self.outputs = tuple(prefix + family for family in ('APNxControl', 'APNzControl', 'APLatControl'))
+        self.staleFrames = 0
+
+    def step(self):
+        """
+        Runs one cycle of the state machine.
+        """
+        fcc, fcu, aviBus, controlFrame = self.fcc, self.fcc.fcu, self.fcc.aviBus, self.controlFrame
+        self.cycle += 1
+
+        # Read each producer state in one step, the threads keep publishing newer snapshots meanwhile
+        commands = fcc.commands.read()
+        state = fcc.flightModel.snapshot.read()
+        lat = self.apLat.snapshot.read()
+        long = self.apLong.snapshot.read()
+
+        match fcc.state :  # Manage states transitions
+            case 'MANUAL':
+                if fcu.apState == 'ON':
+                    stateMachineLog.info('fcc state switch from MANUAL to AP_ENGAGED')
+                    aviBus.sendMsg('FCUAP1 on') # Send acknowledge message to the fcu
+
+                    fcc.setState('AP_ENGAGED')
+
+            case 'AP_ENGAGED':
+                if fcu.apState == 'OFF':
+                    stateMachineLog.info('fcc state switch from AP_ENGAGED to MANUAL')
+                    aviBus.sendMsg('FCUAP1 off') # Send acknowledge message to the fcu
+
+                    fcc.setState('MANUAL')
+                
+                elif self.miniYoke.moved : 
+                    stateMachineLog.info('miniYoke has been mooved state switch from AP_ENGAGED to MANUAL')
+                    aviBus.sendMsg('FCUAP1 off') # Send acknowledge message to the fcu
+                    
+                    fcu.setApState('OFF')
+                    fcc.setState('MANUAL')
+
+            case _:
+                stateMachineLog.error('Error : unknown fcc state %s', fcc.state)
+            
+        match fcc.state :  # Manage states actions
+            case 'MANUAL':
+                if self.reader.isNew(commands) and self.reader.isNew(state):
+                    now = self.clock.monotonic()
+                    stale = self.inputAges.record(self.outputs[0], now, apLong=long) if long.time is not None else [] # the nx of an AP_LONG not started yet is the initial 0
+                    stale += self.inputAges.record(self.outputs[1], now, yoke=commands, flightModel=state)
+                    stale += self.inputAges.record(self.outputs[2], now, yoke=commands, flightModel=state)
+                    if stale:
+                        self.stale(stale)
+                        self.reader.consume(commands, state)
+                        return
+
+                    with controlFrame:
+                        controlFrame.add(nxControlSchema.format(long.nx))
+                        controlFrame.add(nzControlSchema.format(commands.nz))
+                        controlFrame.add(latControlSchema.format(commands.p))
+                    
+
+                    #print('Sent APNxControl nx={}'.format(commands.nx))
+                    #print('Sent APNzControl nz={}'.format(commands.nz))
+                    #print('Sent APLatControl p={}'.format(commands.p))
+
+                    self.reader.consume(commands, state)
+
+            case 'AP_ENGAGED':
+                if self.reader.isNew(lat) and self.reader.isNew(long) :
+                    now = self.clock.monotonic()
+                    stale = self.inputAges.record(self.outputs[0], now, apLong=long)
+                    stale += self.inputAges.record(self.outputs[1], now, apLong=long)
+                    stale += self.inputAges.record(self.outputs[2], now, apLat=lat)
+                    if stale:
+                        self.stale(stale)
+                        self.reader.consume(lat, long)
+                        return
+
+                    with controlFrame:
+                        controlFrame.add(nxControlSchema.format(long.nx))
+                        controlFrame.add(nzControlSchema.format(long.nz))
+                        controlFrame.add(latControlSchema.format(lat.p))
+                    
+
+                    stateMachineLog.info('Sent APNxControl nx=%s APNzControl nz=%s APLatControl p=%s (cycle %s)', long.nx, long.nz, lat.p, self.cycle)
+
+                    self.reader.consume(lat, long)
+                
+            case _:
+                stateMachineLog.error('Error : unknown fcc state %s', fcc.state)
+
+    def stale(self, inputs):
+        """
+        Counts and logs a command frame not sent because some of its inputs are older than their threshold.
+
+        Args:
+            inputs (list): The names of the stale inputs, once per command computed from them.
+        """
+        self.staleFrames += 1
+        stateMachineLog.warning('Stale %s data, commands not sent (cycle %s)', ', '.join(sorted(set(inputs))), self.cycle)
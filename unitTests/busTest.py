@@ -1,4 +1,10 @@
+import os, sys, time, types, threading, asyncio, unittest
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
 from ivy.std_api import *
+from bus import LoopbackHub, LoopbackBus, MessageBatch
+from metrics import BusMetrics
+from asyncBus import AsyncBus, AsyncBatch
 
 def on_cx_proc(agent, connected):
     print("Agent {} is {}connected".format(agent, "" if connected else "dis"))
@@ -21,4 +27,193 @@ class AviBusTest :
         IvyBindMsg(callback, regex)
     
     def stop(self):
-        IvyStop()
\ No newline at end of file
+        IvyStop()
+
+# Unit tests of the module, run from the repository root with: python -m unittest unitTests.busTest
+
+class QueueingDelayTest(unittest.TestCase):
+    """
+    The queueing delay of the handlers of a queued LoopbackBus, from the queuing of the message to its handler.
+    """
+
+    def setUp(self):
+        self.hub = LoopbackHub()
+        self.sender = LoopbackBus('sender', self.hub)
+        self.receiver = LoopbackBus('receiver', self.hub, queued=True)
+        self.metrics = BusMetrics()
+        self.receiver.setMetrics(self.metrics)
+        self.handled = threading.Event()
+        self.receiver.bindMsg(lambda agent, n: time.sleep(0.05), '^Slow n=(\\S+)')
+        self.receiver.bindMsg(lambda agent, n: self.handled.set(), '^Ping n=(\\S+)')
+        self.slow, self.ping = self.metrics.handlers
+
+    def tearDown(self):
+        self.receiver.stop()
+        self.sender.stop()
+
+    def testDelayInQueue(self):
+        # the Ping message waits in the delivery queue while the Slow handler runs
+        self.sender.sendMsg('Slow n=1')
+        self.sender.sendMsg('Ping n=1')
+        self.assertTrue(self.handled.wait(1))
+        self.assertEqual(self.ping.count, 1)
+        self.assertGreaterEqual(self.ping.delayNs, 40e6)
+        self.assertLess(self.slow.delayNs, 40e6)
+
+    def testDelayNotInherited(self):
+        # a message dispatched as it arrives has no queueing delay, nor the time of the previous queued message
+        self.sender.sendMsg('Slow n=1')
+        self.sender.sendMsg('Ping n=1')
+        self.assertTrue(self.handled.wait(1))
+        time.sleep(0.05)
+        delayNs = self.ping.delayNs
+        self.receiver.dispatcher.dispatch('Ping', 'sender', 'n=2')
+        self.assertEqual((self.ping.count, self.ping.delayCount), (2, 1))
+        self.assertEqual(self.ping.delayNs, delayNs)
+
+    def testNotQueued(self):
+        # the handlers of a bus calling them as the messages arrive, like the Ivy AviBus, have no queueing delay
+        receiver = LoopbackBus('direct', self.hub)
+        metrics = BusMetrics()
+        receiver.setMetrics(metrics)
+        receiver.bindMsg(lambda agent, n: None, '^Ping n=(\\S+)')
+        self.sender.sendMsg('Ping n=1')
+        receiver.stop()
+        handler, = metrics.snapshot()['handlers']
+        self.assertEqual((handler['count'], handler['queued'], handler['meanDelay']), (1, 0, 0.0))
+        self.assertGreater(handler['meanTime'], 0.0)
+        self.assertIn('avibus_handler_queue_seconds_count{family="Ping",handler="QueueingDelayTest.testNotQueued.<locals>.<lambda>"} 0', metrics.render())
+
+class CoalescerTest(unittest.TestCase):
+    """
+    The coalescing of the StateVector messages received while the worker is busy.
+    """
+
+    def setUp(self):
+        self.hub = LoopbackHub()
+        self.sender = LoopbackBus('sender', self.hub)
+        self.receiver = LoopbackBus('receiver', self.hub)
+        self.receiver.coalesce('StateVector')
+        self.stateVectors = []
+        self.pushes = []
+        self.busy = threading.Event()
+        self.release = threading.Event()
+        self.done = threading.Event()
+        self.receiver.bindMsg(self.onStateVector, '^StateVector x=(\\S+)')
+        self.receiver.bindMsg(lambda agent: self.pushes.append(agent), '^FCUAP1 push')
+
+    def tearDown(self):
+        self.release.set()
+        self.receiver.stop()
+        self.sender.stop()
+
+    def onStateVector(self, agent, x):
+        self.stateVectors.append(x)
+        self.busy.set()
+        self.release.wait(1)
+        if x == '5':
+            self.done.set()
+
+    def testNewestStateVector(self):
+        self.sender.sendMsg('StateVector x=1')
+        self.assertTrue(self.busy.wait(1)) # the worker handles the first message until released
+        for x in range(2, 6):
+            self.sender.sendMsg('StateVector x={}'.format(x))
+        self.release.set()
+        self.assertTrue(self.done.wait(1))
+        self.assertEqual(self.stateVectors, ['1', '5'])
+        coalescer = self.receiver.dispatcher.coalescer
+        self.assertEqual(coalescer.received['StateVector'], 5)
+        self.assertEqual(coalescer.dropped['StateVector'], 3)
+
+    def testRecordHandled(self):
+        recorded = []
+        self.receiver.setRecorder(types.SimpleNamespace(recordMessage=recorded.append, recordOutput=None))
+        self.sender.sendMsg('StateVector x=1')
+        self.assertTrue(self.busy.wait(1))
+        for x in range(2, 6):
+            self.sender.sendMsg('StateVector x={}'.format(x))
+        self.sender.sendMsg('FCUAP1 push') # recorded on arrival
+        self.release.set()
+        self.assertTrue(self.done.wait(1))
+        self.assertEqual(recorded, ['StateVector x=1', 'FCUAP1 push', 'StateVector x=5'])
+
+    def testEdgeTriggered(self):
+        self.sender.sendMsg('StateVector x=1')
+        self.assertTrue(self.busy.wait(1))
+        for _ in range(3):
+            self.sender.sendMsg('FCUAP1 push') # handled on arrival while the worker is busy
+        self.assertEqual(self.pushes, ['sender'] * 3)
+        for family in ('FCUAP1', 'C1.FCUAP1'):
+            with self.assertRaises(ValueError):
+                self.receiver.coalesce(family)
+        self.assertNotIn('FCUAP1', self.receiver.dispatcher.coalescedFamilies)
+
+class MessageBatchTest(unittest.TestCase):
+    """
+    The counters of the messages sent by a MessageBatch.
+    """
+
+    def testBytes(self):
+        hub = LoopbackHub()
+        sender = LoopbackBus('sender', hub)
+        batch = MessageBatch(sender, size=2)
+        with batch:
+            batch.add('APNzControl nz=1.0')
+            batch.add('Info cap=270°')
+        self.assertEqual(batch.sends, 2)
+        self.assertEqual(batch.bytes, 18 + 14) # 13 characters, the degree sign is two bytes in UTF-8
+        self.assertEqual(batch.totalBytes, batch.bytes)
+        sender.stop()
+
+class AsyncBusTest(unittest.TestCase):
+    """
+    The subscriptions and the control frame of the asyncio front-end.
+    """
+
+    def setUp(self):
+        self.hub = LoopbackHub()
+        self.sender = LoopbackBus('sender', self.hub)
+        self.receiver = LoopbackBus('receiver', self.hub)
+
+    def tearDown(self):
+        self.receiver.stop()
+        self.sender.stop()
+
+    def testEdgeTriggeredNotDropped(self):
+        async def run():
+            asyncBus = AsyncBus(self.receiver)
+            stateVectors = asyncBus.subscribe('StateVector', maxsize=2)
+            pushes = asyncBus.subscribe('FCUAP1', maxsize=2)
+            for x in range(5):
+                self.sender.sendMsg('StateVector x={} y=0 z=0 Vp=0 fpa=0 psi=0 phi=0'.format(x))
+                self.sender.sendMsg('FCUAP1 push')
+            asyncBus.close()
+            return [record.x async for record in stateVectors], [record async for record in pushes], stateVectors, pushes
+
+        xs, records, stateVectors, pushes = asyncio.run(run())
+        self.assertEqual(xs, [3.0, 4.0]) # the oldest states are dropped
+        self.assertEqual(stateVectors.dropped, 3)
+        self.assertEqual(records, [('push',)] * 5)
+        self.assertEqual(pushes.dropped, 0)
+
+    def testAsyncBatch(self):
+        received = []
+        self.sender.bindMsg(lambda agent, nz: received.append(nz), '^APNzControl nz=(\\S+)')
+
+        async def run():
+            batch = AsyncBatch(AsyncBus(self.receiver), size=3)
+            with batch:
+                batch.add('APNxControl nx=0.0')
+                batch.add('APNzControl nz=1.0')
+            sentOnFlush = list(received)
+            await asyncio.gather(*batch.tasks)
+            return batch, sentOnFlush
+
+        batch, sentOnFlush = asyncio.run(run())
+        self.assertEqual(sentOnFlush, []) # sent by the task, not by the flush
+        self.assertEqual(received, ['1.0'])
+        self.assertEqual((batch.totalSends, batch.totalBytes), (2, 36))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,270 @@
+"""
+Live plots of the DataSampler recordings, updated while a test session runs.
+
+The samples are decimated incrementally into a fixed number of min/max buckets: when the buckets are full they
+are merged by pairs and each bucket covers twice as many samples. A redraw therefore costs the same after ten
+seconds or ten hours of recording, and the minimum and maximum of every bucket are kept so a limit overshoot
+is never decimated away. On screen the lines are redrawn with blitting over a cached background, the axes are
+only fully redrawn when their limits have to grow. Without a display the plots are drawn with Agg to a PNG.
+"""
+
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+# The panels of the live figure: (title, ylabel, [(column, label)]), the columns of the DataSampler recorder
+panels = (
+    ('FCC Nz vs FMGS NzMax & NzMin', 'Nz', [('fcc.nz', 'Nz'), ('fmgs.nzMax', 'NzMax'), ('fmgs.nzMin', 'NzMin')]),
+    ('StateVector FPA vs FMGS FpaMax & FpaMin', 'FPA', [('stateVector.fpa', 'fpa (rad)'), ('fmgs.fpaMax', 'fpa max (rad)'), ('fmgs.fpaMin', 'fpa min (rad)')]),
+    ('FCC P vs FMGS PMax & PMin', 'P', [('fcc.p', 'p (rad/s)'), ('fmgs.pMax', 'p Max (rad/s)'), ('fmgs.pMin', 'p Min (rad/s)')]),
+    ('FCC Phi Limitation', 'Phi', [('stateVector.phi', 'Phi (rad)'), ('fmgs.phiMaxManuel', 'PhiMax (rad)'), ('fmgs.phiMinManuel', 'PhiMin (rad)')]),
+)
+
+class MinMaxDecimator():
+    """
+    Decimates a growing series of samples into at most 2 * maxBuckets min/max buckets.
+
+    Attributes:
+        maxBuckets (int): The number of buckets kept after a merge, the buckets are merged by pairs when 2 * maxBuckets are full.
+        bucketSize (int): The number of samples per bucket, doubled at each merge.
+        buckets (int): The number of buckets used.
+        filled (int): The number of samples in the last bucket.
+        times (numpy.ndarray): The time of the first sample of each bucket.
+        mins (numpy.ndarray): The (buckets, columns) minimum of each column in each bucket.
+        maxs (numpy.ndarray): The (buckets, columns) maximum of each column in each bucket.
+
+    Methods:
+        add(times, values): Adds samples.
+        xy(): Returns the points to draw.
+    """
+
+    def __init__(self, columns, maxBuckets=500):
+        """
+        Initializes a new instance of the MinMaxDecimator class.
+
+        Args:
+            columns (int): The number of values per sample.
+            maxBuckets (int): The number of buckets kept after a merge, about the width of a plot in pixels.
+        """
+        self.maxBuckets = maxBuckets
+        self.bucketSize = 1
+        self.buckets = 0
+        self.filled = 0
+        self.times = np.zeros(2 * maxBuckets)
+        self.mins = np.zeros((2 * maxBuckets, columns))
+        self.maxs = np.zeros((2 * maxBuckets, columns))
+
+    def merge(self):
+        """
+        Merges the full buckets by pairs, each bucket then covers twice as many samples.
+        """
+        half = self.buckets // 2
+        self.times[:half] = self.times[0:self.buckets:2]
+        self.mins[:half] = np.fmin(self.mins[0:self.buckets:2], self.mins[1:self.buckets:2])
+        self.maxs[:half] = np.fmax(self.maxs[0:self.buckets:2], self.maxs[1:self.buckets:2])
+        self.buckets = half
+        self.bucketSize *= 2
+        self.filled = self.bucketSize
+
+    def add(self, times, values):
+        """
+        Adds samples, NaN values are ignored unless a whole bucket is NaN.
+
+        Args:
+            times (numpy.ndarray): The times of the samples.
+            values (numpy.ndarray): The (samples, columns) values.
+        """
+        i = 0
+        while i < len(times):
+            if self.buckets == 0 or self.filled == self.bucketSize:
+                if self.buckets == len(self.times):
+                    self.merge()
+                self.times[self.buckets] = times[i]
+                self.mins[self.buckets] = np.nan
+                self.maxs[self.buckets] = np.nan
+                self.buckets += 1
+                self.filled = 0
+
+            take = min(len(times) - i, self.bucketSize - self.filled)
+            chunk = values[i:i + take]
+            last = self.buckets - 1
+            self.mins[last] = np.fmin(self.mins[last], np.fmin.reduce(chunk, axis=0))
+            self.maxs[last] = np.fmax(self.maxs[last], np.fmax.reduce(chunk, axis=0))
+            self.filled += take
+            i += take
+
+    def xy(self):
+        """
+        Returns the points to draw, the minimum then the maximum of each bucket at the bucket time.
+
+        Returns:
+            tuple: The (2 * buckets) times and the (2 * buckets, columns) values.
+        """
+        x = np.repeat(self.times[:self.buckets], 2)
+        y = np.empty((2 * self.buckets, self.mins.shape[1]))
+        y[0::2] = self.mins[:self.buckets]
+        y[1::2] = self.maxs[:self.buckets]
+        return x, y
+
+class LivePlotter():
+    """
+    Plots the limit protections recorded by a DataSampler while the session runs.
+
+    update() must be called from the thread owning the figure, the main thread when it is shown on screen.
+
+    Attributes:
+        recorder (RingRecorder): The recorder of the DataSampler.
+        headless (bool): Draws with Agg for the PNG export only, no window is opened.
+        columns (list): The recorder columns of the lines, in the panels order.
+        decimator (MinMaxDecimator): The decimated samples of the session.
+        consumed (int): The recorder count already decimated.
+        startTime (float): The time of the first sample, the plots time origin.
+        figure (Figure): The figure of the panels.
+        axes (list): The axes of the panels.
+        lines (list): The lines of the columns.
+        scaled (list): Whether the y limits of each panel have been set from the data.
+        backgrounds (list): The cached backgrounds of the axes for blitting, None when a full redraw is needed.
+
+    Methods:
+        update(): Decimates the new samples and redraws the lines.
+        watch(running, interval): Shows the figure and updates it while running() is True.
+        savePng(path): Draws the whole figure to a PNG file.
+    """
+
+    def __init__(self, recorder, headless=False, maxBuckets=500):
+        """
+        Initializes a new instance of the LivePlotter class.
+
+        Args:
+            recorder (RingRecorder): The recorder of the DataSampler.
+            headless (bool): Draws with Agg for the PNG export only, no window is opened.
+            maxBuckets (int): The number of min/max buckets kept after a merge.
+        """
+        self.recorder = recorder
+        self.headless = headless
+        self.columns = [column for _, _, series in panels for column, _ in series]
+        self.indexes = [recorder.indexes[column] for column in self.columns]
+        self.decimator = MinMaxDecimator(len(self.columns), maxBuckets)
+        self.consumed = 0
+        self.startTime = None
+
+        if headless:
+            self.figure = Figure(figsize=(10, 12))
+            FigureCanvasAgg(self.figure)
+        else:
+            import matplotlib.pyplot as plt
+            self.figure = plt.figure(figsize=(10, 12))
+        self.axes = self.figure.subplots(len(panels), 1, sharex=True)
+
+        self.lines = []
+        for ax, (title, ylabel, series) in zip(self.axes, panels):
+            for _, label in series:
+                self.lines.append(ax.plot([], [], label=label, animated=not headless)[0])
+            ax.set_title(title)
+            ax.set_ylabel(ylabel)
+            ax.set_xlim(0, 10)
+            ax.legend(loc='upper left')
+        self.axes[-1].set_xlabel('time (s)')
+        self.figure.tight_layout()
+        self.scaled = [False] * len(panels)
+        self.backgrounds = None
+
+    def pull(self):
+        """
+        Decimates the samples recorded since the last call, the recorder may have been cleared meanwhile.
+        """
+        if self.recorder.count < self.consumed:
+            self.consumed = 0  # DataSampler.reset()
+        rows, self.consumed = self.recorder.rowsSince(self.consumed)
+        if len(rows):
+            if self.startTime is None:
+                self.startTime = rows[0, self.recorder.indexes['t']]
+            self.decimator.add(rows[:, self.recorder.indexes['t']] - self.startTime, rows[:, self.indexes])
+
+    def rescale(self, x, y):
+        """
+        Grows the axes limits to the data, the time axis is doubled so it is rarely redrawn.
+
+        Returns:
+            bool: True if a limit has changed.
+        """
+        changed = False
+        if len(x) and x[-1] > self.axes[0].get_xlim()[1]:
+            self.axes[0].set_xlim(0, 2 * x[-1])
+            changed = True
+
+        column = 0
+        for k, (ax, (_, _, series)) in enumerate(zip(self.axes, panels)):
+            values = y[:, column:column + len(series)]
+            column += len(series)
+            if not np.isfinite(values).any():
+                continue
+            low, high = np.nanmin(values), np.nanmax(values)
+            bottom, top = ax.get_ylim()
+            if self.scaled[k] and bottom <= low and high <= top:
+                continue
+            if self.scaled[k]:
+                low, high = min(low, bottom), max(high, top)
+            margin = 0.1 * (high - low) if high > low else 0.5
+            ax.set_ylim(low - margin, high + margin)
+            self.scaled[k] = True
+            changed = True
+        return changed
+
+    def update(self):
+        """
+        Decimates the new samples and redraws the lines, blitted over the cached backgrounds on screen.
+        """
+        self.pull()
+        x, y = self.decimator.xy()
+        for i, line in enumerate(self.lines):
+            line.set_data(x, y[:, i])
+        changed = self.rescale(x, y)
+        if self.headless:
+            return
+
+        canvas = self.figure.canvas
+        if changed or self.backgrounds is None:
+            canvas.draw()  # the animated lines are not drawn, the backgrounds are clean
+            self.backgrounds = [canvas.copy_from_bbox(ax.bbox) for ax in self.axes]
+        else:
+            for background in self.backgrounds:
+                canvas.restore_region(background)
+
+        for ax, line in zip(np.repeat(self.axes, [len(series) for _, _, series in panels]), self.lines):
+            ax.draw_artist(line)
+        for ax in self.axes:
+            canvas.blit(ax.bbox)
+        canvas.flush_events()
+
+    def watch(self, running, interval=0.5):
+        """
+        Shows the figure and updates it while running() is True, from the main thread.
+
+        Args:
+            running (callable): Returns False when the session is over.
+            interval (float): The time between two updates in seconds.
+        """
+        import matplotlib.pyplot as plt
+        plt.show(block=False)
+        while running():
+            self.update()
+            self.figure.canvas.start_event_loop(interval)  # unlike plt.pause, does not force a full redraw
+        self.update()
+
+    def savePng(self, path):
+        """
+        Draws the whole figure to a PNG file.
+
+        Args:
+            path (str): The path of the PNG file.
+        """
+        self.update()
+        if self.decimator.buckets:
+            self.axes[0].set_xlim(0, max(self.decimator.times[self.decimator.buckets - 1], 1.0)) # the recorded time only
+        for line in self.lines:
+            line.set_animated(False)
+        self.figure.savefig(path)
+        for line in self.lines:
+            line.set_animated(not self.headless)
+        self.backgrounds = None
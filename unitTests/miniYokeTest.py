@@ -1,8 +1,11 @@
-import time
 from systemsTest import FmgsTest, ApLATTest, ApLONGTest, StateVectorTest, FcuTest, FccTest, DataSampler
 from busTest import AviBusTest
+from clock import SystemClock
+from scriptedJoystick import Hold, Pulses
+import threading, argparse
 
-aviBus = AviBusTest(appName="MiniYokeTest", adress="192.168.0.255:2010")
+aviBus = None # set by setup(), an AviBusTest on the network or a LoopbackBus for the isolated runs
+clock = SystemClock() # replace with a VirtualClock to run the scenarios in simulated time
 
 fmgs = FmgsTest()
 apLat = ApLATTest()
@@ -10,7 +13,35 @@ apLong = ApLONGTest()
 stateVector = StateVectorTest()
 fcuTest = FcuTest()
 fccTest = FccTest(fcuTest)
-dataSampler = DataSampler(fmgs, apLat, apLong, stateVector, fcuTest, fccTest)
+dataSampler = None # started by setup()
+endOfRunPlots = True # False when the session is plotted live or exported, the recording is then kept whole
+pilot = None # a ScriptedPilot playing the requests to the pilot, None when a human flies the yoke
+
+def setup(bus, testClock=None):
+    """
+    Sets the bus the scenarios talk on and starts the data sampler, before testInit().
+
+    Args:
+        bus (AviBusTest): The bus, an AviBusTest or a LoopbackBus.
+        testClock (SystemClock): The clock of the scenarios, the real clock by default.
+    """
+    global aviBus, clock, dataSampler
+    aviBus = bus
+    if testClock is not None:
+        clock = testClock
+    dataSampler = DataSampler(fmgs, apLat, apLong, stateVector, fcuTest, fccTest, clock=clock)
+
+def ask(request, **inputs):
+    """
+    Asks the pilot for an input, played on the scripted joystick when the scenarios are not flown by a human.
+
+    Args:
+        request (str): The request printed to the pilot.
+        **inputs: The profiles played by the ScriptedPilot, by yoke input name.
+    """
+    print(request)
+    if pilot is not None:
+        pilot.play(**inputs)
 
 def testInit():
     aviBus.bindMsg(fccTest.nxParser, fccTest.nxRegex)
@@ -21,7 +52,7 @@ def testInit():
     aviBus.bindMsg(fccTest.apAckParser, fccTest.apAckRegex)
     aviBus.bindMsg(stateVector.parser, stateVector.parserRegex)
 
-    time.sleep(5)
+    clock.sleep(5)
 
 def nzLimitationTest():
     """
@@ -49,25 +80,26 @@ def nzLimitationTest():
     msg = fmgs.getRegex()
     aviBus.sendMsg(msg)
 
-    print("please pull the yoke for 10 secs")
+    ask("please pull the yoke for 10 secs", pitch=Hold(1.0, 10))
     
-    time.sleep(10)
+    clock.sleep(10)
 
-    print("please push the yoke for 10 secs")
+    ask("please push the yoke for 10 secs", pitch=Hold(-1.0, 10))
 
-    time.sleep(10)
+    clock.sleep(10)
     
     dataSampler.stop()
-    dataSampler.plotNzLimitation()
-    dataSampler.plotFpaLimitation()
-    dataSampler.reset()
+    if endOfRunPlots:
+        dataSampler.plotNzLimitation()
+        dataSampler.plotFpaLimitation()
+        dataSampler.reset()
 
 def pLimitationTest():
     """
     This function performs a p and phi limitation test.
     """
     print("Begin p limitation test")
-    time.sleep(2)
+    clock.sleep(2)
     for msg in stateVector.initRegexs(30, 120, 12.69):
         aviBus.sendMsg(msg)
     
@@ -88,8 +120,8 @@ def pLimitationTest():
     msg = fmgs.getRegex()
     aviBus.sendMsg(msg)
 
-    print("please roll the yoke left for 10 secs")
-    time.sleep(3)
+    ask("please roll the yoke left for 10 secs", roll=Hold(-1.0, 10))
+    clock.sleep(3)
 
     fmgs.setData(nxMax=0.5, 
                  nxMin=-1, 
@@ -106,7 +138,7 @@ def pLimitationTest():
     msg = fmgs.getRegex()
     aviBus.sendMsg(msg)
 
-    time.sleep(3)
+    clock.sleep(3)
 
     fmgs.setData(nxMax=0.5, 
                  nxMin=-1, 
@@ -123,11 +155,11 @@ def pLimitationTest():
     
     msg = fmgs.getRegex()
     aviBus.sendMsg(msg)
-    time.sleep(4)
+    clock.sleep(4)
 
-    print("please roll the yoke right for 10 secs")
+    ask("please roll the yoke right for 10 secs", roll=Hold(1.0, 10))
 
-    time.sleep(3)
+    clock.sleep(3)
 
     fmgs.setData(nxMax=0.5,
                     nxMin=-1,
@@ -144,13 +176,13 @@ def pLimitationTest():
     
     msg = fmgs.getRegex()
     aviBus.sendMsg(msg)
-    time.sleep(7)
+    clock.sleep(7)
 
     dataSampler.stop()
-    dataSampler.plotPLimitationTest()
-    dataSampler.plotPhiLimitationTest()
-
-    dataSampler.reset()
+    if endOfRunPlots:
+        dataSampler.plotPLimitationTest()
+        dataSampler.plotPhiLimitationTest()
+        dataSampler.reset()
 
 def apTest():
     """
@@ -160,14 +192,14 @@ def apTest():
     waits for the flight control computer to send data back.
     """
     print("Begin autopilot test")
-    time.sleep(2)
+    clock.sleep(2)
     for msg in stateVector.initRegexs(30, 120, 12.69):
         aviBus.sendMsg(msg)
 
     print("activating autopilot...")
     msg = fcuTest.getRegex()
     aviBus.sendMsg(msg)
-    time.sleep(1)
+    clock.sleep(1)
 
     apLat.setData(p=0.3)
     apLong.setData(nx=0.3, nz=1.6)
@@ -180,10 +212,10 @@ def apTest():
     print("waiting for fcc to send data...")
     while (apLat.p != 0.3) and (apLong.nx != 0.3) and (apLong.nz != 1.6):
         print(".")
-        time.sleep(1)
+        clock.sleep(1)
 
     print("fcc data received")
-    time.sleep(1)
+    clock.sleep(1)
 
     apLat.setData(p=-0.4)
     msgLat = apLat.getRegex()
@@ -193,7 +225,7 @@ def apTest():
 
     while apLat.p != -0.4:
         print(".")
-        time.sleep(1)
+        clock.sleep(1)
         count += 1
         if count == 2:
             break
@@ -204,7 +236,7 @@ def apTest():
 
     while apLat.p != -0.4 and apLong.nx != 0 and apLong.nz != 2.5:
         print(".")
-        time.sleep(1)
+        clock.sleep(1)
     
     print("Auto pilot test completed")
 
@@ -214,7 +246,7 @@ def buttonsTest():
     It tests the autopilot engagement and disengagement, flaps control, and gear control.
     """
     print("Begin buttons test")
-    time.sleep(2)
+    clock.sleep(2)
     for msg in stateVector.initRegexs(30, 120, 12.69):
         aviBus.sendMsg(msg)
     
@@ -225,13 +257,13 @@ def buttonsTest():
     print("wait acknowledge response...")
     while fcuTest.apState != 'on':
         print(".")
-        time.sleep(1)
+        clock.sleep(1)
     print("acknowledge response received")
 
-    print("please disengage the autopilot")
+    ask("please disengage the autopilot", apDisconnect=Pulses())
     while fcuTest.apState != 'off':
         print(".")
-        time.sleep(1)
+        clock.sleep(1)
     print("autopilot disengaged")
 
     print("reengaging autopilot")
@@ -241,45 +273,45 @@ def buttonsTest():
     print("wait acknowledge response...")
     while fcuTest.apState != 'on':
         print(".")
-        time.sleep(1)
+        clock.sleep(1)
     print("acknowledge response received")
 
-    print("please disconnect the autopilot by moving the yoke")
+    ask("please disconnect the autopilot by moving the yoke", pitch=Hold(0.5, 1), roll=Hold(0.5, 1))
     while fcuTest.apState != 'off':
         print(".")
-        time.sleep(1)
+        clock.sleep(1)
     print("autopilot disconnected")
 
     print("Testing flaps buttons...")
-    print("please extend flaps to 3")
+    ask("please extend flaps to 3", flapsDown=Pulses(3))
     while fccTest.flaps != 3:
         print(".")
-        time.sleep(1)
+        clock.sleep(1)
     print("flaps extended to 3")
     
-    print("please retract flaps to 0")
+    ask("please retract flaps to 0", flapsUp=Pulses(3))
     while fccTest.flaps != 0:
         print(".")
-        time.sleep(1)
+        clock.sleep(1)
     print("flaps retracted to 0")
 
     print("Testing gear button...")
-    print("please retract gear")
+    ask("please retract gear", gear=Pulses())
     while fccTest.gear != True:
         print(".")
-        time.sleep(1)
+        clock.sleep(1)
 
     print("gear retracted")
 
-    print("please extend gear")
+    ask("please extend gear", gear=Pulses())
     while fccTest.gear != False:
         print(".")
-        time.sleep(1)
+        clock.sleep(1)
     
     print("gear extended")
     print("Button test completed")
     
-if __name__ == '__main__':
+def runTests():
     testInit()
     try :
         nzLimitationTest()
@@ -287,4 +319,29 @@ if __name__ == '__main__':
         buttonsTest()
         apTest()
     except KeyboardInterrupt:
-        aviBus.stop() 
\ No newline at end of file
+        aviBus.stop()
+
+if __name__ == '__main__':
+    argParser = argparse.ArgumentParser(description="miniYoke hardware in the loop tests")
+    argParser.add_argument('--live', action='store_true', help="plot the limit protections live while the tests run")
+    argParser.add_argument('--png', metavar='FILE', help="export the plots of the whole session to a PNG file, without display")
+    args = argParser.parse_args()
+
+    setup(AviBusTest(appName="MiniYokeTest", adress="192.168.0.255:2010"))
+
+    if not (args.live or args.png):
+        runTests()
+    else:
+        from livePlot import LivePlotter
+        endOfRunPlots = False
+        plotter = LivePlotter(dataSampler.recorder, headless=not args.live)
+
+        if args.live: # the figure belongs to the main thread, the tests run beside it
+            testThread = threading.Thread(target=runTests)
+            testThread.start()
+            plotter.watch(testThread.is_alive)
+        else:
+            runTests()
+
+        if args.png:
+            plotter.savePng(args.png)
@@ -0,0 +1,270 @@
+import os, sys, io, math, time, threading, traceback, contextlib, argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from bus import LoopbackHub, LoopbackBus
+from scheduler import DataNotifier, PeriodicTimer
+from scriptedJoystick import ScriptedJoystick, ScriptedPilot
+
+# The scenarios of miniYokeTest run by default
+scenarios = ['nzLimitationTest', 'pLimitationTest', 'buttonsTest', 'apTest']
+
+class SimulatedAircraft:
+    """
+    A minimal flight simulator agent for the isolated runs, standing for aircraft-sim.
+
+    Once initialized by an InitStateVector message it integrates a point mass flying the nz and roll rate
+    commands of the FCC and publishes its StateVector at a fixed rate.
+
+    Attributes:
+        aviBus (LoopbackBus): The agent of the simulator on the hub.
+        state (list): The x, y, z, Vp, fpa, psi and phi of the aircraft.
+        nz (float): The last nz command.
+        p (float): The last roll rate command.
+        initialized (bool): Indicates whether the initial state has been received.
+        timer (PeriodicTimer): The timer pacing the simulation.
+        threadRunning (bool): Indicates whether the simulation thread is running.
+    """
+
+    g = 9.81
+
+    def __init__(self, hub, rate=20):
+        self.aviBus = LoopbackBus('FlightSimulator', hub)
+        self.state = [0.0] * 7
+        self.nz = 1.0
+        self.p = 0.0
+        self.initialized = False
+        self.timer = PeriodicTimer(rate)
+        self.threadRunning = True
+
+        self.aviBus.bindMsg(self.initParser, '^InitStateVector x=(\\S+) y=(\\S+) z=(\\S+) Vp=(\\S+) fpa=(\\S+) psi=(\\S+) phi=(\\S+)')
+        self.aviBus.bindMsg(self.nzParser, '^APNzControl nz=(\\S+)')
+        self.aviBus.bindMsg(self.pParser, '^APLatControl rollRate=(\\S+)')
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def initParser(self, agent, *values):
+        self.state = [float(value) for value in values]
+        self.initialized = True
+
+    def nzParser(self, agent, nz):
+        self.nz = float(nz)
+
+    def pParser(self, agent, p):
+        self.p = float(p)
+
+    def run(self):
+        dt = self.timer.period
+        self.timer.start()
+        while self.threadRunning:
+            if self.initialized:
+                x, y, z, Vp, fpa, psi, phi = self.state
+                phi += self.p * dt
+                fpa += self.g / Vp * (self.nz * math.cos(phi) - math.cos(fpa)) * dt
+                psi += self.g / Vp * self.nz * math.sin(phi) / math.cos(fpa) * dt
+                x += Vp * math.cos(fpa) * math.cos(psi) * dt
+                y += Vp * math.cos(fpa) * math.sin(psi) * dt
+                z += Vp * math.sin(fpa) * dt
+                self.state = [x, y, z, Vp, fpa, psi, phi]
+                self.aviBus.sendMsg('StateVector x={} y={} z={} Vp={} fpa={} psi={} phi={}'.format(*self.state))
+            self.timer.wait()
+
+    def stop(self):
+        self.threadRunning = False
+        self.aviBus.stop()
+
+class ModuleUnderTest:
+    """
+    The miniYoke module wired on the hub of a scenario, with a scripted joystick flown by a ScriptedPilot, run by
+    its own threads like main.py: the yoke sampled at its rate and the state machine stepped on each new data.
+
+    Attributes:
+        aviBus (LoopbackBus): The bus of the module.
+        notifier (DataNotifier): The notifier of the main loop.
+        cockpit (Cockpit): The subsystems, FCC, mini yoke and state machine of the module.
+        joystick (ScriptedJoystick): The joystick of the mini yoke.
+        pilot (ScriptedPilot): The pilot playing the requests of the scenarios on the joystick.
+        threadRunning (bool): Indicates whether the threads are running.
+    """
+
+    def __init__(self, hub):
+        from cockpits import Cockpit
+
+        self.aviBus = LoopbackBus('MiniYokeModule', hub)
+        self.notifier = DataNotifier()
+        self.cockpit = Cockpit(None, self.aviBus, notifier=self.notifier)
+        self.joystick = ScriptedJoystick(self.cockpit.miniYoke.clock)
+        self.cockpit.miniYoke.begin(self.joystick)
+        self.pilot = ScriptedPilot(self.joystick, self.cockpit.miniYoke)
+        self.threadRunning = True
+
+        self.threads = [threading.Thread(target=self.yokeLoop, daemon=True), threading.Thread(target=self.mainLoop, daemon=True)]
+        for thread in self.threads:
+            thread.start()
+
+    def yokeLoop(self):
+        miniYoke = self.cockpit.miniYoke
+        miniYoke.timer.start()
+        while self.threadRunning:
+            miniYoke.sample()
+            miniYoke.timer.wait()
+
+    def mainLoop(self):
+        while self.threadRunning:
+            self.notifier.wait(timeout=0.5)
+            self.cockpit.stateMachine.step()
+
+    def stop(self):
+        self.threadRunning = False
+        self.aviBus.stop()
+
+def outsideLimits(recorder, value, lower, upper):
+    """
+    Returns the number of samples of a value outside its limits.
+
+    Args:
+        recorder (RingRecorder): The recorder of the DataSampler.
+        value (str): The column of the value.
+        lower (str): The column of the lower limit.
+        upper (str): The column of the upper limit.
+
+    Returns:
+        int: The number of samples outside the limits.
+    """
+    values = recorder.column(value)
+    return int(((values < recorder.column(lower) - 1e-9) | (values > recorder.column(upper) + 1e-9)).sum())
+
+def runScenario(name, outputDir, timeout):
+    """
+    Runs a scenario of miniYokeTest in this process, against its own hub, module, simulator and recorder.
+
+    Args:
+        name (str): The name of the scenario function.
+        outputDir (str): The directory the plot of the scenario is saved to.
+        timeout (float): The maximum duration of the scenario in seconds.
+
+    Returns:
+        dict: The name, status, duration, output, plot and envelope counts of the scenario, failed when a command
+        sample is outside the fmgs limits.
+    """
+    output = io.StringIO()
+    result = {'name': name, 'status': 'passed', 'error': None}
+
+    with contextlib.redirect_stdout(output):
+        import miniYokeTest
+        from livePlot import LivePlotter
+
+        hub = LoopbackHub()
+        module = ModuleUnderTest(hub)
+        aircraft = SimulatedAircraft(hub)
+        miniYokeTest.setup(LoopbackBus('MiniYokeTest', hub))
+        miniYokeTest.endOfRunPlots = False
+        miniYokeTest.pilot = module.pilot
+
+        def body():
+            try:
+                miniYokeTest.testInit()
+                getattr(miniYokeTest, name)()
+            except Exception:
+                result['status'] = 'failed'
+                result['error'] = traceback.format_exc()
+
+        startTime = time.monotonic()
+        thread = threading.Thread(target=body, daemon=True) # abandoned on timeout, the process is not reused
+        thread.start()
+        thread.join(timeout)
+        if thread.is_alive():
+            result['status'] = 'timeout'
+        result['duration'] = time.monotonic() - startTime
+
+        recorder = miniYokeTest.dataSampler.recorder
+        result['samples'] = len(recorder)
+        result['nzOutside'] = outsideLimits(recorder, 'fcc.nz', 'fmgs.nzMin', 'fmgs.nzMax')
+        result['pOutside'] = outsideLimits(recorder, 'fcc.p', 'fmgs.pMin', 'fmgs.pMax')
+        if result['status'] == 'passed' and (result['nzOutside'] or result['pOutside']):
+            result['status'] = 'failed' # the commands left the flight envelope
+            result['error'] = '{} nz and {} p samples outside the fmgs limits'.format(result['nzOutside'], result['pOutside'])
+        result['plot'] = name + '.png'
+        LivePlotter(recorder, headless=True).savePng(os.path.join(outputDir, result['plot']))
+
+        miniYokeTest.dataSampler.end()
+        aircraft.stop()
+        module.stop()
+
+    result['output'] = output.getvalue()
+    return result
+
+def runAll(names, outputDir, workers=None, timeout=120.0):
+    """
+    Runs scenarios in parallel, each in a fresh worker process.
+
+    Args:
+        names (list): The names of the scenario functions.
+        outputDir (str): The directory of the plots and of the report.
+        workers (int): The number of worker processes, one per scenario by default.
+        timeout (float): The maximum duration of each scenario in seconds.
+
+    Returns:
+        list: The results of the scenarios, in the names order.
+    """
+    os.makedirs(outputDir, exist_ok=True)
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers or len(names), mp_context=context, max_tasks_per_child=1) as executor:
+        futures = [executor.submit(runScenario, name, outputDir, timeout) for name in names]
+        results = []
+        for name, future in zip(names, futures):
+            try:
+                results.append(future.result())
+            except Exception:
+                results.append({'name': name, 'status': 'crashed', 'error': traceback.format_exc(), 'duration': 0.0,
+                                'samples': 0, 'nzOutside': 0, 'pOutside': 0, 'plot': None, 'output': ''})
+    return results
+
+def writeReport(results, path, wallTime):
+    """
+    Writes the report of the scenarios: a summary table, then the plot, errors and output of each scenario.
+
+    Args:
+        results (list): The results of runAll.
+        path (str): The path of the markdown report.
+        wallTime (float): The duration of the whole run in seconds.
+    """
+    lines = ['# miniYoke scenarios report', '',
+             '{} scenarios in {:.1f} s ({:.1f} s run one after another)'.format(
+                 len(results), wallTime, sum(result['duration'] for result in results)), '',
+             '| scenario | status | duration (s) | samples | nz outside limits | p outside limits |',
+             '|---|---|---|---|---|---|']
+    for result in results:
+        lines.append('| {name} | {status} | {duration:.1f} | {samples} | {nzOutside} | {pOutside} |'.format(**result))
+
+    for result in results:
+        lines += ['', '## ' + result['name'], '']
+        if result['plot']:
+            lines += ['![{0}]({1})'.format(result['name'], result['plot']), '']
+        if result['error']:
+            lines += ['```', result['error'].rstrip(), '```', '']
+        lines += ['```', result['output'].rstrip(), '```']
+
+    with open(path, 'w') as file:
+        file.write('\n'.join(lines) + '\n')
+
+if __name__ == '__main__':
+    argParser = argparse.ArgumentParser(description="Runs the miniYokeTest scenarios in parallel, each against its own in-memory module")
+    argParser.add_argument('scenarios', nargs='*', default=scenarios, help="the scenarios to run")
+    argParser.add_argument('--workers', type=int, help="worker processes, one per scenario by default")
+    argParser.add_argument('--output', default='testReport', help="directory of the report and plots")
+    argParser.add_argument('--timeout', type=float, default=120.0, help="maximum duration of each scenario in seconds")
+    args = argParser.parse_args()
+
+    startTime = time.monotonic()
+    results = runAll(args.scenarios, args.output, args.workers, args.timeout)
+    wallTime = time.monotonic() - startTime
+
+    reportPath = os.path.join(args.output, 'report.md')
+    writeReport(results, reportPath, wallTime)
+    for result in results:
+        print('{:<20} {:<8} {:>6.1f} s'.format(result['name'], result['status'], result['duration']))
+    print('Report written to {} in {:.1f} s'.format(reportPath, wallTime))
+    sys.exit(0 if all(result['status'] == 'passed' for result in results) else 1)
@@ -1,5 +1,14 @@
-import time,threading
-import matplotlib.pyplot as plt
+import os, sys, time, threading, tempfile, unittest
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from clock import SystemClock, VirtualClock
+from scheduler import PeriodicTimer, DataNotifier
+from systems import FCC, MiniYoke, FMGS, FCU, FlightModel, ApLAT, ApLONG, FccStateMachine, initPygame
+from bus import LoopbackHub, LoopbackBus, MessageBatch
+from scriptedJoystick import ScriptedJoystick, SineSweep
+from filters import buildChain
+from replay import ReplayEngine, SessionRecorder, loadSession
 
 class FmgsTest():
     """
@@ -20,25 +29,10 @@ class FmgsTest():
         fpaMax (float): The maximum value for fpa.
         fpaMin (float): The minimum value for fpa.
         regex (str): The regular expression pattern.
-
-        nxMaxData (list): The list to store nxMax data.
-        nxMinData (list): The list to store nxMin data.
-        nzMaxData (list): The list to store nzMax data.
-        nzMinData (list): The list to store nzMin data.
-        pMaxData (list): The list to store pMax data.
-        pMinData (list): The list to store pMin data.
-        alphaMaxData (list): The list to store alphaMax data.
-        alphaMinData (list): The list to store alphaMin data.
-        phiMaxManuelData (list): The list to store phiMaxManuel data.
-        phiMinManuelData (list): The list to store phiMinManuel data.
-        phiMaxAutomatiqueData (list): The list to store phiMaxAutomatique data.
-        fpaMaxData (list): The list to store fpaMax data.
-        fpaMinData (list): The list to store fpaMin data.
     
     Methods:
         getRegex(): Get the regular expression pattern.
         setData(nxMax, nxMin, nzMax, nzMin, pMax, pMin, alphaMax, alphaMin, phiMaxManuel, phiMaxAutomatique, fpaMax, fpaMin): Set the data of the FMGS test.
-        resetRecord(): Reset the data records.
     """
 
     def __init__(self):
@@ -57,20 +51,6 @@ class FmgsTest():
         self.fpaMin = 0
         self.regex = 'Performances NxMax={} NxMin={} NzMax={} NzMin={} PMax={} PMin={} AlphaMax={} AlphaMin={} PhiMaxManuel={} PhiMaxAutomatique={} GammaMax={} GammaMin={}'
 
-        self.nxMaxData = []
-        self.nxMinData = []
-        self.nzMaxData = []
-        self.nzMinData = []
-        self.pMaxData = []
-        self.pMinData = []
-        self.alphaMaxData = []
-        self.alphaMinData = []
-        self.phiMaxManuelData = []
-        self.phiMinManuelData = []
-        self.phiMaxAutomatiqueData = []
-        self.fpaMaxData = []
-        self.fpaMinData = []
-
     def getRegex(self):
         """
         Get the formated regular expression pattern.
@@ -113,24 +93,6 @@ class FmgsTest():
         self.fpaMax = float(fpaMax)
         self.fpaMin = float(fpaMin)
     
-    def resetRecord(self):
-        """
-        Reset the data records.
-        """
-        self.nxMaxData = []
-        self.nxMinData = []
-        self.nzMaxData = []
-        self.nzMinData = []
-        self.pMaxData = []
-        self.pMinData = []
-        self.alphaMaxData = []
-        self.alphaMinData = []
-        self.phiMaxManuelData = []
-        self.phiMinManuelData = []
-        self.phiMaxAutomatiqueData = []
-        self.fpaMaxData = []
-        self.fpaMinData = []
-    
 class ApLATTest():
     """
     This class represents the ApLAT system for testing purposes.
@@ -138,20 +100,16 @@ class ApLATTest():
     Attributes:
         p (int): The value of p.
         regex (str): The regex pattern used for formatting.
-        pData (list): A list to store data.
 
     Methods:
         getRegex(): Returns the formatted regex pattern.
         setData(p): Sets the value of p.
-        resetRecord(): Resets the pData list.
     """
 
     def __init__(self):
         self.p = 0
         self.regex = 'AP_LAT p={}'
 
-        self.pData = []
-    
     def getRegex(self):
         """
         Returns the formatted regular expression pattern.
@@ -172,12 +130,6 @@ class ApLATTest():
         """
         self.p = p
 
-    def resetRecord(self):
-        """
-        Resets the pData list.
-        """
-        self.pData = []
-
 class ApLONGTest():
     """
     This class represents the ApLONG system for testing purposes.
@@ -185,22 +137,16 @@ class ApLONGTest():
     Attributes:
         nx (int): The value of nx.
         nz (int): The value of nz.
-        nxData (list): A list to store nx data.
-        nzData (list): A list to store nz data.
         regex (str): The regex pattern for formatting nx and nz values.
 
     Methods:
         getRegex(): Get the regex pattern with formatted nx and nz values.
         setData(nx, nz): Set the values of nx and nz.
-        resetRecord(): Reset the nxData and nzData lists.
     """
     def __init__(self):
         self.nx = 0
         self.nz = 0
 
-        self.nxData = []
-        self.nzData = []
-
         self.regex = 'PaLong Nx={} Nz={}'
 
     def getRegex(self):
@@ -225,13 +171,6 @@ class ApLONGTest():
         self.nx = nx
         self.nz = nz
     
-    def resetRecord(self):
-        """
-        Reset the nxData and nzData lists.
-        """
-        self.nxData = []
-        self.nzData = []
-
 class StateVectorTest():
     """
     This class represents the StateVector for testing purposes.
@@ -246,14 +185,6 @@ class StateVectorTest():
         phi (float): The value of phi.
         parserRegex (str): The regex pattern used for parsing.
 
-        xData (list): A list to store x data.
-        yData (list): A list to store y data.
-        zData (list): A list to store z data.
-        VpData (list): A list to store Vp data.
-        fpaData (list): A list to store fpa data.
-        psiData (list): A list to store psi data.
-        phiData (list): A list to store phi data.
-
         regex (str): The regex pattern for formatting x, y, z, Vp, fpa, psi, and phi values.
         windregex (str): The regex pattern for formatting VWind and dirWind values.
         MagneticDeclination (str): The regex pattern for formatting MagneticDeclination value.
@@ -261,7 +192,6 @@ class StateVectorTest():
     Methods:
         initRegexs(VWind, dirWind, MagneticDeclination): Initialize the regex patterns with formatted values to initialize the simulation.
         parser(*msg): Parse the message and set the attribute values.
-        resetRecord(): Reset the data records.
     """
     def __init__(self):
         self.x = 0
@@ -273,14 +203,6 @@ class StateVectorTest():
         self.phi = 0
         self.parserRegex = '^StateVector x=(\S+) y=(\S+) z=(\S+) Vp=(\S+) fpa=(\S+) psi=(\S+) phi=(\S+)'
 
-        self.xData = []
-        self.yData = []
-        self.zData = []
-        self.VpData = []
-        self.fpaData = []
-        self.psiData = []
-        self.phiData = []
-
         self.regex = 'InitStateVector x={} y={} z={} Vp={} fpa={} psi={} phi={}'
         self.windregex = 'VWind={} dirWind={}'
         self.MagneticDeclination = 'MagneticDeclination={}'
@@ -318,18 +240,6 @@ class StateVectorTest():
         self.psi = float(msg[6])
         self.phi = float(msg[7])
 
-    def resetRecord(self):
-        """
-        Reset the data records.
-        """
-        self.xData = []
-        self.yData = []
-        self.zData = []
-        self.VpData = []
-        self.fpaData = []
-        self.psiData = []
-        self.phiData = []
-
 class FcuTest():
     """
     This class represents the Flight Control Unit (FCU) for testing purposes.
@@ -337,13 +247,11 @@ class FcuTest():
     Attributes:
         apState (str): The current state of the autopilot.
         regex (str): The regular expression used for matching a specific pattern.
-        apStateData (list): A list to store the recorded autopilot states.
     """
     
     def __init__(self):
         self.apState = 'off'
         self.regex = 'FCUAP1 push'
-        self.apStateData = []
     
     def getRegex(self):
         """
@@ -363,12 +271,6 @@ class FcuTest():
         """
         self.apState = apState
     
-    def resetRecord(self):
-        """
-        Resets the recorded autopilot states.
-        """
-        self.apStateData = []
-    
 class FccTest():
     """
     This class represents a test for the Flight Control Computer (FCC).
@@ -381,9 +283,6 @@ class FccTest():
         flaps (float): The state of the flaps.
         gear (bool): The state of the landing gear.
         fcu (object): The Flight Control Unit (FCU) object.
-        nxData (list): A list to store nx data.
-        nzData (list): A list to store nz data.
-        pData (list): A list to store p data.
         nxRegex (str): The regular expression pattern for nx control.
         nzRegex (str): The regular expression pattern for nz control.
         pRegex (str): The regular expression pattern for roll rate control.
@@ -398,7 +297,6 @@ class FccTest():
         flapsParser: Parses the flaps state data.
         gearParser: Parses the landing gear state data.
         apAckParser: Parses the AP Acknowledgement data.
-        resetRecord: Resets the stored data.
     """
 
     def __init__(self, fcu):
@@ -409,10 +307,6 @@ class FccTest():
         self.gear = False
         self.fcu = fcu
 
-        self.nxData = []
-        self.nzData = []
-        self.pData = []
-
         self.nxRegex = '^APNxControl nx=(\S+)'
         self.nzRegex = '^APNzControl nz=(\S+)'
         self.pRegex = '^APLatControl rollRate=(\S+)'
@@ -441,16 +335,99 @@ class FccTest():
     def apAckParser(self, *msg):
         print("AP Ack: ", msg[1])
         self.fcu.apState = msg[1]
-    
-    def resetRecord(self):
-        self.nxData = []
-        self.nzData = []
-        self.pData = []
+
+class RingRecorder():
+    """
+    A preallocated columnar ring buffer of float samples.
+
+    One row is written per sample in a (capacity, columns) float64 array allocated once, so recording never
+    allocates nor grows lists: when the buffer is full the oldest rows are overwritten. Each column is
+    returned as a NumPy view for the plots, without copy as long as the buffer has not wrapped.
+
+    Attributes:
+        columns (tuple): The names of the columns.
+        indexes (dict): The index of each column by name.
+        capacity (int): The maximum number of rows kept.
+        data (numpy.ndarray): The (capacity, columns) array of the rows.
+        count (int): The total number of rows written since the last clear.
+
+    Methods:
+        append(row): Writes a row of values, in the columns order.
+        column(name): Returns the values of a column in chronological order.
+        rowsSince(start): Returns the rows appended since a count.
+        clear(): Forgets the recorded rows.
+    """
+
+    def __init__(self, columns, capacity):
+        """
+        Initializes a new instance of the RingRecorder class.
+
+        Args:
+            columns (list): The names of the columns.
+            capacity (int): The maximum number of rows kept.
+        """
+        self.columns = tuple(columns)
+        self.indexes = {name: index for index, name in enumerate(self.columns)}
+        self.capacity = capacity
+        self.data = np.full((capacity, len(self.columns)), np.nan)
+        self.count = 0
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def append(self, row):
+        """
+        Writes a row of values, overwriting the oldest row if the buffer is full.
+
+        Args:
+            row (sequence): The values, in the columns order.
+        """
+        self.data[self.count % self.capacity] = row
+        self.count += 1
+
+    def column(self, name):
+        """
+        Returns the values of a column in chronological order.
+
+        Args:
+            name (str): The name of the column.
+
+        Returns:
+            numpy.ndarray: A view of the column, a copy once the buffer has wrapped.
+        """
+        values = self.data[:, self.indexes[name]]
+        if self.count <= self.capacity:
+            return values[:self.count]
+        start = self.count % self.capacity
+        return np.concatenate((values[start:], values[:start]))
+
+    def rowsSince(self, start):
+        """
+        Returns the rows appended since a count, the overwritten ones are skipped.
+
+        Args:
+            start (int): The count of the first row to return.
+
+        Returns:
+            tuple: The (rows, columns) array copy of the rows and the count they go up to.
+        """
+        count = self.count  # the rows before it are complete, the sampling thread may be appending
+        start = max(start, count - self.capacity)
+        return self.data[np.arange(start, count) % self.capacity], count
+
+    def clear(self):
+        """
+        Forgets the recorded rows, the buffer is kept.
+        """
+        self.count = 0
 
 class DataSampler():
     """
     A class that samples datas from various components of the system.
 
+    The values are recorded at a fixed rate in a RingRecorder, one row per sample with the sampling time
+    in the 't' column and one column per value named '<component>.<attribute>'.
+
     Attributes:
         fmgs (FMGS): The FMGS component.
         apLat (APLat): The APLat component.
@@ -458,28 +435,41 @@ class DataSampler():
         stateVector (StateVector): The StateVector component.
         fcu (FCU): The FCU component.
         fcc (FCC): The FCC component.
+        recorder (RingRecorder): The recorded samples.
+        timer (PeriodicTimer): The timer pacing the sampling thread.
         sampleThread (Thread): The thread used for sampling.
         doSample (bool): Flag indicating whether to perform sampling.
         threadRunning (bool): Flag indicating whether the thread is running.
+        clock (SystemClock): The clock the sampling thread sleeps on.
 
     Methods:
         start(self): Sets the doSample flag to True, indicating to start sampling.
         fetch(self): The function that runs in the sampling thread.
-        sampleFmgs(self, fmgs): Samples data from the FMGS component.
-        sampleApLat(self, apLat): Samples data from the APLat component.
-        sampleApLong(self, apLong): Samples data from the APLong component.
-        sampleStateVector(self, stateVector): Samples data from the StateVector component.
-        sampleFcu(self, fcu): Samples data from the FCU component.
-        samplefcc(self, fcc): Samples data from the FCC component.
+        sample(self): Records one row of the components values.
         stop(self): Stops the sampling process.
-        reset(self): Resets the recorded data in all components.
+        reset(self): Resets the recorded data.
         end(self): Ends the sampling thread.
+        time(self): Returns the sampling times since the first recorded sample.
         plotNzLimitation(self): Plots the limitation of Nz values.
         plotFpaLimitation(self): Plots the limitation of FPA values.
         plotPLimitationTest(self): Plots the limitation of P values.
         plotPhiLimitationTest(self): Plots the limitation of Phi values.
     """
-    def __init__(self, fmgs, apLat, apLong, stateVector, fcu, fcc):
+
+    fmgsColumns = ('nxMax', 'nxMin', 'nzMax', 'nzMin', 'pMax', 'pMin', 'alphaMax', 'alphaMin',
+                   'phiMaxManuel', 'phiMinManuel', 'phiMaxAutomatique', 'fpaMax', 'fpaMin')
+    stateVectorColumns = ('x', 'y', 'z', 'Vp', 'fpa', 'psi', 'phi')
+
+    def __init__(self, fmgs, apLat, apLong, stateVector, fcu, fcc, clock=None, rate=10, capacity=36000):
+        """
+        Initializes a new instance of the DataSampler class and starts its sampling thread.
+
+        Args:
+            fmgs, apLat, apLong, stateVector, fcu, fcc: The components to sample.
+            clock (SystemClock): The clock the sampling thread sleeps on, the real clock by default.
+            rate (float): The sampling rate in Hz.
+            capacity (int): The number of samples kept, one hour at 10 Hz by default.
+        """
         self.fmgs = fmgs
         self.apLat = apLat
         self.apLong = apLong
@@ -487,10 +477,18 @@ class DataSampler():
         self.fcu = fcu
         self.fcc = fcc
 
+        columns = (['t'] + ['fmgs.' + name for name in self.fmgsColumns] + ['apLat.p', 'apLong.nx', 'apLong.nz']
+                   + ['stateVector.' + name for name in self.stateVectorColumns] + ['fcu.apState', 'fcc.nx', 'fcc.nz', 'fcc.p'])
+        self.recorder = RingRecorder(columns, capacity)
+
         self.sampleThread = None
         self.doSample = False
         self.threadRunning = True
 
+        self.clock = clock if clock is not None else SystemClock()
+        self.timer = PeriodicTimer(rate, self.clock)
+        self.clock.join() # the sampling thread sleeps on the clock until end() is called
+
         self.sampleThread = threading.Thread(target=self.fetch)
         self.sampleThread.start()
     
@@ -505,93 +503,26 @@ class DataSampler():
         The function that runs in the sampling thread.
         Continuously samples data from the components if doSample flag is True.
         """
+        self.timer.start()
         while self.threadRunning:
             if self.doSample:
-                #print(".")
-                self.sampleFmgs(self.fmgs)
-                self.sampleApLat(self.apLat)
-                self.sampleApLong(self.apLong)
-                self.sampleStateVector(self.stateVector)
-                self.sampleFcu(self.fcu)
-                self.samplefcc(self.fcc)
+                self.sample()
                 
-            time.sleep(0.1)
+            self.timer.wait()
 
-    def sampleFmgs(self, fmgs):
-        """
-        Samples data from the FMGS component and appends it to the corresponding data lists.
-        
-        Args:
-            fmgs (FMGS): The FMGS component.
-        """
-        fmgs.nxMaxData.append(fmgs.nxMax)
-        fmgs.nxMinData.append(fmgs.nxMin)
-        fmgs.nzMaxData.append(fmgs.nzMax)
-        fmgs.nzMinData.append(fmgs.nzMin)
-        fmgs.pMaxData.append(fmgs.pMax)
-        fmgs.pMinData.append(fmgs.pMin)
-        fmgs.alphaMaxData.append(fmgs.alphaMax)
-        fmgs.alphaMinData.append(fmgs.alphaMin)
-        fmgs.phiMaxManuelData.append(fmgs.phiMaxManuel)
-        fmgs.phiMinManuelData.append(fmgs.phiMinManuel)
-        fmgs.phiMaxAutomatiqueData.append(fmgs.phiMaxAutomatique)
-        fmgs.fpaMaxData.append(fmgs.fpaMax)
-        fmgs.fpaMinData.append(fmgs.fpaMin)
-        
-    def sampleApLat(self, apLat):
-        """
-        Samples data from the APLat component and appends it to the corresponding data lists.
-        
-        Args:
-            apLat (APLat): The APLat component.
-        """
-        apLat.pData.append(apLat.p)
-        pass
-    
-    def sampleApLong(self, apLong):
-        """
-        Samples data from the APLong component and appends it to the corresponding data lists.
-        
-        Args:
-            apLong (APLong): The APLong component.
-        """
-        apLong.nxData.append(apLong.nx)
-        pass
+        self.clock.leave()
 
-    def sampleStateVector(self, stateVector):
-        """
-        Samples data from the StateVector component and appends it to the corresponding data lists.
-        
-        Args:
-            stateVector (StateVector): The StateVector component.
-        """
-        stateVector.xData.append(stateVector.x)
-        stateVector.yData.append(stateVector.y)
-        stateVector.zData.append(stateVector.z)
-        stateVector.VpData.append(stateVector.Vp)
-        stateVector.fpaData.append(stateVector.fpa)
-        stateVector.psiData.append(stateVector.psi)
-        stateVector.phiData.append(stateVector.phi)
-        
-    def sampleFcu(self, fcu):
-        """
-        Samples data from the FCU component and appends it to the corresponding data lists.
-        
-        Args:
-            fcu (FCU): The FCU component.
-        """
-        fcu.apStateData.append(fcu.apState)
-    
-    def samplefcc(self, fcc):
+    def sample(self):
         """
-        Samples data from the FCC component and appends it to the corresponding data lists.
-        
-        Args:
-            fcc (FCC): The FCC component.
+        Records one row of the components values, the FCU autopilot state is recorded as 1.0 when 'on'.
         """
-        fcc.nxData.append(fcc.nx)
-        fcc.nzData.append(fcc.nz)
-        fcc.pData.append(fcc.p)
+        fmgs, stateVector = self.fmgs, self.stateVector
+        row = [self.clock.monotonic()]
+        row += [getattr(fmgs, name) for name in self.fmgsColumns]
+        row += [self.apLat.p, self.apLong.nx, self.apLong.nz]
+        row += [getattr(stateVector, name) for name in self.stateVectorColumns]
+        row += [1.0 if self.fcu.apState == 'on' else 0.0, self.fcc.nx, self.fcc.nz, self.fcc.p]
+        self.recorder.append(row)
     
     def stop(self):
         """
@@ -601,36 +532,40 @@ class DataSampler():
     
     def reset(self):
         """
-        Resets the recorded data in all components.
+        Resets the recorded data.
         """
-        self.fmgs.resetRecord()
-        self.apLat.resetRecord()
-        self.apLong.resetRecord()
-        self.stateVector.resetRecord()
-        self.fcu.resetRecord()
-        self.fcc.resetRecord()
+        self.recorder.clear()
     
     def end(self):
         """
         Ends the sampling thread by setting the threadRunning flag to False.
         """
         self.threadRunning = False
+
+    def time(self):
+        """
+        Returns the sampling times in seconds since the first recorded sample.
+        """
+        t = self.recorder.column('t')
+        return t - t[0] if len(t) else t
     
     def plotNzLimitation(self):
         """
         Plots the limitation of Nz values.
         """
-        nz = self.fcc.nzData
-        nzMax = self.fmgs.nzMaxData
-        nzMin = self.fmgs.nzMinData
+        import matplotlib.pyplot as plt # only imported when plotting
+        t = self.time()
+        nz = self.recorder.column('fcc.nz')
+        nzMax = self.recorder.column('fmgs.nzMax')
+        nzMin = self.recorder.column('fmgs.nzMin')
 
         plt.figure(figsize=(10, 6))
 
-        plt.plot(nz, label='Nz')
-        plt.plot(nzMax, label='NzMax')
-        plt.plot(nzMin, label='NzMin')
+        plt.plot(t, nz, label='Nz')
+        plt.plot(t, nzMax, label='NzMax')
+        plt.plot(t, nzMin, label='NzMin')
         plt.title('FCC Nz vs FMGS NzMax & NzMin')
-        plt.xlabel('time (ds)')
+        plt.xlabel('time (s)')
         plt.ylabel('Nz')
         plt.legend()
 
@@ -641,17 +576,19 @@ class DataSampler():
         """
         Plots the limitation of FPA values.
         """
-        fpa = self.stateVector.fpaData
-        fpaMax = self.fmgs.fpaMaxData
-        fpaMin = self.fmgs.fpaMinData
+        import matplotlib.pyplot as plt # only imported when plotting
+        t = self.time()
+        fpa = self.recorder.column('stateVector.fpa')
+        fpaMax = self.recorder.column('fmgs.fpaMax')
+        fpaMin = self.recorder.column('fmgs.fpaMin')
 
         plt.figure(figsize=(10, 6))
 
-        plt.plot(fpa, label='fpa (rad)')
-        plt.plot(fpaMax, label='fpa max (rad)')
-        plt.plot(fpaMin, label='fpa min (rad)')
+        plt.plot(t, fpa, label='fpa (rad)')
+        plt.plot(t, fpaMax, label='fpa max (rad)')
+        plt.plot(t, fpaMin, label='fpa min (rad)')
         plt.title('StateVector FPA vs FMGS FpaMax & FpaMin')
-        plt.xlabel('time (ds)')
+        plt.xlabel('time (s)')
         plt.ylabel('FPA')
         plt.legend()
 
@@ -662,17 +599,19 @@ class DataSampler():
         """
         Plots the limitation of P values.
         """
-        p = self.fcc.pData
-        pMax = self.fmgs.pMaxData
-        pMin = self.fmgs.pMinData
+        import matplotlib.pyplot as plt # only imported when plotting
+        t = self.time()
+        p = self.recorder.column('fcc.p')
+        pMax = self.recorder.column('fmgs.pMax')
+        pMin = self.recorder.column('fmgs.pMin')
 
         plt.figure(figsize=(10, 6))
 
-        plt.plot(p, label='p (rad/s)')
-        plt.plot(pMax, label='p Max (rad/s)')
-        plt.plot(pMin, label='p Min (rad/s)')
+        plt.plot(t, p, label='p (rad/s)')
+        plt.plot(t, pMax, label='p Max (rad/s)')
+        plt.plot(t, pMin, label='p Min (rad/s)')
         plt.title('FCC P vs FMGS PMax & PMin')
-        plt.xlabel('time (ds)')
+        plt.xlabel('time (s)')
         plt.ylabel('P')
         plt.legend()
 
@@ -683,19 +622,327 @@ class DataSampler():
         """
         Plots the limitation of Phi values.
         """
-        phiMax = self.fmgs.phiMaxManuelData
-        phiMin = self.fmgs.phiMinManuelData
-        phi = self.stateVector.phiData
+        import matplotlib.pyplot as plt # only imported when plotting
+        t = self.time()
+        phiMax = self.recorder.column('fmgs.phiMaxManuel')
+        phiMin = self.recorder.column('fmgs.phiMinManuel')
+        phi = self.recorder.column('stateVector.phi')
 
         plt.figure(figsize=(10, 6))
 
-        plt.plot(phi, label='Phi (rad)')
-        plt.plot(phiMax, label='PhiMax (rad)')
-        plt.plot(phiMin, label='PhiMin (rad)')
+        plt.plot(t, phi, label='Phi (rad)')
+        plt.plot(t, phiMax, label='PhiMax (rad)')
+        plt.plot(t, phiMin, label='PhiMin (rad)')
         plt.title('FCC Phi Limitation')
-        plt.xlabel('time (ds)')
+        plt.xlabel('time (s)')
         plt.ylabel('Phi')
         plt.legend()
 
         plt.tight_layout()
-        plt.show()
\ No newline at end of file
+        plt.show()
+
+# Unit tests of the module, run from the repository root with: python -m unittest unitTests.systemsTest
+
+class RestingJoystick():
+    """
+    A joystick at rest, the events of the event listener tests are posted to the pygame event queue.
+    """
+
+    def get_instance_id(self):
+        return 0
+
+    def get_axis(self, index):
+        return 0.0
+
+    def get_button(self, index):
+        return False
+
+class FilterChainTest(unittest.TestCase):
+    """
+    The filter chains settle at their steady output, which is not the input with a deadband or an expo stage.
+    """
+
+    def settle(self, chain, value, samples=300):
+        for _ in range(samples):
+            output = chain.step(value)
+        return output
+
+    def testExpo(self):
+        chain = buildChain(cutoff=2.0, expo=0.3, rate=50)
+        self.assertAlmostEqual(chain.steady(0.5), 0.3875)
+        self.assertAlmostEqual(self.settle(chain, 0.5), chain.steady(0.5))
+
+    def testDeadband(self):
+        chain = buildChain(cutoff=2.0, order=2, deadband=0.1, rate=50)
+        self.assertEqual(chain.steady(0.05), 0.0)
+        self.assertAlmostEqual(chain.steady(0.55), 0.5)
+        self.assertAlmostEqual(self.settle(chain, 0.55), 0.5)
+        self.assertAlmostEqual(self.settle(chain, -0.05), 0.0)
+
+    def testBatch(self):
+        chain = buildChain(cutoff=2.0, order=2, deadband=0.1, expo=0.3, rateLimit=4, rate=50)
+        values = np.sin(np.linspace(0, 10, 500))
+        expected = [chain.step(value) for value in values]
+        np.testing.assert_allclose(chain.batch(values), expected)
+
+    def testMiniYokeSettled(self):
+        miniYoke = MiniYoke(FCC(FCU(), FMGS(), FlightModel(), None), alphaFilter=0.1, rate=50)
+        miniYoke.setFilters(buildChain(expo=0.3, alpha=1.0, rate=50), buildChain(deadband=0.1, alpha=1.0, rate=50))
+        miniYoke.pitchAxisValue, miniYoke.rollAxisValue = 0.5, 0.05
+        miniYoke.getNz(miniYoke.pitchAxisValue)
+        miniYoke.getP(miniYoke.rollAxisValue)
+        self.assertAlmostEqual(miniYoke.filteredPitchAxisValue, 0.3875)
+        self.assertTrue(miniYoke.settled())
+
+    def testMiniYokeDeadband(self):
+        miniYoke = MiniYoke(FCC(FCU(), FMGS(), FlightModel(), None), alphaFilter=0.1, rate=50)
+        miniYoke.setFilters(buildChain(deadband=0.1, rate=50), buildChain(deadband=0.1, rate=50))
+        miniYoke.begin(RestingJoystick())
+        miniYoke.joystick.get_axis = lambda index: 0.05 # a stick resting inside the deadband
+        miniYoke.sample()
+        self.assertFalse(miniYoke.moved)
+        self.assertEqual(miniYoke.filteredPitchAxisValue, 0.0)
+
+class CockpitGroupTest(unittest.TestCase):
+    """
+    The mini yokes of the multi cockpit mode are built with the filter chains of the settings.
+    """
+
+    def testFilterSettings(self):
+        from cockpits import CockpitGroup
+        bus = LoopbackBus('MiniYokeModule', LoopbackHub())
+        cockpits = CockpitGroup(bus, alphaFilter=1.0, filterSettings={'deadband': 0.1, 'expo': 0.3})
+        for joystick in (RestingJoystick(), RestingJoystick()):
+            miniYoke = cockpits.addCockpit(joystick).miniYoke
+            self.assertEqual(miniYoke.pitchFilter.steady(0.05), 0.0)
+            self.assertIsNot(miniYoke.pitchFilter, miniYoke.rollFilter)
+        self.assertIsNot(cockpits.cockpits[0].miniYoke.pitchFilter, cockpits.cockpits[1].miniYoke.pitchFilter)
+        bus.stop()
+
+    def testInputAges(self):
+        from cockpits import CockpitGroup
+        bus = LoopbackBus('MiniYokeModule', LoopbackHub())
+        cockpits = CockpitGroup(bus, alphaFilter=1.0)
+        for joystick in (RestingJoystick(), RestingJoystick()):
+            cockpit = cockpits.addCockpit(joystick)
+            cockpit.flightModel.snapshot.publish(x=0, y=0, z=10668, Vp=230, fpa=0, psi=0, phi=0)
+            cockpit.miniYoke.sample()
+        cockpits.step()
+        self.assertIs(cockpits.cockpits[0].stateMachine.inputAges, cockpits.cockpits[1].stateMachine.inputAges)
+        self.assertEqual({ages['output'] for ages in cockpits.inputAges.snapshot()},
+                         {'{}.{}'.format(name, family) for name in ('C1', 'C2') for family in ('APNzControl', 'APLatControl')})
+        bus.stop()
+
+class EventListenerTest(unittest.TestCase):
+    """
+    The event driven mini yoke only computes the commands again when an input they depend on changes.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy') # no window is opened, the event queue only needs a video driver
+        cls.pygame = initPygame()
+
+    def setUp(self):
+        self.flightModel = FlightModel()
+        self.fcc = FCC(FCU(), FMGS(), self.flightModel, None)
+        self.miniYoke = MiniYoke(self.fcc, alphaFilter=1.0, rate=50, eventDriven=True) # the filter settles in one sample
+        self.miniYoke.begin(RestingJoystick())
+        self.pygame.event.clear()
+        self.thread = threading.Thread(target=self.miniYoke.eventListener)
+        self.thread.start()
+        while self.miniYoke.inputState is None: # the listener filters the event queue before its first sample
+            time.sleep(0.001)
+
+    def tearDown(self):
+        self.miniYoke.threadRunning = False
+        self.thread.join()
+
+    def publishState(self, fpa, count=1):
+        for _ in range(count):
+            self.flightModel.snapshot.publish(x=0, y=0, z=10668, Vp=230, fpa=fpa, psi=0, phi=0.1)
+            time.sleep(0.01)
+
+    def testIdle(self):
+        time.sleep(0.2)
+        self.assertEqual(self.miniYoke.updateCount, 0)
+
+    def testFlightStateInsideEnvelope(self):
+        generation = self.fcc.commands.read().generation
+        self.publishState(0.01, count=20)
+        time.sleep(0.1)
+        self.assertEqual(self.miniYoke.updateCount, 0)
+        self.assertGreater(self.fcc.commands.read().generation, generation) # published again for the state machine
+
+    def testAxisMotion(self):
+        self.pygame.event.post(self.pygame.event.Event(self.pygame.JOYAXISMOTION, instance_id=0, axis=self.miniYoke.pitchAxis, value=0.5))
+        time.sleep(0.2)
+        self.assertEqual(self.miniYoke.eventCount, 1)
+        self.assertEqual(self.miniYoke.updateCount, 1)
+        self.assertAlmostEqual(self.fcc.commands.read().nz, 1.75)
+
+    def testButtonRecorded(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'session.jsonl')
+            self.miniYoke.sessionRecorder = SessionRecorder(path, alphaFilter=1.0)
+            for eventType in (self.pygame.JOYBUTTONDOWN, self.pygame.JOYBUTTONUP): # a press shorter than the period
+                self.pygame.event.post(self.pygame.event.Event(eventType, instance_id=0, button=self.miniYoke.apDisconnectButton))
+            time.sleep(0.2)
+            self.miniYoke.sessionRecorder.close()
+            _, records = loadSession(path)
+        self.assertEqual([record['buttons'] for record in records if record['kind'] == 'buttons'],
+                         [[False, False, True, False], [False, False, False, False]])
+
+    def testOtherJoystick(self):
+        self.pygame.event.post(self.pygame.event.Event(self.pygame.JOYAXISMOTION, instance_id=1, axis=self.miniYoke.pitchAxis, value=0.5))
+        time.sleep(0.2)
+        self.assertEqual(self.miniYoke.eventCount, 0)
+        self.assertEqual(self.miniYoke.updateCount, 0)
+
+    def testProtection(self):
+        self.publishState(0.2) # above the fpa protection
+        time.sleep(0.2)
+        self.assertEqual(self.miniYoke.updateCount, 1)
+
+    def testFccState(self):
+        self.fcc.setState('AP_ENGAGED')
+        time.sleep(0.2)
+        self.assertEqual(self.miniYoke.updateCount, 1)
+
+class ReplayTest(unittest.TestCase):
+    """
+    The replay of recorded sessions on the virtual clock: the configuration of the header, the button events and
+    the commands not sent by the state machine when an input is older than 1 s.
+    """
+
+    stateVector = 'StateVector x=0 y=0 z=0 Vp=100 fpa=0 psi=0 phi=0'
+
+    def message(self, t, text):
+        return {'kind': 'msg', 't': t, 'text': text}
+
+    def sample(self, t, pitch):
+        return {'kind': 'joy', 't': t, 'axes': [0.0, pitch, 0.0], 'buttons': [False] * 4}
+
+    def replay(self, records, **header):
+        engine = ReplayEngine(dict({'alphaFilter': 1.0}, **header), records)
+        outputs = engine.run()
+        return engine, [(t, msg.split()[0]) for t, msg in outputs]
+
+    def testYokeGap(self):
+        engine, outputs = self.replay([
+            self.message(0.0, self.stateVector), self.sample(0.1, 0.2), # sent at 0.1
+            self.sample(2.0, 0.4), self.message(3.5, self.stateVector), # yoke published 1.5 s before, skipped
+            self.sample(3.6, 0.5), self.message(3.7, self.stateVector), # sent at 3.7
+        ])
+        self.assertEqual(outputs, [(t, family) for t in (0.1, 3.7) for family in ('APNxControl', 'APNzControl', 'APLatControl')])
+        self.assertEqual(engine.stateMachine.staleFrames, 1)
+        self.assertEqual({(ages['output'], ages['input']) for ages in engine.stateMachine.inputAges.snapshot() if ages['stale']},
+                         {('APNzControl', 'yoke'), ('APLatControl', 'yoke')})
+
+    def testManualNx(self):
+        engine, outputs = self.replay([
+            self.message(0.0, self.stateVector), self.sample(0.1, 0.2), # sent at 0.1, AP_LONG not started yet
+            self.message(0.2, 'PaLong Nx=0.1 Nz=1.2'), self.sample(0.25, 0.3), self.message(0.3, self.stateVector), # sent at 0.3 with the AP_LONG nx
+            self.sample(2.0, 0.4), self.message(2.1, self.stateVector), # AP_LONG published 1.9 s before, skipped
+        ])
+        self.assertEqual(outputs, [(t, family) for t in (0.1, 0.3) for family in ('APNxControl', 'APNzControl', 'APLatControl')])
+        self.assertEqual(engine.aviBus.outputs[3][1], 'APNxControl nx=0.1')
+        self.assertEqual({(ages['output'], ages['input']) for ages in engine.stateMachine.inputAges.snapshot() if ages['stale']},
+                         {('APNxControl', 'apLong')})
+
+    def testStaleThresholds(self):
+        records = [self.message(0.0, self.stateVector), self.sample(0.1, 0.2), self.sample(2.0, 0.4), self.message(3.5, self.stateVector)]
+        engine, outputs = self.replay(records, staleThresholds={'yoke': 2.0, 'flightModel': 4.0, 'apLat': 2.0, 'apLong': 2.0})
+        self.assertEqual(engine.stateMachine.staleFrames, 0)
+        self.assertEqual([t for t, family in outputs if family == 'APNzControl'], [0.1, 3.5]) # the yoke published 1.5 s before
+
+    def testFilterSettings(self):
+        records = [self.message(0.0, self.stateVector), self.sample(0.1, 0.05)] # inside the deadband
+        for header, nz in (({}, 0.625), ({'filterSettings': {'deadband': 0.1}}, 0.5)):
+            engine, _ = self.replay(records, **header)
+            self.assertEqual(engine.aviBus.outputs[1][1], 'APNzControl nz={}'.format(nz))
+
+    def testButtons(self):
+        engine, outputs = self.replay([
+            self.message(0.0, 'FCUAP1 push'), self.sample(0.1, 0.0),
+            {'kind': 'buttons', 't': 0.12, 'buttons': [False, False, True, False]}, # ap disconnect pressed between two samples
+            {'kind': 'buttons', 't': 0.15, 'buttons': [False] * 4},
+            self.sample(0.2, 0.0),
+        ])
+        self.assertEqual(outputs, [(0.0, 'FCUAP1'), (0.12, 'FCUAP1')])
+        self.assertEqual(engine.aviBus.outputs[1][1], 'FCUAP1 off')
+        self.assertEqual(engine.fcc.state, 'MANUAL')
+
+    def testAutopilotGap(self):
+        engine, outputs = self.replay([
+            self.message(0.0, 'FCUAP1 push'),
+            self.message(0.1, 'AP_LAT p=0.1'), self.message(0.2, 'PaLong Nx=0.1 Nz=1.2'), # sent at 0.2
+            self.message(1.0, 'AP_LAT p=0.2'), self.message(2.5, 'PaLong Nx=0.2 Nz=1.3'), # AP_LAT 1.5 s old, skipped
+            self.message(2.6, 'AP_LAT p=0.3'), self.message(2.7, 'PaLong Nx=0.3 Nz=1.4'), # sent at 2.7
+        ])
+        self.assertEqual(outputs, [(0.0, 'FCUAP1')] + [(t, family) for t in (0.2, 2.7) for family in ('APNxControl', 'APNzControl', 'APLatControl')])
+        self.assertEqual(engine.stateMachine.staleFrames, 1)
+        self.assertEqual({ages['input'] for ages in engine.stateMachine.inputAges.snapshot() if ages['stale']}, {'apLat'})
+
+class VirtualClockSoakTest(unittest.TestCase):
+    """
+    One hour of manual flight on a VirtualClock: the mini yoke listener, a simulated aircraft and the main loop
+    run in their own threads and the time only moves forward when all of them sleep on the clock.
+    """
+
+    duration = 3600.0
+
+    def aircraft(self, bus, clock):
+        clock.join()
+        try:
+            while self.flying:
+                bus.sendMsg('StateVector x=0 y=0 z=10668 Vp=230 fpa=0.0 psi=0 phi=0.0')
+                clock.sleep(0.05)
+        finally:
+            clock.leave()
+
+    def testOneHour(self):
+        clock = VirtualClock() # the test thread runs the main loop
+        notifier = DataNotifier(clock=clock)
+        hub = LoopbackHub()
+        bus = LoopbackBus('MiniYokeModule', hub)
+        ground = LoopbackBus('ground', hub)
+        frames = []
+        ground.bindMsg(lambda agent, nz: frames.append(nz), '^APNzControl nz=(\\S+)')
+
+        fcu = FCU(notifier=notifier)
+        fmgs = FMGS(clock=clock)
+        flightModel = FlightModel(notifier=notifier, clock=clock)
+        fcc = FCC(fcu, fmgs, flightModel, bus, clock=clock)
+        miniYoke = MiniYoke(fcc, alphaFilter=0.1, notifier=notifier, clock=clock)
+        joystick = ScriptedJoystick(clock)
+        joystick.setAxis(miniYoke.pitchAxis, SineSweep(0.5, 0.01, 0.1, self.duration))
+        miniYoke.begin(joystick)
+        stateMachine = FccStateMachine(fcc, miniYoke, ApLAT(clock=clock), ApLONG(clock=clock), MessageBatch(bus, size=3))
+        bus.bindRecord(flightModel.receive, flightModel.schema)
+
+        self.flying = True
+        threads = [threading.Thread(target=miniYoke.listener), threading.Thread(target=self.aircraft, args=(ground, clock))]
+        for thread in threads:
+            thread.start()
+        start = time.perf_counter()
+        while clock.monotonic() < self.duration:
+            notifier.wait(timeout=0.5)
+            stateMachine.step()
+        wallTime = time.perf_counter() - start
+        self.flying = False
+        miniYoke.end()
+        clock.leave() # the main loop stops, the aircraft can wake up and stop
+        for thread in threads:
+            thread.join(1)
+            self.assertFalse(thread.is_alive())
+
+        self.assertAlmostEqual(miniYoke.timer.ticks, self.duration * miniYoke.timer.rate, delta=2)
+        self.assertAlmostEqual(len(frames), self.duration * miniYoke.timer.rate, delta=2) # one frame per new yoke sample
+        self.assertEqual(stateMachine.staleFrames, 0)
+        self.assertLess(wallTime, self.duration / 10)
+        bus.stop()
+        ground.stop()
+
+if __name__ == '__main__':
+    unittest.main()